@@ -0,0 +1 @@
+# Benchmarks offline del bot: tráfico sintético, servidor LLM simulado y reportes JSON
@@ -0,0 +1,102 @@
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional
+
+# Vocabulario de chat grupal en español (coloquial, con algo de negatividad y repetición)
+VOCABULARY = [
+    "hola", "gente", "alguien", "vio", "el", "partido", "de", "anoche", "qué", "vergüenza",
+    "no", "puede", "ser", "jajaja", "mañana", "hay", "reunión", "o", "se", "cancela",
+    "quién", "trae", "las", "empanadas", "yo", "llevo", "cerveza", "otra", "vez", "tarde",
+    "el", "jefe", "dijo", "que", "terrible", "horrible", "peor", "día", "bueno", "dale",
+    "ya", "voy", "esperen", "me", "quedé", "sin", "batería", "pásenme", "la", "dirección",
+    "ese", "meme", "es", "oro", "mal", "chiste", "odio", "los", "lunes", "café",
+    "viernes", "por", "fin", "clima", "lluvia", "tráfico", "colectivo", "película", "serie", "spoiler",
+]
+
+FIRST_NAMES = [
+    "Ana", "Bruno", "Carla", "Diego", "Elena", "Facundo", "Gabriela", "Hernán",
+    "Inés", "Julián", "Karina", "Lucas", "María", "Nicolás", "Olga", "Pablo",
+]
+
+
+@dataclass
+class SyntheticMessage:
+    """Mensaje generado para un chat sintético."""
+    chat_id: int
+    message_id: int
+    user: str
+    text: str
+    timestamp: datetime
+
+
+class ChatGenerator:
+    """
+    Genera tráfico sintético de grupos de Telegram en español.
+
+    Los usuarios siguen una distribución sesgada (unos pocos hablan mucho) y
+    los mensajes se reparten entre los chats; es reproducible con la semilla.
+    """
+
+    def __init__(self, chats: int = 10, users: int = 8, min_words: int = 3, max_words: int = 25,
+                 rate: float = 50.0, seed: Optional[int] = 1234):
+        """
+        Args:
+            chats (int): Cantidad de chats de grupo.
+            users (int): Usuarios por chat.
+            min_words (int): Palabras mínimas por mensaje.
+            max_words (int): Palabras máximas por mensaje.
+            rate (float): Mensajes por segundo del tráfico simulado (define los timestamps).
+            seed (Optional[int]): Semilla del generador aleatorio.
+        """
+        self.chats = chats
+        self.users = users
+        self.min_words = min_words
+        self.max_words = max_words
+        self.rate = rate
+        self._random = random.Random(seed)
+        self._chat_ids = [-1000000000000 - i for i in range(chats)]
+        self._users = self._build_users(users)
+        # Pesos tipo Zipf: el primer usuario habla mucho más que el último
+        self._user_weights = [1.0 / (rank + 1) for rank in range(len(self._users))]
+        self._next_message_id = {chat_id: 1 for chat_id in self._chat_ids}
+
+    @property
+    def chat_ids(self) -> List[int]:
+        return list(self._chat_ids)
+
+    def _build_users(self, count: int) -> List[str]:
+        names = []
+        for i in range(count):
+            base = FIRST_NAMES[i % len(FIRST_NAMES)]
+            names.append(base if i < len(FIRST_NAMES) else f"{base}{i // len(FIRST_NAMES)}")
+        return names
+
+    def text(self) -> str:
+        """Genera el texto de un mensaje."""
+        words = self._random.choices(VOCABULARY, k=self._random.randint(self.min_words, self.max_words))
+        text = " ".join(words)
+        if self._random.random() < 0.2:
+            text += self._random.choice(["?", "!!", "...", " 😂", " 🙄"])
+        return text.capitalize()
+
+    def messages(self, count: int, start: Optional[datetime] = None) -> Iterator[SyntheticMessage]:
+        """
+        Genera mensajes repartidos entre los chats.
+
+        Args:
+            count (int): Cantidad total de mensajes.
+            start (Optional[datetime]): Timestamp del primer mensaje (ahora por defecto).
+
+        Yields:
+            SyntheticMessage: Cada mensaje, en orden cronológico.
+        """
+        timestamp = start or datetime.now()
+        step = timedelta(seconds=1.0 / self.rate) if self.rate > 0 else timedelta(0)
+        for _ in range(count):
+            chat_id = self._random.choice(self._chat_ids)
+            message_id = self._next_message_id[chat_id]
+            self._next_message_id[chat_id] += 1
+            user = self._random.choices(self._users, weights=self._user_weights)[0]
+            yield SyntheticMessage(chat_id, message_id, user, self.text(), timestamp)
+            timestamp += step
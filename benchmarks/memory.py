@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memoria de los buffers de mensajes.
+
+Compara la representación anterior (un dict con datetime y el nombre del
+usuario por mensaje, en un deque por chat) con el MessageStore actual
+(columnas por chat), llenando ambos con el mismo tráfico sintético.
+
+Uso:
+    python -m benchmarks.memory --messages 100000 --chats 100
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+from collections import deque
+from typing import Any, Callable, Dict
+
+from bot2_scripts.utils.message_store import MessageStore
+
+from .chat_generator import ChatGenerator
+
+
+def _measure(fill: Callable[[], Any]) -> int:
+    """Bytes que siguen reservados después de ejecutar fill() (lo que retiene la estructura)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        structure = fill()
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del structure
+    return current
+
+
+def measure_buffers(messages: int = 100000, chats: int = 100, seed: int = 1234) -> Dict[str, Any]:
+    """
+    Mide la memoria retenida por ambas representaciones.
+
+    La capacidad por chat alcanza para que ningún mensaje se descarte, así
+    los dos lados guardan exactamente `messages` mensajes.
+
+    Args:
+        messages (int): Mensajes totales a guardar.
+        chats (int): Chats entre los que se reparten.
+        seed (int): Semilla del generador (el mismo tráfico para ambos lados).
+
+    Returns:
+        Dict[str, Any]: Bytes totales y por mensaje de cada representación.
+    """
+    capacity = messages
+
+    def legacy():
+        buffers: Dict[int, deque] = {}
+        for m in ChatGenerator(chats, seed=seed).messages(messages):
+            buffers.setdefault(m.chat_id, deque(maxlen=capacity)).append({
+                'user': m.user,
+                'text': m.text,
+                'timestamp': m.timestamp,
+                'message_id': m.message_id,
+            })
+        return buffers
+
+    def compact():
+        store = MessageStore(capacity, max_bytes=1 << 62)
+        for m in ChatGenerator(chats, seed=seed).messages(messages):
+            store.append(m.chat_id, {
+                'user': m.user,
+                'text': m.text,
+                'timestamp': m.timestamp,
+                'message_id': m.message_id,
+            })
+        return store
+
+    legacy_bytes = _measure(legacy)
+    compact_bytes = _measure(compact)
+    return {
+        'messages': messages,
+        'chats': chats,
+        'legacy_bytes': legacy_bytes,
+        'compact_bytes': compact_bytes,
+        'legacy_bytes_per_message': legacy_bytes / messages,
+        'compact_bytes_per_message': compact_bytes / messages,
+        'reduction': 1 - compact_bytes / legacy_bytes if legacy_bytes else 0.0,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Memoria de los buffers de mensajes")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="Archivo JSON donde guardar el resultado")
+    args = parser.parse_args(argv)
+
+    results = measure_buffers(args.messages, args.chats, args.seed)
+    print(f"📦 {results['messages']} mensajes en {results['chats']} chats")
+    print(f"   dict + datetime: {results['legacy_bytes'] / 2**20:.1f} MB ({results['legacy_bytes_per_message']:.0f} B/mensaje)")
+    print(f"   columnas:        {results['compact_bytes'] / 2**20:.1f} MB ({results['compact_bytes_per_message']:.0f} B/mensaje)")
+    print(f"   reducción:       {results['reduction']:.0%}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
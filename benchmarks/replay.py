@@ -0,0 +1,154 @@
+import asyncio
+import math
+import os
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional
+
+from .chat_generator import SyntheticMessage
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def rss_bytes() -> int:
+    """Memoria residente actual del proceso (o el pico, si no se puede leer la actual)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux lo informa en KB y macOS en bytes
+        return peak if peak > 1 << 32 else peak * 1024
+    return 0
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano; 0.0 si no hay valores."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def fake_update(chat_id: int, text: str, user: str = "Ana", message_id: Optional[int] = None,
+                user_id: int = 1, replies: Optional[List[str]] = None) -> SimpleNamespace:
+    """
+    Construye un update con la forma que usan los handlers del bot.
+
+    Las respuestas no se envían a Telegram: se descartan o se guardan en replies.
+    """
+    async def reply_text(reply, **kwargs):
+        if replies is not None:
+            replies.append(reply)
+        return SimpleNamespace(text=reply, edit_text=reply_text)
+
+    message = SimpleNamespace(
+        chat=SimpleNamespace(id=chat_id, type='supergroup'),
+        from_user=SimpleNamespace(id=user_id, first_name=user),
+        text=text,
+        message_id=message_id,
+        reply_text=reply_text,
+    )
+    return SimpleNamespace(message=message, effective_chat=message.chat)
+
+
+class Replayer:
+    """Alimenta al bot con tráfico sintético y mide ingesta, resúmenes y memoria."""
+
+    def __init__(self, bot, rss_interval: float = 0.5):
+        """
+        Args:
+            bot (CinicoSummaryBot): Bot a medir (con su cliente LLM ya apuntando al stub).
+            rss_interval (float): Segundos entre muestras de memoria residente.
+        """
+        self.bot = bot
+        self.rss_interval = rss_interval
+        self.rss_samples: List[Dict[str, float]] = []
+        self._started = time.perf_counter()
+        self._sampler: Optional[asyncio.Task] = None
+
+    def sample_rss(self) -> None:
+        self.rss_samples.append({'t': round(time.perf_counter() - self._started, 3), 'rss': rss_bytes()})
+
+    async def _sample_forever(self) -> None:
+        while True:
+            self.sample_rss()
+            await asyncio.sleep(self.rss_interval)
+
+    def start_sampling(self) -> None:
+        self._started = time.perf_counter()
+        self._sampler = asyncio.create_task(self._sample_forever())
+
+    async def stop_sampling(self) -> None:
+        if self._sampler is not None:
+            self._sampler.cancel()
+            try:
+                await self._sampler
+            except asyncio.CancelledError:
+                pass
+            self._sampler = None
+        self.sample_rss()
+
+    async def ingest(self, messages: Iterable[SyntheticMessage], rate: float = 0.0) -> Dict[str, float]:
+        """
+        Pasa los mensajes por handle_message.
+
+        Args:
+            messages (Iterable[SyntheticMessage]): Mensajes a enviar.
+            rate (float): Mensajes por segundo a respetar (0 = tan rápido como se pueda).
+
+        Returns:
+            Dict[str, float]: mensajes, segundos y mensajes por segundo.
+        """
+        count = 0
+        started = time.perf_counter()
+        for msg in messages:
+            await self.bot.handle_message(fake_update(msg.chat_id, msg.text, msg.user, msg.message_id), None)
+            count += 1
+            if rate > 0:
+                delay = started + count / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif count % 1000 == 0:
+                # Ceder el loop de vez en cuando para que corra el muestreo de memoria
+                await asyncio.sleep(0)
+        elapsed = time.perf_counter() - started
+        return {
+            'messages': count,
+            'seconds': elapsed,
+            'messages_per_second': count / elapsed if elapsed > 0 else 0.0,
+        }
+
+    async def summarize(self, chat_ids: Iterable[int], concurrency: int = 10) -> List[float]:
+        """
+        Pide /resumen en cada chat, con como mucho `concurrency` pedidos simultáneos.
+
+        Returns:
+            List[float]: Latencia de cada /resumen, de punta a punta, en segundos.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+
+        async def one(chat_id: int) -> None:
+            async with semaphore:
+                started = time.perf_counter()
+                await self.bot.resumen(fake_update(chat_id, "/resumen"), None)
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(one(chat_id) for chat_id in chat_ids))
+        return latencies
+
+    @staticmethod
+    def latency_summary(latencies: List[float]) -> Dict[str, Any]:
+        return {
+            'count': len(latencies),
+            'p50': percentile(latencies, 50),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies) if latencies else 0.0,
+        }
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline del bot: tráfico sintético contra un servidor LLM simulado.
+
+Uso:
+    python -m benchmarks.run --chats 50 --messages 50000 --rounds 5 --latency 0.3 --error-rate 0.05
+
+Reporta mensajes/s ingeridos, p50/p99 de /resumen y el crecimiento de la
+memoria residente, y guarda el resultado en JSON para comparar corridas.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from bot2_scripts.bot2_core import CinicoSummaryBot, RESUMEN_REQUESTS, SUMMARY_SECONDS
+from bot2_scripts.handlers.cinico_handler import PROMPT_COMPACTION_RATIO
+from bot2_scripts.utils.llm_client import OpenRouterClient
+from bot2_scripts.utils.llm_scheduler import LLMScheduler
+from bot2_scripts.utils.storage import MemoryBackend, SQLiteBackend
+
+from .chat_generator import ChatGenerator
+from .replay import Replayer, rss_bytes
+from .stub_llm import StubLLMServer
+
+OUTCOMES = ("ok", "busy", "response_error", "connection_error", "error")
+RESULTS = ("empty", "cache", "cooldown", "busy", "generated")
+
+
+@dataclass
+class BenchmarkConfig:
+    """Parámetros de una corrida."""
+    chats: int = 20
+    users: int = 8
+    messages: int = 20000
+    min_words: int = 3
+    max_words: int = 25
+    rate: float = 0.0
+    rounds: int = 4
+    concurrency: int = 20
+    latency: float = 0.2
+    jitter: float = 0.05
+    error_rate: float = 0.0
+    retries: int = 0
+    workers: int = 8
+    max_queue: int = 200
+    storage: str = "memory"
+    seed: int = 1234
+    rss_interval: float = 0.5
+
+
+def _counts() -> Dict[str, Dict[str, float]]:
+    return {
+        'summary': {o: SUMMARY_SECONDS.count(outcome=o) for o in OUTCOMES},
+        'resumen': {r: RESUMEN_REQUESTS.value(result=r) for r in RESULTS},
+        'compaction': {
+            'prompts': PROMPT_COMPACTION_RATIO.count(kind="final"),
+            'ratio_sum': PROMPT_COMPACTION_RATIO.total(kind="final"),
+        },
+    }
+
+
+def _delta(before: Dict[str, Dict[str, float]], after: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    return {group: {k: after[group][k] - before[group][k] for k in after[group]} for group in after}
+
+
+async def run_benchmark(config: BenchmarkConfig, stub_url: str, storage_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Ejecuta el benchmark contra un servidor LLM ya levantado.
+
+    Se alternan rondas de ingesta con una ronda de /resumen en todos los chats,
+    así la latencia se mide con buffers cada vez más llenos y la memoria se
+    muestrea a lo largo de toda la corrida.
+
+    Args:
+        config (BenchmarkConfig): Parámetros de la corrida.
+        stub_url (str): URL base del servidor de chat completions.
+        storage_path (Optional[str]): Archivo SQLite si config.storage == "sqlite".
+
+    Returns:
+        Dict[str, Any]: Resultados listos para serializar a JSON.
+    """
+    storage = SQLiteBackend(storage_path) if config.storage == "sqlite" else MemoryBackend()
+    bot = CinicoSummaryBot("123:BENCH", storage=storage)
+    bot.llm_client = OpenRouterClient("bench-key", base_url=stub_url, max_retries=config.retries)
+    bot.llm_scheduler = LLMScheduler(config.workers, config.max_queue)
+    # Cada ronda debe llegar al LLM: sin período de espera entre resúmenes
+    bot.summary_cooldown.seconds = 0
+
+    generator = ChatGenerator(config.chats, config.users, config.min_words, config.max_words,
+                              config.rate or 50.0, config.seed)
+    replayer = Replayer(bot, config.rss_interval)
+    before = _counts()
+    rss_start = rss_bytes()
+    replayer.start_sampling()
+
+    ingested = 0
+    ingest_seconds = 0.0
+    latencies = []
+    rounds = []
+    per_round = config.messages // config.rounds
+    try:
+        for index in range(config.rounds):
+            count = per_round if index < config.rounds - 1 else config.messages - per_round * index
+            ingest = await replayer.ingest(generator.messages(count), config.rate)
+            round_latencies = await replayer.summarize(generator.chat_ids, config.concurrency)
+            ingested += ingest['messages']
+            ingest_seconds += ingest['seconds']
+            latencies.extend(round_latencies)
+            rounds.append({
+                'ingest': ingest,
+                'summary_latency': Replayer.latency_summary(round_latencies),
+                'rss': rss_bytes(),
+            })
+    finally:
+        await replayer.stop_sampling()
+        await bot.llm_scheduler.close()
+        await bot.llm_client.aclose()
+        await asyncio.to_thread(storage.close)
+
+    rss_end = rss_bytes()
+    outcomes = _delta(before, _counts())
+    compaction = outcomes.pop('compaction')
+    return {
+        'config': asdict(config),
+        'environment': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+        },
+        'ingest': {
+            'messages': ingested,
+            'seconds': ingest_seconds,
+            'messages_per_second': ingested / ingest_seconds if ingest_seconds > 0 else 0.0,
+        },
+        'summary_latency': Replayer.latency_summary(latencies),
+        'outcomes': outcomes,
+        'prompt_compaction': {
+            'prompts': compaction['prompts'],
+            'mean_ratio': compaction['ratio_sum'] / compaction['prompts'] if compaction['prompts'] else 1.0,
+        },
+        'rss': {
+            'start': rss_start,
+            'end': rss_end,
+            'growth': rss_end - rss_start,
+            'samples': replayer.rss_samples,
+        },
+        'store': bot.message_store.stats(),
+        'cache': bot.summary_cache.stats(),
+        'rounds': rounds,
+    }
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    defaults = BenchmarkConfig()
+    parser = argparse.ArgumentParser(description="Benchmark offline del bot de resúmenes")
+    for name, value in asdict(defaults).items():
+        flag = "--" + name.replace("_", "-")
+        if isinstance(value, str):
+            parser.add_argument(flag, default=value, choices=("memory", "sqlite") if name == "storage" else None)
+        else:
+            parser.add_argument(flag, type=type(value), default=value)
+    parser.add_argument("--output", help="Archivo JSON de salida (por defecto benchmarks/results/<fecha>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    config = BenchmarkConfig(**{k: v for k, v in vars(args).items() if k != "output"})
+
+    print(f"🔧 Servidor LLM simulado: latencia {config.latency}s, errores {config.error_rate:.0%}")
+    with StubLLMServer(config.latency, config.jitter, config.error_rate, seed=config.seed) as stub, \
+            tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        results = asyncio.run(run_benchmark(config, stub.url, os.path.join(tmp, "bench.db")))
+        results['wall_seconds'] = time.perf_counter() - started
+        results['stub'] = {'requests': stub.requests, 'errors': stub.errors}
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+    latency = results['summary_latency']
+    print(f"📥 Ingesta: {results['ingest']['messages_per_second']:.0f} mensajes/s")
+    print(f"⏱️ /resumen: p50 {latency['p50'] * 1000:.0f} ms, p99 {latency['p99'] * 1000:.0f} ms ({latency['count']} pedidos)")
+    print(f"🗜️ Compactación de prompts: ratio medio {results['prompt_compaction']['mean_ratio']:.2f}")
+    print(f"🧠 RSS: {results['rss']['start'] / 2**20:.1f} MB → {results['rss']['end'] / 2**20:.1f} MB")
+    print(f"💾 Resultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()
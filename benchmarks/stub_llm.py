@@ -0,0 +1,101 @@
+import asyncio
+import json
+import random
+import threading
+from typing import Optional
+
+from bot2_scripts.utils.http_server import HTTPRequest, HTTPResponse, MiniHTTPServer
+
+
+class StubLLMServer:
+    """
+    Servidor local compatible con /chat/completions para pruebas de carga.
+
+    Corre en su propio hilo y event loop para no competir con el bot medido.
+    Cada petición espera la latencia configurada (con jitter) y falla con la
+    probabilidad indicada, alternando 429 y 500.
+    """
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.0, error_rate: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0, seed: Optional[int] = None):
+        """
+        Args:
+            latency (float): Segundos de espera por respuesta.
+            jitter (float): Variación aleatoria máxima (±) sobre la latencia.
+            error_rate (float): Probabilidad de responder con error (0 a 1).
+            host (str): Interfaz donde escuchar.
+            port (int): Puerto (0 para uno libre).
+            seed (Optional[int]): Semilla para reproducir los errores.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._server: Optional[MiniHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        """URL base para OpenRouterClient."""
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> None:
+        """Arranca el servidor en un hilo aparte y espera a que escuche."""
+        ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        async def serve():
+            self._server = MiniHTTPServer(self.host, self.port)
+            self._server.route("POST", "/chat/completions", self._completions)
+            await self._server.start()
+            self.port = self._server.port
+            ready.set()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(serve())
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="stub-llm", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def stop(self) -> None:
+        """Detiene el servidor y su hilo."""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._server.stop(drain_timeout=1.0), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def __enter__(self) -> "StubLLMServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    async def _completions(self, request: HTTPRequest) -> HTTPResponse:
+        self.requests += 1
+        body = json.loads(request.body)
+        prompt = body["messages"][0]["content"]
+        delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        await asyncio.sleep(max(0.0, delay))
+
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            status = 429 if self.errors % 2 else 500
+            return HTTPResponse(status, b'{"error": "stub"}', content_type="application/json")
+
+        payload = {
+            "model": body.get("model", "stub"),
+            "choices": [{"message": {"role": "assistant", "content": f"Resumen simulado de {len(prompt)} caracteres."}}],
+        }
+        return HTTPResponse(200, json.dumps(payload).encode(), content_type="application/json")
@@ -1,6 +1,26 @@
-from bot2_scripts.bot2_core import main, CinicoSummaryBot, BOT_TOKEN, OPENROUTER_API_KEY, logger
+import argparse
+import time
+
+# Origen de la medición del arranque: antes de importar telegram y el resto del bot
+STARTED = time.perf_counter()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bot cínico de resúmenes para Telegram")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Imprime cuánto tardó cada fase del arranque hasta poder recibir updates")
+    return parser.parse_args(argv)
+
 
 if __name__ == "__main__":
+    args = parse_args()
+
+    from bot2_scripts.utils.startup import STARTUP
+    STARTUP.start(STARTED, report=args.profile_startup)
+
+    from bot2_scripts.bot2_core import main, BOT_TOKEN, OPENROUTER_API_KEY, logger
+    STARTUP.mark("importaciones")
+
     if not BOT_TOKEN:
         logger.error("La variable de entorno BOT_TOKEN no está definida en su archivo .env o en el entorno.")
     elif not OPENROUTER_API_KEY:
@@ -1,12 +1,13 @@
+import asyncio
 import logging
+import re
+import signal
+import time
 from datetime import datetime, timedelta
-from collections import defaultdict
 from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from typing import List, Dict, Any
+from telegram.ext import Application, CommandHandler, MessageHandler, TypeHandler, filters, ContextTypes
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, Callable, Awaitable, Hashable
 import os
-import json
-import requests
 from dotenv import load_dotenv
 from dataclasses import dataclass
 
@@ -14,13 +15,187 @@ from dataclasses import dataclass
 load_dotenv()
 
 # Estas se moverán a variables de entorno más adelante según el plan
-ULTIMOS_MENSAJES =30 # int(os.getenv("ULTIMOS_MENSAJES", 30))
+ULTIMOS_MENSAJES = int(os.getenv("ULTIMOS_MENSAJES", 30))
 MAX_MESSAGE_LENGTH = 3000 # int(os.getenv("MAX_MESSAGE_LENGTH", 500))
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 BOT_TOKEN = os.getenv("BOT_TOKEN")
+# Presupuesto total de memoria (estimada) para los buffers de todos los chats
+MAX_BUFFER_BYTES = int(os.getenv("MAX_BUFFER_BYTES", 64 * 1024 * 1024))
+
+# Persistencia de los buffers ("sqlite" o "memory")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "bot_messages.db")
+SQLITE_BATCH_SIZE = int(os.getenv("SQLITE_BATCH_SIZE", 200))
+SQLITE_FLUSH_INTERVAL = float(os.getenv("SQLITE_FLUSH_INTERVAL", 0.5))
+
+# Caché de resúmenes: segundos de vida y máximo de entradas
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", 600))
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", 1024))
+
+# Segundos de espera por chat después de generar un resumen (0 lo desactiva)
+SUMMARY_COOLDOWN = float(os.getenv("SUMMARY_COOLDOWN", 30))
+
+# Resumen jerárquico: por encima de este largo de prompt se resume por bloques
+SUMMARY_PROMPT_CHAR_LIMIT = int(os.getenv("SUMMARY_PROMPT_CHAR_LIMIT", 4000))
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", 1500))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", 4))
+
+# Compactación de los mensajes antes de armar el prompt (pasos separados por comas; vacío la desactiva)
+PROMPT_COMPACTION_STEPS = os.getenv("PROMPT_COMPACTION_STEPS", "shorten,dedupe,collapse,budget")
+# Tokens máximos de los mensajes de un prompt (0 sin límite)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 0))
+PROMPT_NEAR_DUPLICATE_RATIO = float(os.getenv("PROMPT_NEAR_DUPLICATE_RATIO", 0.9))
+PROMPT_MAX_CODE_CHARS = int(os.getenv("PROMPT_MAX_CODE_CHARS", 200))
+
+# Resúmenes acumulados en segundo plano: se actualizan cada N mensajes o tras T segundos sin mensajes
+ROLLING_SUMMARIES = os.getenv("ROLLING_SUMMARIES", "false").lower() in ("1", "true", "yes")
+ROLLING_EVERY_MESSAGES = int(os.getenv("ROLLING_EVERY_MESSAGES", 50))
+ROLLING_IDLE_SECONDS = float(os.getenv("ROLLING_IDLE_SECONDS", 300))
+
+# Respuestas en streaming: el resumen se va editando a medida que se genera
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "false").lower() in ("1", "true", "yes")
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", 1.5))
+
+# Procesamiento concurrente de updates (en orden dentro de cada chat): updates en proceso a la vez
+# (1 = de a uno, como antes) y handlers ejecutándose a la vez en la captura de mensajes y en los comandos
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", 1024))
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", 64))
+COMMAND_CONCURRENCY = int(os.getenv("COMMAND_CONCURRENCY", 16))
+
+# Modo de recepción de updates: "polling" o "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # URL pública base, p. ej. https://bot.ejemplo.com
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8443))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", 10))
+
+# Logging: nivel, formato ("text" o "json") y muestreo de eventos frecuentes
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "mensaje_recibido=0.01")
+
+# Multiproceso: con SHARDS > 1 un proceso frontal recibe los updates y los reparte
+# por chat entre SHARDS workers; los envíos a Telegram pasan por el frontal
+SHARDS = int(os.getenv("SHARDS", 1))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+SHARD_SHUTDOWN_TIMEOUT = float(os.getenv("SHARD_SHUTDOWN_TIMEOUT", 15))
+
+# Envíos a Telegram: mensajes por segundo en un chat (con ráfagas de hasta TELEGRAM_CHAT_BURST),
+# mensajes por minuto en un grupo y reintentos ante el control de flujo (429)
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", 1))
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", 10))
+TELEGRAM_GROUP_PER_MINUTE = float(os.getenv("TELEGRAM_GROUP_PER_MINUTE", 20))
+TELEGRAM_SEND_RETRIES = int(os.getenv("TELEGRAM_SEND_RETRIES", 3))
+
+# Métricas en formato Prometheus (0 desactiva el endpoint) y administración
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+# IDs de usuario de Telegram autorizados para comandos de administración (/profile)
+ADMIN_USER_IDS = {int(x) for x in os.getenv("ADMIN_USER_IDS", "").replace(" ", "").split(",") if x}
+PROFILE_DUMP_PATH = os.getenv("PROFILE_DUMP_PATH")
+
+# Identidad del bot (getMe) guardada en disco para no esperarla al arrancar (vacío la desactiva)
+BOT_IDENTITY_CACHE = os.getenv("BOT_IDENTITY_CACHE", "bot_identity.json")
+
+# Configuración del cliente LLM (OpenRouter)
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+LLM_MODEL = os.getenv("LLM_MODEL", "deepseek/deepseek-chat-v3.1:free")
+# Modelos en orden de preferencia (separados por comas); por defecto solo LLM_MODEL
+LLM_MODELS = [m.strip() for m in os.getenv("LLM_MODELS", LLM_MODEL).split(",") if m.strip()] or [LLM_MODEL]
+# Segundos antes de duplicar una petición lenta en el siguiente modelo (0 no duplica)
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", 4))
+# Fallos seguidos que dejan fuera a un modelo (0 lo desactiva) y segundos hasta volver a probarlo
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 3))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", 30))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 60))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+
+# Planificador global de llamadas al LLM (0 desactiva el límite correspondiente)
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", 4))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", 50))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 20))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", 0))
+# Tokens de respuesta estimados por llamada, para el límite de tokens por minuto
+LLM_COMPLETION_TOKENS = 512
 
 # Importar la clase Handler para la personalidad Cínica
 from .handlers.cinico_handler import CinicoHandler
+from .utils.llm_client import OpenRouterClient, LLMConnectionError, LLMResponseError
+from .utils.message_store import MessageStore
+from .utils.storage import MemoryBackend, StorageBackend, create_storage_backend
+from .utils.summary_cache import SummaryCache, CacheKey
+from .utils.single_flight import SingleFlight, Cooldown
+from .utils.summarizer import HierarchicalSummarizer, estimate_tokens
+from .utils.llm_scheduler import LLMScheduler, SchedulerBusy
+from .utils.model_router import ModelRouter, current_models, record_models
+from .utils.webhook import WebhookServer
+from .utils.outbound import OutboundSender
+from .utils.update_processor import ChatUpdateProcessor
+from .utils.streaming_reply import ProgressiveReply
+from .utils.logging_setup import configure_logging, log_event, parse_sample_rates
+from .utils.metrics import REGISTRY, SIZE_BUCKETS, MetricsServer, stats_collector
+from .utils.profiler import ProfilerToggle
+from .utils.prompt_compaction import PromptCompactor, parse_steps
+from .utils.rolling_summary import RollingSummarizer
+from .utils.startup import STARTUP
+
+if TYPE_CHECKING:
+    # El modo multiproceso (y multiprocessing) se importa solo si se usa
+    from .utils.sharding import ShardSupervisor, TelegramRelay
+
+RESUMEN_USAGE = (
+    "Uso: /resumen para todo lo guardado, /resumen 30m, /resumen 2h o /resumen 1d para una ventana "
+    "de tiempo, o responde a un mensaje con /resumen para resumir desde ahí."
+)
+WINDOW_RE = re.compile(r'^(\d+)\s*(m|min|h|d)?$', re.IGNORECASE)
+WINDOW_UNITS = {'m': 'minutes', 'min': 'minutes', 'h': 'hours', 'd': 'days'}
+
+
+def normalize_message(user: Optional[str], text: str, timestamp: Optional[datetime] = None,
+                      message_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Mensaje tal como se guarda en el buffer del chat.
+
+    Lo usan handle_message y la importación de historia, para que los mensajes
+    importados queden igual que los recibidos en vivo.
+
+    Args:
+        user (Optional[str]): Nombre del autor (None si no se conoce).
+        text (str): Texto del mensaje; se recorta a MAX_MESSAGE_LENGTH.
+        timestamp (Optional[datetime]): Fecha del mensaje (por defecto, ahora).
+        message_id (Optional[int]): ID del mensaje en el chat.
+
+    Returns:
+        Dict[str, Any]: Mensaje con 'user', 'text', 'timestamp' y 'message_id'.
+    """
+    return {
+        'user': user or "UsuarioDesconocido",
+        'text': text[:MAX_MESSAGE_LENGTH],
+        'timestamp': timestamp or datetime.now(),
+        'message_id': message_id,
+    }
+
+
+def parse_window(text: str) -> Optional[timedelta]:
+    """
+    Interpreta una ventana de tiempo como "30m", "2h" o "1d" (sin unidad, minutos).
+
+    Args:
+        text (str): Argumento del comando.
+
+    Returns:
+        Optional[timedelta]: La duración, o None si no es válida.
+    """
+    match = WINDOW_RE.match(text.strip())
+    if not match or int(match.group(1)) <= 0:
+        return None
+    unit = WINDOW_UNITS[(match.group(2) or 'm').lower()]
+    return timedelta(**{unit: int(match.group(1))})
+
 
 # Lista de mensajes vacíos para la personalidad Cínica
 EMPTY_CINICO_RESPONSES = [
@@ -30,12 +205,37 @@ EMPTY_CINICO_RESPONSES = [
 ]
 
 # Configuración del logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+configure_logging(
+    LOG_LEVEL,
+    LOG_FORMAT,
+    secrets=[BOT_TOKEN, OPENROUTER_API_KEY],
+    sample_rates=parse_sample_rates(LOG_SAMPLE_RATES),
 )
 logger = logging.getLogger(__name__)
 
+# Métricas del proceso
+HANDLE_MESSAGE_SECONDS = REGISTRY.histogram(
+    "bot_handle_message_seconds", "Tiempo de ingesta de un mensaje de grupo"
+)
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "bot_llm_request_seconds", "Latencia de cada llamada al LLM (sin la espera en cola)", labels=("outcome",)
+)
+SUMMARY_SECONDS = REGISTRY.histogram(
+    "bot_summary_seconds", "Tiempo total de generación de un resumen", labels=("outcome",)
+)
+REPLY_SEND_SECONDS = REGISTRY.histogram(
+    "bot_reply_send_seconds", "Tiempo de envío de respuestas a Telegram"
+)
+CHAT_BUFFER_MESSAGES = REGISTRY.histogram(
+    "bot_chat_buffer_messages", "Mensajes en el buffer del chat al pedir un resumen", buckets=SIZE_BUCKETS
+)
+RESUMEN_REQUESTS = REGISTRY.counter(
+    "bot_resumen_requests_total", "Pedidos de /resumen por resultado", labels=("result",)
+)
+SUMMARY_MODELS = REGISTRY.counter(
+    "bot_summaries_by_model_total", "Resúmenes generados según el modelo que escribió la respuesta", labels=("model",)
+)
+
 
 @dataclass
 class ChatMetrics:
@@ -49,12 +249,29 @@ class ChatMetrics:
     repetition_rate: float
 
 class CinicoSummaryBot:
-    def __init__(self, token: str):
+    def __init__(self, token: str, storage: Optional[StorageBackend] = None):
         if not token:
             logger.error("El token del bot no está configurado. Asegúrate de que BOT_TOKEN está en tu .env o variables de entorno.")
             raise ValueError("Token del bot no proporcionado.")
         self.token = token
-        self.messages_buffer = defaultdict(list)
+        # Cliente LLM asíncrono con una sesión HTTP compartida, repartiendo las
+        # llamadas entre los modelos configurados
+        self.llm_client = ModelRouter(
+            OpenRouterClient(
+                OPENROUTER_API_KEY,
+                base_url=OPENROUTER_BASE_URL,
+                model=LLM_MODELS[0],
+                connect_timeout=LLM_CONNECT_TIMEOUT,
+                read_timeout=LLM_READ_TIMEOUT,
+                max_retries=LLM_MAX_RETRIES,
+                backoff_base=LLM_BACKOFF_BASE,
+            ),
+            LLM_MODELS,
+            hedge_delay=LLM_HEDGE_DELAY,
+            failure_threshold=LLM_BREAKER_FAILURES,
+            reset_timeout=LLM_BREAKER_RESET,
+            charge=self._charge_extra_request,
+        )
 
         # Cargar prompt para la personalidad Cínica
         prompt_cinico_template = """Eres un analista conversacional con la mordacidad de Oscar Wilde, la frialdad de Sherlock Holmes y el humor negro de un patólogo forense.
@@ -94,8 +311,98 @@ Resumen:"""
             logger.warning("Prompt cínico no encontrado. Usando valor por defecto.")
             prompt_cinico_template = "Eres un cínico por defecto."
 
-        # Instanciar handler cínico
-        self.handler = CinicoHandler(prompt_cinico_template, EMPTY_CINICO_RESPONSES)
+        # Instanciar handler cínico, con la compactación de mensajes configurada
+        compaction_steps = parse_steps(PROMPT_COMPACTION_STEPS)
+        compactor = PromptCompactor(
+            compaction_steps,
+            token_budget=PROMPT_TOKEN_BUDGET,
+            near_duplicate_ratio=PROMPT_NEAR_DUPLICATE_RATIO,
+            max_code_chars=PROMPT_MAX_CODE_CHARS,
+        ) if compaction_steps else None
+        self.handler = CinicoHandler(prompt_cinico_template, EMPTY_CINICO_RESPONSES, compactor)
+
+        # Persistencia de los mensajes (SQLite WAL por defecto)
+        self.storage = storage or create_storage_backend(
+            STORAGE_BACKEND, SQLITE_PATH, SQLITE_BATCH_SIZE, SQLITE_FLUSH_INTERVAL
+        )
+
+        # Buffers circulares por chat con presupuesto global de memoria; las
+        # métricas del handler se actualizan al entrar y salir cada mensaje
+        self.message_store = MessageStore(
+            ULTIMOS_MENSAJES,
+            MAX_BUFFER_BYTES,
+            on_append=self.handler.track_message,
+            on_evict=self.handler.untrack_message,
+            on_drop=self._forget_chat,
+            backend=self.storage,
+        )
+
+        # Resúmenes ya generados para una misma ventana de mensajes
+        self.summary_cache = SummaryCache(SUMMARY_CACHE_TTL, SUMMARY_CACHE_SIZE)
+
+        # Un solo resumen en curso por chat, con período de espera posterior
+        self.summary_flight = SingleFlight()
+        self.summary_cooldown = Cooldown(SUMMARY_COOLDOWN)
+
+        # Todas las llamadas al LLM pasan por un planificador global con
+        # límites de tasa y turnos equitativos entre chats
+        self.llm_scheduler = LLMScheduler(
+            LLM_WORKERS, LLM_MAX_QUEUE, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE
+        )
+
+        # Ventanas largas se resumen por bloques en lugar de rechazarse
+        self.summarizer = HierarchicalSummarizer(
+            self.handler,
+            self._complete,
+            prompt_char_limit=SUMMARY_PROMPT_CHAR_LIMIT,
+            chunk_tokens=SUMMARY_CHUNK_TOKENS,
+            max_concurrency=SUMMARY_MAP_CONCURRENCY,
+            stream=self._complete_streaming,
+        )
+
+        # Resumen acumulado por chat, mantenido con llamadas de baja prioridad
+        self.rolling: Optional[RollingSummarizer] = None
+        if ROLLING_SUMMARIES:
+            self.rolling = RollingSummarizer(
+                self.handler,
+                self.message_store,
+                self.summarizer,
+                HierarchicalSummarizer(
+                    self.handler,
+                    self._complete_background,
+                    prompt_char_limit=SUMMARY_PROMPT_CHAR_LIMIT,
+                    chunk_tokens=SUMMARY_CHUNK_TOKENS,
+                    max_concurrency=SUMMARY_MAP_CONCURRENCY,
+                ),
+                every_messages=ROLLING_EVERY_MESSAGES,
+                idle_seconds=ROLLING_IDLE_SECONDS,
+            )
+
+        # Envíos a Telegram: en orden dentro de cada chat, en paralelo entre chats
+        self.outbound = OutboundSender(
+            TELEGRAM_GLOBAL_RATE,
+            TELEGRAM_CHAT_RATE,
+            TELEGRAM_CHAT_BURST,
+            TELEGRAM_GROUP_PER_MINUTE,
+            TELEGRAM_SEND_RETRIES,
+        )
+
+        # Endpoint de métricas y profiler bajo demanda
+        self.metrics_server: Optional[MetricsServer] = None
+        self.profiler = ProfilerToggle(dump_path=PROFILE_DUMP_PATH)
+
+        # Updates en paralelo entre chats y en orden dentro de cada uno
+        self.update_processor: Optional[ChatUpdateProcessor] = None
+        if CONCURRENT_UPDATES > 1:
+            self.update_processor = ChatUpdateProcessor(CONCURRENT_UPDATES, INGEST_CONCURRENCY, COMMAND_CONCURRENCY)
+
+        # Modo multiproceso: índice del shard en los workers, supervisor y relay en el frontal
+        self.shard: Optional[int] = None
+        self.supervisor: Optional["ShardSupervisor"] = None
+        self.relay: Optional["TelegramRelay"] = None
+        self.app: Optional[Application] = None
+        # En modo webhook, lo activan las señales de cierre (y un token rechazado)
+        self._stop_event: Optional[asyncio.Event] = None
 
     def get_intro(self) -> str:
         """Obtiene una introducción del handler."""
@@ -103,155 +410,437 @@ Resumen:"""
 
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        await update.message.reply_text(
+        await self._reply(
+            update,
             "¡Hola! Soy un bot de resúmenes con personalidad cínica.\n"
             "Si necesitas un resumen, usa /resumen o /resumido"
         )
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        # Debug: Log all incoming updates
-        logger.info(f"🔍 Update recibido: {update}")
-        print(f"🔍 Update recibido - Tipo: {type(update)}")
-
-        if update.message:
-            print(f"📨 Mensaje detectado - Tipo de chat: {update.message.chat.type}")
-            logger.info(f"Mensaje detectado - Tipo de chat: {update.message.chat.type}")
-
-        if update.message and update.message.chat.type in ['group', 'supergroup'] and update.message.text:
-            chat_id = update.message.chat.id
-            user = update.message.from_user.first_name if update.message.from_user else "UsuarioDesconocido"
-            print(f"📨 Mensaje recibido de {user} en chat {chat_id}")
-            logger.info(f"Mensaje recibido en chat {chat_id} de {user}: {update.message.text[:50]}...")
-            self.messages_buffer[chat_id].append({
-                'user': user,
-                'text': update.message.text[:MAX_MESSAGE_LENGTH],
-                'timestamp': datetime.now()
-            })
-        elif update.message and update.message.chat.type == 'private':
-            print(f"💬 Mensaje privado recibido")
-            logger.info("Mensaje privado recibido")
+        message = update.message
+        if message and message.chat.type in ['group', 'supergroup'] and message.text:
+            started = time.perf_counter()
+            chat_id = message.chat.id
+            record = normalize_message(
+                message.from_user.first_name if message.from_user else None, message.text,
+                message_id=message.message_id,
+            )
+            # Evento de alto volumen: muestreado y sin formatear si el nivel no lo emite
+            log_event(logger, "mensaje_recibido", logging.INFO, chat_id=chat_id, user=record['user'],
+                      length=len(message.text))
+            # Si el chat no está en memoria, leer su historia fuera del event loop
+            await self.message_store.preload(chat_id)
+            self.message_store.append(chat_id, record)
+            if self.rolling is not None:
+                self.rolling.on_message(chat_id)
+            HANDLE_MESSAGE_SECONDS.observe(time.perf_counter() - started)
+        elif message and message.chat.type == 'private':
+            log_event(logger, "mensaje_privado", logging.DEBUG)
         else:
-            print(f"❌ Mensaje no procesado - Tipo: {update.message.chat.type if update.message else 'None'}")
-            logger.info(f"Mensaje no procesado - Tipo: {update.message.chat.type if update.message else 'None'}")
+            log_event(logger, "mensaje_no_procesado", logging.DEBUG,
+                      chat_type=lambda: message.chat.type if message else None)
 
-            # Limitar a los últimos ULTIMOS_MENSAJES mensajes
-            if len(self.messages_buffer[chat_id]) > ULTIMOS_MENSAJES:
-                self.messages_buffer[chat_id] = self.messages_buffer[chat_id][-ULTIMOS_MENSAJES:]
+    def build_prompt(self, messages: List[Dict[str, Any]], chat_id: Optional[int] = None) -> str:
+        # Delegar la construcción del prompt al handler
+        return self.handler.get_prompt(messages, chat_id=chat_id)
 
-            # Filtrar mensajes por hora (ej. última hora)
-            # now = datetime.now()
-            # self.messages_buffer[chat_id] = [
-            #     msg for msg in self.messages_buffer[chat_id]
-            #     if (now - msg['timestamp']) < timedelta(hours=1)
-            # ]
+    async def query_llama(self, prompt: str) -> str:
+        summary, _ = await self._run_llm(lambda: self._complete(prompt, None))
+        return summary
 
-    def build_prompt(self, messages: List[Dict[str, Any]]) -> str:
-        # Delegar la construcción del prompt al handler
-        return self.handler.get_prompt(messages)
+    async def _complete(self, prompt: str, chat_id: Optional[int]) -> str:
+        """Llama al LLM a través del planificador, en el turno del chat que lo pidió."""
+        models = current_models()
+        return await self.llm_scheduler.submit(
+            chat_id,
+            lambda: self._timed_llm_call(self.llm_client.complete(prompt), models),
+            tokens=estimate_tokens(prompt) + LLM_COMPLETION_TOKENS,
+        )
 
-    def query_llama(self, prompt: str) -> str:
-        if not OPENROUTER_API_KEY:
-            logger.error("OPENROUTER_API_KEY no está configurado.")
-            return "Error: La API key para el servicio de resumen no está configurada."
+    async def _charge_extra_request(self, prompt: str, wait: bool) -> bool:
+        """
+        Cobra en los límites del planificador una petición adicional del router
+        (duplicada o cambio de modelo) dentro de una llamada que ya tiene turno.
+        """
+        return await self.llm_scheduler.charge_extra(estimate_tokens(prompt) + LLM_COMPLETION_TOKENS, wait)
+
+    async def _complete_background(self, prompt: str, chat_id: Optional[int]) -> str:
+        """Como _complete, pero en el carril de baja prioridad del planificador."""
+        models = current_models()
+        return await self.llm_scheduler.submit(
+            chat_id,
+            lambda: self._timed_llm_call(self.llm_client.complete(prompt), models),
+            tokens=estimate_tokens(prompt) + LLM_COMPLETION_TOKENS,
+            background=True,
+        )
+
+    async def _complete_streaming(self, prompt: str, chat_id: Optional[int],
+                                  on_delta: Callable[[str], Awaitable[None]]) -> str:
+        """
+        Como _complete, pero consume la respuesta en streaming y entrega el texto a on_delta.
+
+        El worker del planificador solo lee el stream y acumula lo recibido; los
+        envíos a Telegram (con sus límites y pausas por control de flujo) los hace
+        esta tarea, así que un chat lento para Telegram no retiene workers del LLM.
+        on_delta recibe juntos los fragmentos llegados mientras se enviaba el anterior.
+        """
+        pending: List[str] = []
+        arrived = asyncio.Event()
+        abandoned = asyncio.Event()
+
+        async def consume() -> str:
+            parts = []
+            async for delta in self.llm_client.stream(prompt):
+                if abandoned.is_set():
+                    # Quien mostraba el stream falló o se canceló: nadie espera el resto
+                    break
+                parts.append(delta)
+                pending.append(delta)
+                arrived.set()
+            return "".join(parts).strip()
+
+        models = current_models()
+        job = asyncio.ensure_future(self.llm_scheduler.submit(
+            chat_id, lambda: self._timed_llm_call(consume(), models), tokens=estimate_tokens(prompt) + LLM_COMPLETION_TOKENS
+        ))
         try:
-            headers = {
-                "Authorization": "Bearer " + OPENROUTER_API_KEY,
-                "Content-Type": "application/json",
-                # "HTTP-Referer": "<YOUR_SITE_URL>", # Opcional
-                # "X-Title": "<YOUR_SITE_NAME>", # Opcional
-            }
-            logger.info(f"API Key: {OPENROUTER_API_KEY}")
-            logger.info(f"Headers: {headers}")
-            response = requests.post(
-                url="https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                data=json.dumps({
-                    "model": "deepseek/deepseek-chat-v3.1:free", # Modelo de ejemplo
-                    "messages": [{"role": "user", "content": prompt}]
-                })
-            )
-            response.raise_for_status() # Lanza un error para respuestas 4xx/5xx
-            result = response.json()
+            while True:
+                if not pending:
+                    if job.done():
+                        break
+                    waiter = asyncio.ensure_future(arrived.wait())
+                    try:
+                        await asyncio.wait((job, waiter), return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        waiter.cancel()
+                    arrived.clear()
+                    continue
+                text = "".join(pending)
+                pending.clear()
+                await on_delta(text)
+            return job.result()
+        finally:
+            if not job.done():
+                abandoned.set()
+                job.cancel()
 
-            if result.get('choices') and result['choices'][0].get('message') and result['choices'][0]['message'].get('content'):
-                return result['choices'][0]['message']['content'].strip()
-            else:
-                logger.error(f"Respuesta inesperada de la API: {result}")
-                return "Hubo un error inesperado y no pude procesar el resumen."
+    @staticmethod
+    async def _timed_llm_call(call: Awaitable[str], models: Optional[List[str]] = None) -> str:
+        """
+        Mide la latencia de una llamada al LLM según su resultado.
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error de red o HTTP generando resumen: {e}")
-            return "Error de conexión. Intenta más tarde."
-        except Exception as e:
-            logger.error(f"Error generando resumen: {e}")
-            return "Error al generar el resumen. Intenta más tarde."
+        La llamada corre en un worker del planificador: `models` es la lista del
+        pedido original donde se anota qué modelo respondió.
+        """
+        with LLM_REQUEST_SECONDS.time(outcome="error") as labels, record_models(models):
+            try:
+                result = await call
+            except LLMResponseError:
+                labels["outcome"] = "response_error"
+                raise
+            except LLMConnectionError:
+                labels["outcome"] = "connection_error"
+                raise
+            labels["outcome"] = "ok"
+            return result
+
+    async def _run_llm(self, call: Callable[[], Awaitable[str]]) -> Tuple[str, bool]:
+        """Ejecuta una llamada al LLM. Devuelve el texto (o el error para el usuario) y si tuvo éxito."""
+        if not self.llm_client.api_key:
+            logger.error("OPENROUTER_API_KEY no está configurado.")
+            return "Error: La API key para el servicio de resumen no está configurada.", False
+        with SUMMARY_SECONDS.time(outcome="error") as labels:
+            try:
+                result = await call()
+                labels["outcome"] = "ok"
+                return result, True
+            except SchedulerBusy as e:
+                labels["outcome"] = "busy"
+                logger.warning(str(e))
+                return self.handler.get_busy_response(), False
+            except LLMResponseError as e:
+                labels["outcome"] = "response_error"
+                logger.error(str(e))
+                return "Hubo un error inesperado y no pude procesar el resumen.", False
+            except LLMConnectionError as e:
+                labels["outcome"] = "connection_error"
+                logger.error(f"Error de red o HTTP generando resumen: {e}")
+                return "Error de conexión. Intenta más tarde.", False
+            except Exception as e:
+                logger.error(f"Error generando resumen: {e}")
+                return "Error al generar el resumen. Intenta más tarde.", False
+
+    async def _reply(self, update: Update, text: str) -> None:
+        """Responde al mensaje del update (por la cola de su chat) midiendo el tiempo de envío."""
+        message = update.message
+        with REPLY_SEND_SECONDS.time():
+            await self.outbound.send(message.chat.id, lambda: message.reply_text(text))
+
+    async def _send_summary(self, update: Update, summary_result: str) -> None:
+        """Envía el resumen, dividido en párrafos u oraciones si supera MAX_MESSAGE_LENGTH."""
+        message = update.message
+        with REPLY_SEND_SECONDS.time():
+            await self.outbound.send_text(message.chat.id, message.reply_text, summary_result, MAX_MESSAGE_LENGTH)
+
+    async def _generate_summary(self, chat_id: int, messages: List[Dict[str, Any]], cache_key: CacheKey,
+                                on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+                                seq: Optional[int] = None) -> Tuple[str, bool]:
+        """Obtiene el resumen de la ventana; se ejecuta una sola vez por ventana a la vez."""
+        if self.rolling is not None and seq is not None:
+            # Partir del resumen acumulado y plegar solo los mensajes posteriores
+            call = lambda: self.rolling.summarize(chat_id, messages, seq, on_delta)
+        else:
+            # Una sola pasada si el prompt es corto; si no, resumen jerárquico por bloques
+            call = lambda: self.summarizer.summarize(messages, chat_id, on_delta)
+        with record_models([]) as models:
+            summary_result, ok = await self._run_llm(call)
+        if ok:
+            self.summary_cache.put(cache_key, summary_result)
+            self.summary_cooldown.mark(chat_id)
+            if models:
+                # La última llamada es la pasada final: ese modelo escribió la respuesta
+                SUMMARY_MODELS.inc(model=models[-1])
+                logger.info(f"Resumen del chat {chat_id} generado con el modelo {models[-1]} ({len(models)} llamadas)")
+        return summary_result, ok
+
+    def _window_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> Tuple[Optional[datetime], bool]:
+        """
+        Inicio de la ventana pedida: un argumento (30m, 2h, 1d) o el mensaje al que se responde.
+
+        Returns:
+            Tuple[Optional[datetime], bool]: Inicio (None = todo el buffer) y si el pedido es válido.
+        """
+        args = getattr(context, 'args', None) or []
+        if args:
+            window = parse_window(args[0])
+            if window is None:
+                return None, False
+            return datetime.now() - window, True
+        anchor = getattr(update.message, 'reply_to_message', None)
+        if anchor is not None and anchor.date is not None:
+            # "Desde este mensaje": el anchor y todo lo posterior
+            return anchor.date, True
+        return None, True
+
+    @staticmethod
+    def _flight_key(chat_id: int, update: Update, context: ContextTypes.DEFAULT_TYPE) -> Hashable:
+        """
+        Clave de coalescencia de /resumen: el chat y la ventana tal como se pidió.
+
+        No depende del contenido de la ventana: un mensaje que llega entre dos
+        /resumen del mismo chat no debe lanzar una segunda llamada al LLM.
+        """
+        args = getattr(context, 'args', None) or []
+        if args:
+            return chat_id, args[0].lower()
+        anchor = getattr(update.message, 'reply_to_message', None)
+        if anchor is not None and anchor.date is not None:
+            return chat_id, ('desde', getattr(anchor, 'message_id', None), anchor.date)
+        return chat_id, None
 
     async def resumen(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id = update.message.chat.id
-        messages = self.messages_buffer.get(chat_id, [])
+        since, valid = self._window_start(update, context)
+        if not valid:
+            await self._reply(update, RESUMEN_USAGE)
+            return
+        await self.message_store.preload(chat_id)
+        messages = self.message_store.get(chat_id, since=since)
+        # La ventana completa puede partir del resumen acumulado; una parcial no
+        seq = self.message_store.seq(chat_id) if since is None else None
 
         if not messages:
             # Obtener respuesta vacía del handler
+            RESUMEN_REQUESTS.inc(result="empty")
             empty_response = self.handler.get_empty_response()
-            await update.message.reply_text(empty_response)
+            await self._reply(update, empty_response)
+            return
+
+        CHAT_BUFFER_MESSAGES.observe(len(messages))
+
+        # Si la ventana no cambió desde el último resumen, responder desde la caché
+        cache_key = self.summary_cache.make_key(chat_id, messages, self.handler.version)
+        cached_summary = self.summary_cache.get(cache_key)
+        if cached_summary is not None:
+            logger.info(f"Resumen para el chat {chat_id} servido desde la caché")
+            RESUMEN_REQUESTS.inc(result="cache")
+            await self._reply(update, self.get_intro())
+            await self._send_summary(update, cached_summary)
             return
 
-        prompt_text = self.build_prompt(messages)
+        # Fuera de un resumen en curso, respetar el período de espera del chat
+        flight_key = self._flight_key(chat_id, update, context)
+        if not self.summary_flight.in_flight(flight_key) and self.summary_cooldown.remaining(chat_id) > 0:
+            self.summary_cooldown.rejected += 1
+            RESUMEN_REQUESTS.inc(result="cooldown")
+            await self._reply(update, self.handler.get_cooldown_response())
+            return
 
-        # Podríamos añadir una validación más robusta para la longitud del prompt
-        if len(prompt_text) > 4000: # Límite arbitrario, ajustar según el modelo
-            logger.warning(f"El prompt para el chat {chat_id} es muy largo.")
-            await update.message.reply_text("Demasiados mensajes para procesar en este momento... Intenta con menos mensajes.")
+        # Con la cola del LLM llena, responder de inmediato en lugar de esperar
+        if not self.summary_flight.in_flight(flight_key) and self.llm_scheduler.saturated:
+            self.llm_scheduler.rejected += 1
+            RESUMEN_REQUESTS.inc(result="busy")
+            await self._reply(update, self.handler.get_busy_response())
             return
 
+        RESUMEN_REQUESTS.inc(result="generated")
         intro_message = self.get_intro()
-        await update.message.reply_text(intro_message) # Enviar intro primero
+        # La intro se encola sin esperar a que salga: el resumen empieza (o se une al que
+        # está en curso) de inmediato, y la cola del chat la envía antes que el resumen
+        message = update.message
+        intro = self.outbound.post(chat_id, lambda: message.reply_text(intro_message))
+
+        # En modo streaming, quien genera el resumen lo va mostrando mientras llega
+        reply = ProgressiveReply(
+            message, MAX_MESSAGE_LENGTH, STREAM_EDIT_INTERVAL,
+            send=lambda text: self.outbound.send(chat_id, lambda: message.reply_text(text)),
+            edit=lambda sent, text: self.outbound.send(chat_id, lambda: sent.edit_text(text)),
+        ) if STREAM_RESPONSES else None
 
-        summary_result = self.query_llama(prompt_text)
+        # Si ya hay un resumen en curso para esta ventana del chat, esperar ese mismo resultado
+        # aunque hayan llegado mensajes después de que empezó
+        summary_result, ok = await self.summary_flight.do(
+            flight_key, lambda: self._generate_summary(chat_id, messages, cache_key, reply.feed if reply else None, seq)
+        )
 
-        # Dividir mensajes largos si es necesario
-        if len(summary_result) > MAX_MESSAGE_LENGTH:
-            for i in range(0, len(summary_result), MAX_MESSAGE_LENGTH):
-                await update.message.reply_text(summary_result[i:i + MAX_MESSAGE_LENGTH])
+        await intro
+        if reply is not None and reply.started:
+            if not ok:
+                # El stream se cortó a mitad: dejar constancia en el mismo mensaje
+                await reply.feed("\n\n" + summary_result)
+            await reply.finish()
         else:
-            await update.message.reply_text(summary_result)
+            # Dividir mensajes largos si es necesario
+            await self._send_summary(update, summary_result)
 
         # Limpiar el buffer para este chat después de generar el resumen
-        # self.messages_buffer[chat_id] = [] # Opcional: decidir si limpiar o no
+        # self.message_store.drop(chat_id) # Opcional: decidir si limpiar o no
 
-    def _get_bot_username_sync(self) -> str:
-        """Obtiene el nombre de usuario del bot de forma síncrona"""
-        import requests
-        try:
-            response = requests.get(
-                f"https://api.telegram.org/bot{self.token}/getMe",
-                timeout=10
-            )
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('ok') and 'username' in data.get('result', {}):
-                    return data['result']['username']
-        except Exception as e:
-            logger.error(f"Error al obtener el username del bot: {e}")
-        return None
+    async def profile(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Comando de administración: activa o detiene cProfile y envía el reporte."""
+        user = update.message.from_user
+        if not user or user.id not in ADMIN_USER_IDS:
+            # Para el resto de usuarios el comando no existe
+            return
+        if not self.profiler.active:
+            self.profiler.start()
+            logger.info(f"Profiler activado por el usuario {user.id}")
+            await self._reply(update, "Profiler activado. Usa /profile otra vez para detenerlo.")
+            return
+        report = self.profiler.stop()
+        logger.info(f"Profiler detenido por el usuario {user.id}")
+        await self._send_summary(update, report)
+
+    def register_metrics_collectors(self) -> None:
+        """Expone los contadores internos (buffers, caché, cola del LLM...) como métricas."""
+        REGISTRY.register_collector("message_store", stats_collector(
+            "bot_message_store", self.message_store.stats, "Estado de los buffers de mensajes",
+            counters=("evicted_messages", "evicted_chats", "loaded_chats"),
+        ))
+        REGISTRY.register_collector("summary_cache", stats_collector(
+            "bot_summary_cache", self.summary_cache.stats, "Caché de resúmenes",
+            counters=("hits", "misses", "evictions", "expirations"),
+        ))
+        REGISTRY.register_collector("llm_scheduler", stats_collector(
+            "bot_llm_scheduler", self.llm_scheduler.stats, "Planificador de llamadas al LLM",
+            counters=("submitted", "completed", "rejected", "wait_seconds_total"),
+        ))
+        REGISTRY.register_collector("outbound", stats_collector(
+            "bot_outbound", self.outbound.stats, "Envíos a Telegram",
+            counters=("sent", "retried", "failed"),
+        ))
+        if self.update_processor is not None:
+            REGISTRY.register_collector("updates", stats_collector(
+                "bot_updates", self.update_processor.stats, "Procesamiento concurrente de updates",
+                counters=("processed_ingest", "processed_commands"),
+            ))
+        if isinstance(self.llm_client, ModelRouter):
+            REGISTRY.register_collector("llm_router", stats_collector(
+                "bot_llm_router", self.llm_client.stats, "Reparto de llamadas entre modelos",
+                counters=("breaker_opens", "hedges", "hedge_wins", "failovers"),
+            ))
+        REGISTRY.register_collector("summary_flight", stats_collector(
+            "bot_summary_flight", lambda: {**self.summary_flight.stats(), 'cooldown_rejected': self.summary_cooldown.rejected},
+            "Resúmenes en curso y coalescidos",
+            counters=("executed", "coalesced", "cooldown_rejected"),
+        ))
+
+    def _forget_chat(self, chat_id: int) -> None:
+        """El buffer del chat salió de memoria: descartar el estado derivado."""
+        self.handler.forget_chat(chat_id)
+        if self.rolling is not None:
+            self.rolling.forget(chat_id)
+
+    @property
+    def is_front(self) -> bool:
+        """True si este proceso solo reparte updates entre workers."""
+        return SHARDS > 1 and self.shard is None
+
+    async def _route_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Frontal: envía el update al worker dueño del chat."""
+        chat = update.effective_chat
+        self.supervisor.route(chat.id if chat else 0, update.to_dict())
+
+    async def _post_init(self, application: Application) -> None:
+        """Arranca los workers (en el frontal) y el endpoint de métricas si está configurado."""
+        STARTUP.mark("inicialización (getMe)")
+        if self.is_front and self.supervisor is None:
+            from .utils.sharding import ShardSupervisor, TelegramRelay
+            self.supervisor = ShardSupervisor(run_shard_worker, SHARDS)
+            self.relay = TelegramRelay(application.bot, self.supervisor.outbox, self.supervisor.replies,
+                                       TELEGRAM_GLOBAL_RATE)
+            self.relay.start()
+            self.supervisor.start()
+            REGISTRY.register_collector("shards", stats_collector(
+                "bot_shards", self.supervisor.stats, "Workers del modo multiproceso",
+                counters=("restarts", "routed"),
+            ))
+        if METRICS_PORT and self.metrics_server is None:
+            self.register_metrics_collectors()
+            self.metrics_server = MetricsServer(REGISTRY, METRICS_HOST, METRICS_PORT)
+            await self.metrics_server.start()
+            logger.info(f"Métricas disponibles en http://{METRICS_HOST}:{self.metrics_server.port}/metrics")
+        if BOT_MODE != "webhook":
+            # Con polling, la aplicación empieza a pedir updates apenas termina post_init
+            STARTUP.finish()
+
+    def _build_bot(self):
+        """Bot de la aplicación: con la identidad en caché si está configurada."""
+        if not BOT_IDENTITY_CACHE:
+            return None
+        from telegram.request import HTTPXRequest
+        from .utils.bot_identity import CachedIdentityBot
+        # Mismos pools que arma Application.builder() por defecto
+        return CachedIdentityBot(
+            self.token,
+            BOT_IDENTITY_CACHE,
+            on_invalid_token=self._token_rejected,
+            request=HTTPXRequest(connection_pool_size=256),
+            get_updates_request=HTTPXRequest(),
+        )
+
+    def _token_rejected(self) -> None:
+        """Telegram rechazó el token tras arrancar con la identidad en caché: detener el bot."""
+        logger.critical("Deteniendo el bot: el token fue rechazado por Telegram")
+        if self._stop_event is not None:
+            self._stop_event.set()
+        elif self.app is not None and self.app.running:
+            self.app.stop_running()
 
     def _setup_handlers(self):
         """Configura los manejadores de comandos"""
-        # Obtener el nombre de usuario del bot
-        self._bot_username = self._get_bot_username_sync()
-        
-        # Función para obtener variantes de comandos
-        def get_variants(cmd):
-            variants = [cmd]
-            if self._bot_username:
-                variants.append(f"{cmd}@{self._bot_username}")
-            return variants
+        if self.is_front:
+            # El frontal no procesa nada: todo update va al worker de su chat
+            self.app.add_handler(TypeHandler(Update, self._route_update))
+            return
 
-        # Configurar los manejadores
+        # Configurar los manejadores (CommandHandler ya acepta /cmd@usuario_del_bot,
+        # con el usuario que la aplicación obtiene al inicializarse)
         for cmd, handler in [
             ("start", self.start),
             ("resumen", self.resumen),
-            ("resumido", self.resumen)  # Alias
+            ("resumido", self.resumen),  # Alias
+            ("profile", self.profile),
         ]:
             self.app.add_handler(CommandHandler(cmd, handler))
         
@@ -261,6 +850,99 @@ Resumen:"""
             self.handle_message
         ))
 
+    async def _post_shutdown(self, application: Application) -> None:
+        """Libera los recursos asíncronos al detener la aplicación."""
+        if self.supervisor is not None:
+            # Primero los workers (que aún pueden enviar por el relay), después el relay
+            await self.supervisor.stop(SHARD_SHUTDOWN_TIMEOUT)
+            await self.relay.stop()
+            self.supervisor = None
+        if self.rolling is not None:
+            await self.rolling.close()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+            self.metrics_server = None
+        if self.profiler.active:
+            self.profiler.stop()
+        await self.outbound.close()
+        await self.llm_scheduler.close()
+        await self.llm_client.aclose()
+        # Vaciar las escrituras pendientes sin bloquear el event loop
+        await asyncio.to_thread(self.storage.close)
+
+    async def _run_webhook(self) -> None:
+        """Ejecuta la aplicación recibiendo updates por webhook hasta SIGINT/SIGTERM."""
+        app = self.app
+        await app.initialize()
+        await self._post_init(app)
+        await app.start()
+
+        server = WebhookServer(app, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET)
+        await server.start()
+        STARTUP.finish()
+        if WEBHOOK_URL:
+            await app.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            logger.info(f"Webhook registrado en {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+
+        stop_event = self._stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except NotImplementedError:
+                # Windows: Ctrl+C llega como KeyboardInterrupt
+                pass
+
+        try:
+            await stop_event.wait()
+        finally:
+            logger.info("Deteniendo webhook: drenando updates en curso...")
+            await server.stop(WEBHOOK_DRAIN_TIMEOUT)
+            # stop() procesa los updates que ya estaban encolados antes de terminar
+            await app.stop()
+            await app.shutdown()
+            await self._post_shutdown(app)
+
+    async def serve_shard(self, shard: int, inbox, outbox, replies) -> None:
+        """
+        Worker: procesa los updates de su shard hasta recibir None por inbox.
+
+        Args:
+            shard (int): Índice del shard.
+            inbox (multiprocessing.Queue): Updates serializados enviados por el frontal.
+            outbox (multiprocessing.Queue): Peticiones a Telegram hacia el relay del frontal.
+            replies (multiprocessing.Queue): Respuestas del relay para este worker.
+        """
+        from .utils.sharding import RemoteBot
+        self.shard = shard
+        remote = RemoteBot(self.token, shard, outbox, replies)
+        # El límite global lo aplica el relay del frontal, sumando todos los workers
+        self.outbound.global_bucket.rate = 0
+        builder = Application.builder().bot(remote).updater(None)
+        if self.update_processor is not None:
+            builder = builder.concurrent_updates(self.update_processor)
+        self.app = builder.build()
+        self._setup_handlers()
+        await self.app.initialize()
+        await self.app.start()
+        logger.info(f"Shard {shard} listo")
+        try:
+            while True:
+                payload = await asyncio.to_thread(inbox.get)
+                if payload is None:
+                    break
+                await self.app.update_queue.put(Update.de_json(payload, remote))
+        finally:
+            await self.app.stop()
+            await self.app.shutdown()
+            await self._post_shutdown(self.app)
+            await remote.close_relay()
+            logger.info(f"Shard {shard} detenido")
+
     def run(self) -> None:
         if not self.token:
             print("❌ ERROR: No se puede iniciar el bot: BOT_TOKEN no está configurado.")
@@ -269,40 +951,71 @@ Resumen:"""
 
         print("🔧 Configurando aplicación de Telegram...")
         # Crear la aplicación
-        self.app = Application.builder().token(self.token).build()
+        builder = Application.builder()
+        bot = self._build_bot()
+        builder = builder.bot(bot) if bot is not None else builder.token(self.token)
+        if self.update_processor is not None and not self.is_front:
+            # El frontal solo reparte updates: de a uno, en el orden en que llegan
+            builder = builder.concurrent_updates(self.update_processor)
+        self.app = builder.post_init(self._post_init).post_shutdown(self._post_shutdown).build()
         print("✅ Aplicación creada")
+        STARTUP.mark("aplicación creada")
 
         # Configurar los manejadores
         print("🔧 Configurando manejadores...")
         self._setup_handlers()
         print("✅ Manejadores configurados")
+        STARTUP.mark("manejadores")
 
         print("🔮 El bot cínico está despertando...")
         logger.info("🔮 El bot cínico está despertando...")
 
         # Configurar el event loop
-        import asyncio
         import platform
 
         if platform.system() == 'Windows':
             print("🔧 Configurando event loop para Windows...")
             asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
+        if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+            print("❌ ERROR: BOT_MODE=webhook requiere WEBHOOK_SECRET")
+            logger.critical("No se puede iniciar el webhook: WEBHOOK_SECRET no está configurado.")
+            return
+
         try:
-            print("🔄 Iniciando polling de Telegram...")
             # Crear un nuevo event loop
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
 
-            print("✅ Bot iniciado correctamente. Esperando mensajes...")
-            # Iniciar el bot
-            self.app.run_polling()
+            if BOT_MODE == "webhook":
+                print(f"🔄 Iniciando servidor webhook en {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH}...")
+                print("✅ Bot iniciado correctamente. Esperando updates...")
+                loop.run_until_complete(self._run_webhook())
+            else:
+                if SHARDS > 1:
+                    print(f"🧩 Modo multiproceso: {SHARDS} workers")
+                print("🔄 Iniciando polling de Telegram...")
+                print("✅ Bot iniciado correctamente. Esperando mensajes...")
+                # Iniciar el bot
+                self.app.run_polling()
 
         except Exception as e:
             print(f"❌ Error fatal al ejecutar el bot: {e}")
             logger.critical(f"Error fatal al ejecutar el bot: {e}", exc_info=True)
             raise
 
+def run_shard_worker(shard: int, inbox, outbox, replies) -> None:
+    """Punto de entrada de cada proceso worker del modo multiproceso."""
+    # Ctrl+C llega a todo el grupo de procesos: el frontal es quien ordena el cierre
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from .utils.sharding import shard_path
+    storage = create_storage_backend(
+        STORAGE_BACKEND, shard_path(SQLITE_PATH, shard), SQLITE_BATCH_SIZE, SQLITE_FLUSH_INTERVAL
+    )
+    bot = CinicoSummaryBot(BOT_TOKEN, storage=storage)
+    asyncio.run(bot.serve_shard(shard, inbox, outbox, replies))
+
+
 def main() -> None:
     print("🚀 Iniciando bot...")
     logger.info("🚀 Iniciando bot...")
@@ -321,8 +1034,10 @@ def main() -> None:
 
     try:
         print("🤖 Creando instancia del bot...")
-        bot = CinicoSummaryBot(BOT_TOKEN)
+        # En modo multiproceso los buffers viven en los workers, no en el frontal
+        bot = CinicoSummaryBot(BOT_TOKEN, storage=MemoryBackend() if SHARDS > 1 else None)
         print("✅ Bot creado exitosamente")
+        STARTUP.mark("bot creado")
         print("🔄 Iniciando polling...")
         bot.run()
     except Exception as e:
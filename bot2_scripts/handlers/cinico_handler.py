@@ -1,10 +1,39 @@
+import hashlib
+import logging
 import os
 import random
 import re
-from collections import Counter
-from typing import List, Dict, Any
+from collections import Counter, deque
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 
+from ..utils.metrics import REGISTRY, SIZE_BUCKETS
+from ..utils.prompt_compaction import PromptCompactor
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r'\b\w+\b')
+
+# Palabras comunes que no cuentan como temas
+STOP_WORDS = {'el', 'la', 'de', 'que', 'y', 'a', 'en', 'un', 'es', 'se', 'no', 'te', 'lo', 'le', 'da', 'su', 'por', 'son', 'con', 'para', 'al', 'del', 'los', 'las', 'como', 'pero', 'sus', 'me', 'ha', 'o', 'si', 'porque', 'esta', 'son', 'mi', 'ese', 'ella', 'tan', 'entre', 'cuando', 'muy', 'sin', 'sobre', 'ser', 'tiene', 'yo', 'todo', 'esta', 'era', 'eso'}
+
+# Palabras que suman a la tasa de negatividad
+NEGATIVE_WORDS = {'no', 'mal', 'terrible', 'odio', 'horrible', 'peor', 'chimbo', 'cagada', 'malo'}
+
+TOP_K = 5
+
+PROMPT_BUILD_SECONDS = REGISTRY.histogram(
+    "bot_prompt_build_seconds", "Tiempo de construcción del prompt por etapa", labels=("stage",)
+)
+PROMPT_CHARS = REGISTRY.histogram(
+    "bot_prompt_chars", "Largo en caracteres de los prompts construidos", labels=("kind",), buckets=SIZE_BUCKETS
+)
+PROMPT_COMPACTION_RATIO = REGISTRY.histogram(
+    "bot_prompt_compaction_ratio", "Caracteres de los mensajes tras la compactación sobre los originales",
+    labels=("kind",), buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+)
+
 @dataclass
 class ChatMetrics:
     total_messages: int
@@ -15,37 +44,358 @@ class ChatMetrics:
     chaos_level: int
     repetition_rate: float
 
+
+def format_time_span(first: Optional[datetime], last: Optional[datetime]) -> str:
+    """
+    Describe en palabras el período cubierto entre dos timestamps.
+
+    Args:
+        first (Optional[datetime]): Timestamp del mensaje más antiguo.
+        last (Optional[datetime]): Timestamp del mensaje más reciente.
+
+    Returns:
+        str: Descripción legible, p. ej. "últimos 35 minutos".
+    """
+    if first is None or last is None:
+        return "desconocido"
+    seconds = max(0, (last - first).total_seconds())
+    if seconds < 60:
+        return "último minuto"
+    if seconds < 3600:
+        minutes = round(seconds / 60)
+        return "último minuto" if minutes <= 1 else f"últimos {minutes} minutos"
+    if seconds < 86400:
+        hours = round(seconds / 3600)
+        return "última hora" if hours <= 1 else f"últimas {hours} horas"
+    days = round(seconds / 86400)
+    return "último día" if days <= 1 else f"últimos {days} días"
+
+
+class ChatMetricsTracker:
+    """
+    Métricas de un chat mantenidas de forma incremental.
+
+    Cada mensaje se tokeniza una sola vez al entrar (add) y otra al salir
+    (remove), así que construir las métricas no depende del volumen de texto.
+    """
+
+    def __init__(self):
+        self.total_messages = 0
+        self.user_counts: Counter = Counter()
+        self.word_counts: Counter = Counter()
+        self.negative_hits = 0
+        self._timestamps: deque = deque()
+        self._last_timestamp: Optional[datetime] = None
+        self._top_users: Optional[List[str]] = None
+        self._top_words: Optional[List[str]] = None
+        # Último mensaje agregado: identifica la ventana junto con la cantidad de mensajes
+        self._newest: Optional[Tuple[Any, Any]] = None
+
+    @staticmethod
+    def _key(message: Dict[str, Any]) -> Tuple[Any, Any]:
+        return message.get('message_id'), message.get('timestamp')
+
+    def covers(self, messages: List[Dict[str, Any]]) -> bool:
+        """
+        Indica si las métricas acumuladas corresponden exactamente a estos mensajes.
+
+        Con el buffer lleno la cantidad de mensajes no cambia aunque la ventana
+        avance: además tienen que coincidir el mensaje más reciente y la fecha
+        del más antiguo.
+        """
+        if not messages or self.total_messages != len(messages):
+            return False
+        if self._newest != self._key(messages[-1]):
+            return False
+        return not self._timestamps or self._timestamps[0] == messages[0].get('timestamp')
+
+    @staticmethod
+    def _tokens(message: Dict[str, Any]) -> List[str]:
+        return WORD_RE.findall(message.get('text', '').lower())
+
+    def add(self, message: Dict[str, Any]) -> None:
+        """Incorpora un mensaje nuevo a las métricas."""
+        self.total_messages += 1
+        if 'user' in message:
+            self.user_counts[message['user']] += 1
+        for word in self._tokens(message):
+            if word in NEGATIVE_WORDS:
+                self.negative_hits += 1
+            if word not in STOP_WORDS and len(word) > 3:
+                self.word_counts[word] += 1
+        timestamp = message.get('timestamp')
+        if timestamp is not None:
+            self._timestamps.append(timestamp)
+            if self._last_timestamp is None or timestamp > self._last_timestamp:
+                self._last_timestamp = timestamp
+        self._newest = self._key(message)
+        self._top_users = self._top_words = None
+
+    def remove(self, message: Dict[str, Any]) -> None:
+        """Retira de las métricas un mensaje descartado del buffer."""
+        self.total_messages -= 1
+        user = message.get('user')
+        if user is not None:
+            self.user_counts[user] -= 1
+            if self.user_counts[user] <= 0:
+                del self.user_counts[user]
+        for word in self._tokens(message):
+            if word in NEGATIVE_WORDS:
+                self.negative_hits -= 1
+            if word in self.word_counts:
+                self.word_counts[word] -= 1
+                if self.word_counts[word] <= 0:
+                    del self.word_counts[word]
+        timestamp = message.get('timestamp')
+        if timestamp is not None and self._timestamps:
+            # Los mensajes salen en orden FIFO, así que normalmente es el primero
+            if self._timestamps[0] == timestamp:
+                self._timestamps.popleft()
+            else:
+                try:
+                    self._timestamps.remove(timestamp)
+                except ValueError:
+                    pass
+            if not self._timestamps:
+                self._last_timestamp = None
+        self._top_users = self._top_words = None
+
+    def build(self, top_k: int = TOP_K) -> ChatMetrics:
+        """
+        Construye las métricas a partir del estado acumulado.
+
+        Los rankings se recalculan solo si hubo cambios desde la última
+        llamada; el costo depende del vocabulario de la ventana y de top_k,
+        no del texto total.
+
+        Args:
+            top_k (int): Cantidad de usuarios y temas a destacar.
+
+        Returns:
+            ChatMetrics: Las métricas del chat.
+        """
+        total_msgs = self.total_messages
+        if self._top_users is None:
+            self._top_users = [user for user, _ in self.user_counts.most_common(top_k)]
+        if self._top_words is None:
+            self._top_words = [word for word, _ in self.word_counts.most_common(top_k)]
+
+        # Calcular nivel de caos (basado en interrupciones y cambios de tema)
+        chaos_level = min(10, len(self.user_counts) // 2 + random.randint(1, 3))
+
+        first = self._timestamps[0] if self._timestamps else None
+        return ChatMetrics(
+            total_messages=total_msgs,
+            active_users=list(self._top_users),
+            time_span=format_time_span(first, self._last_timestamp),
+            dominant_topics=list(self._top_words),
+            sentiment_score=self.negative_hits / total_msgs if total_msgs > 0 else 0,
+            chaos_level=chaos_level,
+            repetition_rate=sum(self.user_counts.values()) / total_msgs if total_msgs > 0 else 0
+        )
+
 class CinicoHandler:
-    def __init__(self, prompt_template: str, empty_responses: List[str]):
+    # Subir cuando cambie la forma de construir el prompt, para invalidar resúmenes cacheados
+    VERSION = "3"
+
+    def __init__(self, prompt_template: str, empty_responses: List[str],
+                 compactor: Optional[PromptCompactor] = None):
         """
         Inicializa el handler para la personalidad Cínica.
 
         Args:
             prompt_template (str): La plantilla del prompt a usar.
             empty_responses (List[str]): Lista de respuestas para cuando no hay mensajes.
+            compactor (Optional[PromptCompactor]): Si se indica, los mensajes se compactan
+                antes de armar cada prompt (las métricas siguen usando la ventana completa).
         """
         if not prompt_template:
             raise ValueError("La plantilla del prompt no puede estar vacía para CinicoHandler.")
         self.prompt_template = prompt_template
         self.empty_responses = empty_responses or ["Supongo que el silencio es oro, o simplemente nadie tiene nada que decir."]
+        # Métricas incrementales por chat
+        self._trackers: Dict[int, ChatMetricsTracker] = {}
+        self.compactor = compactor
+        fingerprint = prompt_template + (compactor.fingerprint if compactor else "")
+        self.version = f"cinico-{self.VERSION}-{hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()[:12]}"
+
+    def track_message(self, chat_id: int, message: Dict[str, Any]) -> None:
+        """
+        Actualiza las métricas del chat con un mensaje nuevo.
 
-    def get_prompt(self, messages: List[Dict[str, Any]]) -> str:
+        Args:
+            chat_id (int): ID del chat.
+            message (Dict[str, Any]): Mensaje agregado al buffer.
+        """
+        tracker = self._trackers.get(chat_id)
+        if tracker is None:
+            tracker = self._trackers[chat_id] = ChatMetricsTracker()
+        tracker.add(message)
+
+    def untrack_message(self, chat_id: int, message: Dict[str, Any]) -> None:
+        """
+        Retira de las métricas del chat un mensaje descartado del buffer.
+
+        Args:
+            chat_id (int): ID del chat.
+            message (Dict[str, Any]): Mensaje descartado.
+        """
+        tracker = self._trackers.get(chat_id)
+        if tracker is not None:
+            tracker.remove(message)
+
+    def forget_chat(self, chat_id: int) -> None:
+        """Descarta todas las métricas acumuladas de un chat."""
+        self._trackers.pop(chat_id, None)
+
+    def get_prompt(self, messages: List[Dict[str, Any]], chat_id: Optional[int] = None) -> str:
         """
         Construye el prompt específico para el Cínico usando los mensajes dados.
 
         Args:
             messages (List[Dict[str, Any]]): Lista de mensajes del chat.
+            chat_id (Optional[int]): Si se indica y el chat tiene métricas
+                incrementales para exactamente estos mensajes, se usan esas.
+
+        Returns:
+            str: El prompt formateado.
+        """
+        with PROMPT_BUILD_SECONDS.time(stage="prompt"):
+            metrics = self._metrics_for(messages, chat_id)
+            compacted = self.compact_messages(messages, chat_id, kind="final")
+            prompt = self._format_prompt(self.format_messages(compacted), metrics)
+        PROMPT_CHARS.observe(len(prompt), kind="final")
+        return prompt
+
+    def get_prompt_from_partials(self, partials: List[str], messages: List[Dict[str, Any]],
+                                 chat_id: Optional[int] = None) -> str:
+        """
+        Construye el prompt final del Cínico a partir de resúmenes parciales.
+
+        Las métricas se calculan sobre la ventana completa de mensajes, pero el
+        chat a analizar son los resúmenes parciales en orden cronológico.
+
+        Args:
+            partials (List[str]): Resúmenes parciales, del más antiguo al más reciente.
+            messages (List[Dict[str, Any]]): Mensajes completos de la ventana.
+            chat_id (Optional[int]): ID del chat, para reutilizar sus métricas incrementales.
 
         Returns:
             str: El prompt formateado.
         """
-        # Obtener métricas del chat
-        metrics = self.get_analizar_metricas(messages)
+        metrics = self._metrics_for(messages, chat_id)
+        joined = "(Resúmenes parciales del chat, en orden cronológico)\n" + "\n\n".join(
+            f"[Parte {i}] {partial}" for i, partial in enumerate(partials, 1)
+        )
+        prompt = self._format_prompt(joined, metrics)
+        PROMPT_CHARS.observe(len(prompt), kind="partials")
+        return prompt
+
+    def get_fold_prompt(self, previous_summary: str, new_messages: List[Dict[str, Any]],
+                        messages: List[Dict[str, Any]], chat_id: Optional[int] = None) -> str:
+        """
+        Construye el prompt del Cínico que actualiza un resumen previo con mensajes nuevos.
+
+        Las métricas se calculan sobre la ventana completa; el chat a analizar
+        es el resumen anterior seguido solo de los mensajes posteriores a él.
+
+        Args:
+            previous_summary (str): Resumen que cubre los mensajes anteriores.
+            new_messages (List[Dict[str, Any]]): Mensajes llegados después de ese resumen.
+            messages (List[Dict[str, Any]]): Ventana completa de mensajes.
+            chat_id (Optional[int]): ID del chat, para reutilizar sus métricas incrementales.
+
+        Returns:
+            str: El prompt formateado.
+        """
+        metrics = self._metrics_for(messages, chat_id)
+        joined = (
+            "(Resumen anterior del chat)\n" + previous_summary
+            + "\n\n(Mensajes nuevos desde ese resumen)\n"
+            + self.format_messages(self.compact_messages(new_messages, chat_id, kind="fold"))
+        )
+        prompt = self._format_prompt(joined, metrics)
+        PROMPT_CHARS.observe(len(prompt), kind="fold")
+        return prompt
+
+    def get_chunk_prompt(self, messages: List[Dict[str, Any]]) -> str:
+        """
+        Construye un prompt neutral para resumir un fragmento del chat.
+
+        Args:
+            messages (List[Dict[str, Any]]): Mensajes consecutivos del fragmento.
 
-        joined_messages = "\n".join([f"{m['user']}: {m['text']}" for m in messages])
+        Returns:
+            str: El prompt para el resumen parcial.
+        """
+        return (
+            "Resume de forma fiel y concisa el siguiente fragmento de un chat grupal. "
+            "Conserva quién dijo qué, los temas tratados, los desacuerdos y cualquier detalle "
+            "llamativo o absurdo. Sin opiniones propias, en viñetas, máximo 8.\n\n"
+            f"Fragmento:\n{self.format_messages(self.compact_messages(messages, kind='chunk'))}\nResumen:"
+        )
+
+    def get_merge_prompt(self, partials: List[str]) -> str:
+        """
+        Construye un prompt neutral para combinar resúmenes parciales consecutivos.
+
+        Args:
+            partials (List[str]): Resúmenes parciales en orden cronológico.
+
+        Returns:
+            str: El prompt para el resumen combinado.
+        """
+        joined = "\n\n".join(f"[Parte {i}] {partial}" for i, partial in enumerate(partials, 1))
+        return (
+            "Combina los siguientes resúmenes parciales consecutivos de un chat grupal en un solo "
+            "resumen fiel y conciso. Conserva quién dijo qué y los detalles llamativos. "
+            "Sin opiniones propias, en viñetas, máximo 10.\n\n"
+            f"{joined}\nResumen combinado:"
+        )
+
+    def compact_messages(self, messages: List[Dict[str, Any]], chat_id: Optional[int] = None,
+                         kind: str = "final") -> List[Dict[str, Any]]:
+        """
+        Compacta los mensajes para un prompt y registra cuánto se redujeron.
+
+        Args:
+            messages (List[Dict[str, Any]]): Mensajes a incluir en el prompt.
+            chat_id (Optional[int]): ID del chat (solo para el registro).
+            kind (str): Tipo de prompt ("final", "fold" o "chunk"). Los bloques del
+                resumen jerárquico no se recortan por presupuesto: ya se dividieron por tokens.
 
+        Returns:
+            List[Dict[str, Any]]: Los mensajes compactados (los mismos si no hay compactador).
+        """
+        if self.compactor is None or not messages:
+            return messages
+        with PROMPT_BUILD_SECONDS.time(stage="compactacion"):
+            result = self.compactor.compact(messages, budget=kind != "chunk")
+        PROMPT_COMPACTION_RATIO.observe(result.ratio, kind=kind)
+        if kind != "chunk":
+            logger.info(
+                f"Prompt del chat {chat_id} compactado: {result.original_messages} -> {len(result.messages)} mensajes, "
+                f"{result.original_chars} -> {result.compacted_chars} caracteres (ratio {result.ratio:.2f})"
+            )
+        return result.messages
+
+    @staticmethod
+    def format_messages(messages: List[Dict[str, Any]]) -> str:
+        """Une los mensajes en el formato "usuario: texto", uno por línea."""
+        return "\n".join([f"{m['user']}: {m['text']}" for m in messages])
+
+    def _metrics_for(self, messages: List[Dict[str, Any]], chat_id: Optional[int]) -> ChatMetrics:
+        # Usar las métricas incrementales si cubren exactamente estos mensajes (la ventana
+        # pudo avanzar mientras se resumían los bloques: si no coinciden, calcularlas de nuevo)
+        tracker = self._trackers.get(chat_id) if chat_id is not None else None
+        if tracker is not None and tracker.covers(messages):
+            with PROMPT_BUILD_SECONDS.time(stage="metricas_incrementales"):
+                return tracker.build()
+        return self.get_analizar_metricas(messages)
+
+    def _format_prompt(self, joined: str, metrics: ChatMetrics) -> str:
         return self.prompt_template.format(
-            joined=joined_messages,
+            joined=joined,
             total_messages=metrics.total_messages,
             active_users=", ".join(metrics.active_users) if metrics.active_users else "Ninguno destacado",
             time_span=metrics.time_span,
@@ -65,41 +415,11 @@ class CinicoHandler:
         Returns:
             ChatMetrics: Un objeto con las métricas del chat.
         """
-        # Análisis básico de mensajes
-        total_msgs = len(messages)
-
-        # Extraer usuarios del formato de diccionario
-        usuarios = [msg['user'] for msg in messages if 'user' in msg]
-
-        users_counter = Counter(usuarios)
-        active_users = list(users_counter.keys())[:5]  # Top 5 activos
-
-        # Calcular nivel de caos (basado en interrupciones y cambios de tema)
-        chaos_level = min(10, len(set(usuarios)) // 2 + random.randint(1, 3))
-
-        # Detectar temas dominantes (palabras más frecuentes)
-        all_text = " ".join([msg.get('text', '') for msg in messages]).lower()
-        words = re.findall(r'\b\w+\b', all_text)
-        word_freq = Counter(words)
-        # Filtrar palabras comunes
-        stop_words = {'el', 'la', 'de', 'que', 'y', 'a', 'en', 'un', 'es', 'se', 'no', 'te', 'lo', 'le', 'da', 'su', 'por', 'son', 'con', 'para', 'al', 'del', 'los', 'las', 'como', 'pero', 'sus', 'me', 'ha', 'o', 'si', 'porque', 'esta', 'son', 'mi', 'ese', 'ella', 'tan', 'entre', 'cuando', 'muy', 'sin', 'sobre', 'ser', 'tiene', 'yo', 'todo', 'esta', 'era', 'eso'}
-
-        dominant_topics = [word for word, count in word_freq.most_common(5)
-                          if word not in stop_words and len(word) > 3]
-
-        # Sentiment score simulado
-        negative_words = ['no', 'mal', 'terrible', 'odio', 'horrible', 'peor','chimbo', 'cagada','malo']
-        sentiment_score = sum(1 for word in negative_words if word in all_text) / total_msgs if total_msgs > 0 else 0
-
-        return ChatMetrics(
-            total_messages=total_msgs,
-            active_users=active_users,
-            time_span="últimas 2 horas",  # Placeholder
-            dominant_topics=dominant_topics,
-            sentiment_score=sentiment_score,
-            chaos_level=chaos_level,
-            repetition_rate=len(usuarios) / total_msgs if total_msgs > 0 else 0
-        )
+        with PROMPT_BUILD_SECONDS.time(stage="metricas"):
+            tracker = ChatMetricsTracker()
+            for msg in messages:
+                tracker.add(msg)
+            return tracker.build()
 
     def get_empty_response(self) -> str:
         """
@@ -110,6 +430,34 @@ class CinicoHandler:
         """
         return random.choice(self.empty_responses)
 
+    def get_cooldown_response(self) -> str:
+        """
+        Devuelve una respuesta aleatoria para cuando se pide otro resumen demasiado pronto.
+
+        Returns:
+            str: Una frase de rechazo con la personalidad del Cínico.
+        """
+        responses = [
+            "🙄 Acabo de resumir este chat. Desplázate hacia arriba, no muerde.",
+            "⏳ Ni el drama de este grupo evoluciona tan rápido. Espera un poco.",
+            "😮‍💨 Otro resumen, tan pronto... La paciencia también es una virtud, aunque no la practiquen."
+        ]
+        return random.choice(responses)
+
+    def get_busy_response(self) -> str:
+        """
+        Devuelve una respuesta aleatoria para cuando hay demasiados resúmenes en cola.
+
+        Returns:
+            str: Una frase de "estoy ocupado" con la personalidad del Cínico.
+        """
+        responses = [
+            "🥱 Hay una fila de grupos esperando que les diga lo aburridos que son. Vuelve en un rato.",
+            "📋 Estoy ocupado diseccionando otros chats. El suyo puede esperar, no creo que mejore.",
+            "⏳ Demasiada gente pidiendo resúmenes a la vez. Intenten más tarde, si aún les importa."
+        ]
+        return random.choice(responses)
+
     def get_intro(self) -> str:
         """
         Devuelve una introducción aleatoria para el resumen del Cínico.
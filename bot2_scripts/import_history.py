@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Importa la historia de un grupo desde una exportación de Telegram Desktop.
+
+Uso:
+    python -m bot2_scripts.import_history result.json [--chat-id -1001234567890] [--batch-size 1000]
+
+El archivo se lee de forma incremental (memoria constante aunque pese
+cientos de MB) y los mensajes quedan en la misma base SQLite que usa el bot,
+normalizados igual que los recibidos en vivo. Importar dos veces el mismo
+archivo no duplica mensajes, y si la importación se corta se retoma desde
+el último lote confirmado (ver --checkpoint).
+"""
+import argparse
+import sys
+from typing import Dict
+
+from .bot2_core import SHARDS, SQLITE_PATH, STORAGE_BACKEND, normalize_message
+from .utils.history_import import Checkpoint, ExportFormatError, HistoryImporter, ImportResult
+from .utils.sharding import shard_for, shard_path
+from .utils.storage import SQLiteBackend
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Importa una exportación de Telegram Desktop (result.json)")
+    parser.add_argument("export", help="Archivo result.json exportado desde Telegram Desktop")
+    parser.add_argument("--db", default=SQLITE_PATH, help=f"Base SQLite del bot (por defecto {SQLITE_PATH})")
+    parser.add_argument("--chat-id", type=int,
+                        help="Guardar todo en este chat_id (por defecto se calcula a partir de la exportación)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Mensajes por transacción")
+    parser.add_argument("--checkpoint", help="Archivo de progreso (por defecto <export>.import.json)")
+    parser.add_argument("--restart", action="store_true", help="Ignorar el progreso guardado y leer desde el principio")
+    return parser.parse_args(argv)
+
+
+def _report(result: ImportResult) -> None:
+    print(f"   {result.parsed} mensajes leídos, {result.imported} importados "
+          f"({result.messages_per_second:.0f} mensajes/s)")
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    if STORAGE_BACKEND.lower() != "sqlite":
+        print(f"❌ ERROR: STORAGE_BACKEND={STORAGE_BACKEND} no persiste mensajes; la importación requiere sqlite")
+        sys.exit(1)
+
+    # Con SHARDS > 1 cada chat vive en la base de su worker
+    backends: Dict[str, SQLiteBackend] = {}
+
+    def backend_for(chat_id: int) -> SQLiteBackend:
+        path = shard_path(args.db, shard_for(chat_id, SHARDS)) if SHARDS > 1 else args.db
+        if path not in backends:
+            backends[path] = SQLiteBackend(path)
+        return backends[path]
+
+    checkpoint = Checkpoint(args.checkpoint or f"{args.export}.import.json", args.export)
+    if args.restart:
+        checkpoint.save(0)
+    importer = HistoryImporter(backend_for, normalize_message, batch_size=args.batch_size,
+                               chat_id=args.chat_id, on_progress=_report)
+
+    print(f"📥 Importando {args.export}...")
+    try:
+        with open(args.export, encoding="utf-8") as source:
+            result = importer.run(source, checkpoint)
+    except ExportFormatError as e:
+        print(f"❌ ERROR: {args.export} no es una exportación válida: {e}")
+        sys.exit(1)
+    finally:
+        for backend in backends.values():
+            backend.close()
+
+    if result.resumed:
+        print(f"⏩ Retomado: {result.resumed} mensajes ya importados en una corrida anterior")
+    for chat_id, count in sorted(result.chats.items()):
+        print(f"   chat {chat_id}: {count} mensajes nuevos")
+    print(f"✅ {result.imported} mensajes importados, {result.duplicates} ya existentes, "
+          f"{result.skipped} descartados (servicio, multimedia, comandos o chats que no son grupos)")
+    print(f"⏱️ {result.parsed} mensajes en {result.seconds:.1f} s ({result.messages_per_second:.0f} mensajes/s)")
+    print("ℹ️ Los chats que el bot ya tenga en memoria verán la historia importada al reiniciarlo")
+
+
+if __name__ == "__main__":
+    main()
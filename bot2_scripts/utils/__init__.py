@@ -0,0 +1,2 @@
+# Inicialización del paquete utils
+# Utilidades compartidas por el bot (clientes HTTP, almacenamiento, etc.)
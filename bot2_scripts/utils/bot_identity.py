@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Optional
+
+from telegram import User
+from telegram.error import InvalidToken
+from telegram.ext import ExtBot
+
+logger = logging.getLogger(__name__)
+
+
+def _token_key(token: str) -> str:
+    # El token no se guarda en disco: solo un hash para saber a qué bot corresponde
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+
+
+def load_identity(path: str, token: str) -> Optional[Dict[str, Any]]:
+    """
+    Lee la identidad (resultado de getMe) guardada para este token.
+
+    Args:
+        path (str): Archivo JSON de la caché.
+        token (str): Token del bot.
+
+    Returns:
+        Optional[Dict[str, Any]]: Los datos del usuario del bot, o None si no hay
+            caché válida para el token.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("token") != _token_key(token) or not isinstance(data.get("user"), dict):
+        return None
+    return data["user"]
+
+
+def save_identity(path: str, token: str, user: Dict[str, Any]) -> None:
+    """Guarda la identidad del bot de forma atómica (archivo temporal + rename)."""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"token": _token_key(token), "user": user}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"No se pudo guardar la identidad del bot en {path}: {e}")
+
+
+def forget_identity(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class CachedIdentityBot(ExtBot):
+    """
+    Bot que no espera a getMe para arrancar si ya conoce su identidad.
+
+    Al inicializarse, la aplicación llama a getMe para saber el usuario del
+    bot (y validar el token) antes de empezar a recibir updates. Si la
+    identidad está en la caché en disco se usa directamente y getMe se hace
+    en segundo plano: si cambió, se actualizan la caché y el usuario en uso;
+    si el token fue rechazado, se borra la caché y se avisa con
+    `on_invalid_token` (el bot ya está recibiendo updates con un token que
+    Telegram no acepta).
+    """
+
+    def __init__(self, token: str, cache_path: str, on_invalid_token: Optional[Callable[[], None]] = None,
+                 **kwargs):
+        """
+        Args:
+            token (str): Token del bot.
+            cache_path (str): Archivo JSON donde se guarda la identidad.
+            on_invalid_token (Optional[Callable[[], None]]): Se llama si la validación en
+                segundo plano encuentra el token rechazado (p. ej. para detener la aplicación).
+            **kwargs: Resto de parámetros de ExtBot (requests, defaults...).
+        """
+        super().__init__(token, **kwargs)
+        self._cache_path = cache_path
+        self._cache_checked = False
+        self._validation: Optional[asyncio.Task] = None
+        self._on_invalid_token = on_invalid_token
+        self._token_rejected = False
+
+    @property
+    def token_rejected(self) -> bool:
+        """Indica si la validación en segundo plano encontró el token rechazado."""
+        return self._token_rejected
+
+    async def get_me(self, *args, **kwargs) -> User:
+        if not self._cache_checked:
+            self._cache_checked = True
+            cached = load_identity(self._cache_path, self.token)
+            if cached is not None:
+                user = User.de_json(cached, self)
+                # Bot.get_me guarda el usuario en este atributo; Bot.bot/username lo leen de ahí
+                self._bot_user = user
+                self._validation = asyncio.create_task(self._validate(cached))
+                logger.info(f"Identidad del bot leída de la caché: @{user.username}")
+                return user
+        user = await super().get_me(*args, **kwargs)
+        save_identity(self._cache_path, self.token, user.to_dict())
+        return user
+
+    async def _validate(self, cached: Dict[str, Any]) -> None:
+        try:
+            user = await super().get_me()
+        except InvalidToken:
+            logger.critical("El token del bot fue rechazado por Telegram; se descarta la identidad en caché")
+            forget_identity(self._cache_path)
+            self._token_rejected = True
+            if self._on_invalid_token is not None:
+                self._on_invalid_token()
+            return
+        except Exception as e:
+            logger.warning(f"No se pudo validar la identidad del bot en segundo plano: {e}")
+            return
+        # El usuario en uso (Bot.username, los comandos /cmd@usuario) pasa a ser el actual
+        self._bot_user = user
+        if user.to_dict() != cached:
+            logger.info(f"La identidad del bot cambió (@{user.username}); actualizando la caché")
+            save_identity(self._cache_path, self.token, user.to_dict())
+
+    async def shutdown(self) -> None:
+        if self._validation is not None and not self._validation.done():
+            self._validation.cancel()
+            try:
+                await self._validation
+            except asyncio.CancelledError:
+                pass
+        await super().shutdown()
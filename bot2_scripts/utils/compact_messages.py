@@ -0,0 +1,223 @@
+from array import array
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+_KEYS = ('user', 'text', 'timestamp', 'message_id')
+
+
+class MessageView(Mapping):
+    """
+    Vista de solo lectura de un mensaje del buffer, compatible con dict.
+
+    Expone las mismas claves que los mensajes originales ('user', 'text',
+    'timestamp', 'message_id'); el timestamp se reconstruye como datetime
+    a partir de los segundos epoch guardados.
+    """
+
+    __slots__ = ('user', 'text', 'ts', 'message_id')
+
+    def __init__(self, user: str, text: str, ts: int, message_id: Optional[int]):
+        self.user = user
+        self.text = text
+        self.ts = ts
+        self.message_id = message_id
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'user':
+            return self.user
+        if key == 'text':
+            return self.text
+        if key == 'timestamp':
+            return datetime.fromtimestamp(self.ts) if self.ts else None
+        if key == 'message_id':
+            return self.message_id
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_KEYS)
+
+    def __len__(self) -> int:
+        return len(_KEYS)
+
+    def __repr__(self) -> str:
+        return f"MessageView({dict(self)!r})"
+
+
+def to_epoch(timestamp: Optional[datetime]) -> int:
+    """Segundos epoch de un datetime (0 si no hay timestamp)."""
+    return int(timestamp.timestamp()) if timestamp is not None else 0
+
+
+class ChatBuffer:
+    """
+    Buffer circular de un chat guardado por columnas.
+
+    En lugar de un dict con un datetime y una copia del nombre por mensaje,
+    cada mensaje ocupa una posición en columnas paralelas: el texto en UTF-8,
+    el índice del usuario en una tabla del chat (con conteo de referencias,
+    así la tabla solo contiene a quienes tienen mensajes en la ventana), el
+    timestamp en segundos epoch y el message_id como enteros de 64 bits.
+
+    Las columnas crecen hasta `capacity`; a partir de ahí cada append
+    sobrescribe la posición del mensaje más antiguo.
+
+    Los timestamps se mantienen en orden no decreciente (un mensaje con fecha
+    anterior al último se guarda con la fecha del último), así que las ventanas
+    de tiempo se seleccionan con búsqueda binaria.
+    """
+
+    __slots__ = ('capacity', 'seq', '_start', '_len', '_texts', '_user_ids', '_timestamps', '_message_ids',
+                 '_users', '_user_index', '_user_refs', '_free_users')
+
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity (int): Máximo de mensajes del buffer.
+        """
+        self.capacity = capacity
+        # Cantidad de mensajes agregados desde que se creó el buffer
+        self.seq = 0
+        self._start = 0
+        self._len = 0
+        self._texts: List[bytes] = []
+        self._user_ids = array('I')
+        self._timestamps = array('q')
+        self._message_ids = array('q')
+        self._users: List[Optional[str]] = []
+        self._user_index: Dict[str, int] = {}
+        self._user_refs: List[int] = []
+        self._free_users: List[int] = []
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[MessageView]:
+        size = len(self._texts)
+        for offset in range(self._len):
+            yield self._view((self._start + offset) % size)
+
+    def __getitem__(self, index: int) -> MessageView:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("índice fuera del buffer")
+        return self._view((self._start + index) % len(self._texts))
+
+    @property
+    def users(self) -> List[str]:
+        """Usuarios con al menos un mensaje en el buffer."""
+        return list(self._user_index)
+
+    def append(self, message: Dict[str, Any]) -> MessageView:
+        """
+        Agrega un mensaje (sobrescribiendo el más antiguo si el buffer está lleno).
+
+        Args:
+            message (Dict[str, Any]): Mensaje con 'user', 'text', 'timestamp' y 'message_id'.
+
+        Returns:
+            MessageView: El mensaje tal como quedó guardado.
+        """
+        text = message.get('text', '').encode('utf-8')
+        user_id = self._intern(message.get('user', ''))
+        ts = to_epoch(message.get('timestamp'))
+        if self._len:
+            ts = max(ts, self._timestamps[(self._start + self._len - 1) % len(self._texts)])
+        message_id = message.get('message_id') or 0
+        self.seq += 1
+
+        size = len(self._texts)
+        if self._len == self.capacity:
+            index = self._start
+            self._release(self._user_ids[index])
+            self._start = (index + 1) % size
+        elif self._len < size:
+            index = (self._start + self._len) % size
+            self._len += 1
+        else:
+            # Columnas llenas pero por debajo de la capacidad: crecer al final
+            if self._start:
+                self._rotate()
+            self._texts.append(text)
+            self._user_ids.append(user_id)
+            self._timestamps.append(ts)
+            self._message_ids.append(message_id)
+            self._len += 1
+            return self._view(size)
+
+        self._texts[index] = text
+        self._user_ids[index] = user_id
+        self._timestamps[index] = ts
+        self._message_ids[index] = message_id
+        return self._view(index)
+
+    def since(self, ts: int) -> List[MessageView]:
+        """
+        Mensajes con timestamp mayor o igual a `ts`, del más antiguo al más reciente.
+
+        Args:
+            ts (int): Segundos epoch del inicio de la ventana.
+
+        Returns:
+            List[MessageView]: Los mensajes de la ventana.
+        """
+        size = len(self._texts)
+        lo, hi = 0, self._len
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._timestamps[(self._start + mid) % size] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return [self._view((self._start + offset) % size) for offset in range(lo, self._len)]
+
+    def popleft(self) -> MessageView:
+        """Quita y devuelve el mensaje más antiguo."""
+        if not self._len:
+            raise IndexError("buffer vacío")
+        index = self._start
+        view = self._view(index)
+        self._release(self._user_ids[index])
+        self._texts[index] = b""
+        self._start = (index + 1) % len(self._texts)
+        self._len -= 1
+        return view
+
+    def _view(self, index: int) -> MessageView:
+        return MessageView(
+            self._users[self._user_ids[index]],
+            self._texts[index].decode('utf-8'),
+            self._timestamps[index],
+            self._message_ids[index] or None,
+        )
+
+    def _rotate(self) -> None:
+        start = self._start
+        self._texts = self._texts[start:] + self._texts[:start]
+        self._user_ids = self._user_ids[start:] + self._user_ids[:start]
+        self._timestamps = self._timestamps[start:] + self._timestamps[:start]
+        self._message_ids = self._message_ids[start:] + self._message_ids[:start]
+        self._start = 0
+
+    def _intern(self, user: str) -> int:
+        index = self._user_index.get(user)
+        if index is None:
+            if self._free_users:
+                index = self._free_users.pop()
+                self._users[index] = user
+                self._user_refs[index] = 0
+            else:
+                index = len(self._users)
+                self._users.append(user)
+                self._user_refs.append(0)
+            self._user_index[user] = index
+        self._user_refs[index] += 1
+        return index
+
+    def _release(self, index: int) -> None:
+        self._user_refs[index] -= 1
+        if self._user_refs[index] == 0:
+            del self._user_index[self._users[index]]
+            self._users[index] = None
+            self._free_users.append(index)
@@ -0,0 +1,337 @@
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from .storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# Tipos de chat de Telegram Desktop y el signo/prefijo de su ID en la Bot API
+SUPERGROUP_TYPES = ("private_supergroup", "public_supergroup")
+GROUP_TYPES = ("private_group",) + SUPERGROUP_TYPES
+
+_WHITESPACE = " \t\n\r"
+
+
+class ExportFormatError(ValueError):
+    """El archivo no tiene la estructura de una exportación de Telegram Desktop."""
+
+
+class _JSONStream:
+    """
+    Lector incremental de JSON: mantiene en memoria solo un bloque del archivo
+    y decodifica de a un valor con JSONDecoder.raw_decode.
+    """
+
+    def __init__(self, source: TextIO, chunk_size: int = 1 << 16):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.source.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Descartar lo ya consumido para que la memoria no crezca con el archivo
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Siguiente carácter significativo (sin consumirlo); "" al final del archivo."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ExportFormatError(f"Se esperaba {char!r} y se encontró {found or 'el final del archivo'!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decodifica el siguiente valor JSON completo."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise ExportFormatError(f"JSON inválido: {e}") from e
+            # Un número al final del bloque puede seguir en el bloque siguiente
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def next_item(self, close: str) -> bool:
+        """Avanza al siguiente elemento de un objeto o lista; False al llegar a `close`."""
+        char = self.peek()
+        if char == ",":
+            self.pos += 1
+            char = self.peek()
+        if char == close:
+            self.pos += 1
+            return False
+        if not char:
+            raise ExportFormatError("El archivo terminó antes de cerrar la estructura")
+        return True
+
+
+def iter_export(source: TextIO, chunk_size: int = 1 << 16) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    Recorre una exportación de Telegram Desktop (result.json) sin cargarla entera.
+
+    Acepta tanto la exportación de un chat ({"name", "type", "id", "messages"})
+    como la de toda la cuenta ({"chats": {"list": [...]}}): cualquier lista
+    "messages" se recorre elemento por elemento.
+
+    Args:
+        source (TextIO): Archivo abierto en modo texto.
+        chunk_size (int): Caracteres leídos por bloque.
+
+    Yields:
+        Tuple[Dict[str, Any], Dict[str, Any]]: (datos del chat: name/type/id, mensaje crudo).
+    """
+    stream = _JSONStream(source, chunk_size)
+    if stream.peek() != "{":
+        raise ExportFormatError("La exportación debe ser un objeto JSON")
+    yield from _walk(stream)
+
+
+def _walk(stream: _JSONStream) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    if stream.peek() == "[":
+        stream.expect("[")
+        while stream.next_item("]"):
+            yield from _walk(stream)
+        return
+    if stream.peek() != "{":
+        stream.value()
+        return
+    stream.expect("{")
+    # Datos del objeto actual: en las exportaciones "id", "name" y "type" van antes de "messages"
+    current: Dict[str, Any] = {}
+    while stream.next_item("}"):
+        key = stream.value()
+        stream.expect(":")
+        if key == "messages" and stream.peek() == "[":
+            info = {k: current.get(k) for k in ("id", "name", "type")}
+            stream.expect("[")
+            while stream.next_item("]"):
+                message = stream.value()
+                if isinstance(message, dict):
+                    yield info, message
+        elif stream.peek() in "{[":
+            yield from _walk(stream)
+        else:
+            current[key] = stream.value()
+
+
+def bot_chat_id(export_id: int, chat_type: Optional[str]) -> int:
+    """
+    ID de la Bot API para un chat exportado: -100<id> en supergrupos, -<id> en grupos.
+
+    Args:
+        export_id (int): ID del chat en la exportación.
+        chat_type (Optional[str]): Tipo de chat de la exportación.
+
+    Returns:
+        int: El chat_id que recibe el bot en los updates.
+    """
+    if export_id < 0:
+        return export_id
+    if chat_type in SUPERGROUP_TYPES:
+        return int(f"-100{export_id}")
+    if chat_type in GROUP_TYPES:
+        return -export_id
+    return export_id
+
+
+def message_text(raw: Dict[str, Any]) -> str:
+    """Texto plano de un mensaje exportado ("text" puede ser una lista de entidades)."""
+    text = raw.get("text", "")
+    if isinstance(text, list):
+        text = "".join(part if isinstance(part, str) else part.get("text", "") for part in text)
+    return text if isinstance(text, str) else ""
+
+
+def message_time(raw: Dict[str, Any]) -> Optional[datetime]:
+    """Fecha del mensaje en hora local, como la que asigna handle_message."""
+    unixtime = raw.get("date_unixtime")
+    if unixtime is not None:
+        return datetime.fromtimestamp(int(unixtime))
+    try:
+        return datetime.fromisoformat(raw["date"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def is_plain_text(raw: Dict[str, Any], text: str) -> bool:
+    """
+    Indica si el bot habría guardado el mensaje en vivo: mensajes de texto (sin
+    archivos ni fotos, cuyo texto es un pie de foto) que no son comandos.
+    """
+    if raw.get("type") != "message" or not text.strip() or text.startswith("/"):
+        return False
+    return not any(key in raw for key in ("photo", "file", "media_type", "sticker_emoji", "poll"))
+
+
+@dataclass
+class ImportResult:
+    """Contadores de una importación."""
+    parsed: int = 0
+    imported: int = 0
+    duplicates: int = 0
+    skipped: int = 0
+    resumed: int = 0
+    chats: Dict[int, int] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.parsed / self.seconds if self.seconds > 0 else 0.0
+
+
+class Checkpoint:
+    """
+    Progreso de una importación, para retomarla si se corta.
+
+    Guarda cuántos mensajes del archivo ya se confirmaron en disco; al
+    retomar se leen (sin escribirlos) hasta llegar a ese punto. Solo vale
+    para el mismo archivo (mismo tamaño y fecha de modificación).
+    """
+
+    def __init__(self, path: str, source_path: str):
+        self.path = path
+        stat = os.stat(source_path)
+        self.source = {'path': os.path.abspath(source_path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def load(self) -> int:
+        """Mensajes ya procesados en una corrida anterior (0 si no hay o es de otro archivo)."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if not isinstance(data, dict) or data.get('source') != self.source:
+            return 0
+        return int(data.get('processed', 0))
+
+    def save(self, processed: int, done: bool = False) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({'source': self.source, 'processed': processed, 'done': done}, f)
+        os.replace(tmp_path, self.path)
+
+
+class HistoryImporter:
+    """
+    Importa una exportación de Telegram Desktop al almacenamiento de mensajes.
+
+    Los mensajes se normalizan igual que en handle_message y se escriben por
+    lotes (una transacción por lote); los que ya estaban guardados (mismo
+    chat y message_id) se ignoran, así que importar dos veces el mismo
+    archivo no duplica nada.
+    """
+
+    def __init__(self, backend_for: Callable[[int], StorageBackend],
+                 normalize: Callable[..., Dict[str, Any]], batch_size: int = 1000,
+                 chat_id: Optional[int] = None, progress_interval: float = 2.0,
+                 on_progress: Optional[Callable[[ImportResult], None]] = None):
+        """
+        Args:
+            backend_for (Callable[[int], StorageBackend]): Backend donde se guarda cada chat.
+            normalize (Callable[..., Dict[str, Any]]): Normalización de bot2_core
+                (user, text, timestamp, message_id).
+            batch_size (int): Mensajes por transacción.
+            chat_id (Optional[int]): Si se indica, todos los mensajes van a este chat
+                (en lugar del ID calculado a partir de la exportación).
+            progress_interval (float): Segundos entre llamadas a on_progress.
+            on_progress (Optional[Callable[[ImportResult], None]]): Reporte de avance.
+        """
+        self.backend_for = backend_for
+        self.normalize = normalize
+        self.batch_size = batch_size
+        self.chat_id = chat_id
+        self.progress_interval = progress_interval
+        self.on_progress = on_progress
+
+    def run(self, source: TextIO, checkpoint: Optional[Checkpoint] = None) -> ImportResult:
+        """
+        Importa el archivo.
+
+        Args:
+            source (TextIO): Exportación abierta en modo texto.
+            checkpoint (Optional[Checkpoint]): Progreso para retomar una importación cortada.
+
+        Returns:
+            ImportResult: Mensajes leídos, importados, repetidos y descartados.
+        """
+        result = ImportResult()
+        started = time.perf_counter()
+        next_report = started + self.progress_interval
+        resume_from = checkpoint.load() if checkpoint is not None else 0
+        pending: Dict[int, List[Dict[str, Any]]] = {}
+        pending_count = 0
+
+        for info, raw in iter_export(source):
+            result.parsed += 1
+            if result.parsed <= resume_from:
+                result.resumed += 1
+                continue
+            text = message_text(raw)
+            chat_id = self.chat_id
+            if chat_id is None:
+                if info.get('type') not in GROUP_TYPES or not isinstance(info.get('id'), int):
+                    # El bot solo guarda mensajes de grupos
+                    result.skipped += 1
+                    continue
+                chat_id = bot_chat_id(info['id'], info['type'])
+            if not is_plain_text(raw, text):
+                result.skipped += 1
+                continue
+            # Telegram Desktop exporta el nombre completo; el bot guarda el nombre de pila
+            author = raw.get("from")
+            user = author.split()[0] if isinstance(author, str) and author.strip() else None
+            message_id = raw.get("id") if isinstance(raw.get("id"), int) else None
+            pending.setdefault(chat_id, []).append(self.normalize(user, text, message_time(raw), message_id))
+            pending_count += 1
+
+            if pending_count >= self.batch_size:
+                self._write(pending, result)
+                pending_count = 0
+                if checkpoint is not None:
+                    checkpoint.save(result.parsed)
+            if self.on_progress is not None and time.perf_counter() >= next_report:
+                result.seconds = time.perf_counter() - started
+                self.on_progress(result)
+                next_report = time.perf_counter() + self.progress_interval
+
+        self._write(pending, result)
+        if checkpoint is not None:
+            checkpoint.save(result.parsed, done=True)
+        result.seconds = time.perf_counter() - started
+        return result
+
+    def _write(self, pending: Dict[int, List[Dict[str, Any]]], result: ImportResult) -> None:
+        for chat_id, messages in pending.items():
+            inserted = self.backend_for(chat_id).write_many(chat_id, messages)
+            result.imported += inserted
+            result.duplicates += len(messages) - inserted
+            result.chats[chat_id] = result.chats.get(chat_id, 0) + inserted
+        pending.clear()
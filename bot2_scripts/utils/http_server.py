@@ -0,0 +1,211 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+REASONS = {
+    200: "OK", 204: "No Content", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+    405: "Method Not Allowed", 408: "Request Timeout", 411: "Length Required", 413: "Payload Too Large",
+    414: "URI Too Long", 429: "Too Many Requests", 431: "Request Header Fields Too Large",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+# Máximo de cabeceras por petición
+MAX_HEADERS = 100
+
+
+@dataclass
+class HTTPRequest:
+    """Petición HTTP ya leída por completo."""
+    method: str
+    path: str
+    query: str
+    headers: Dict[str, str]
+    body: bytes = b""
+
+
+@dataclass
+class HTTPResponse:
+    """Respuesta HTTP a enviar."""
+    status: int = 200
+    body: bytes = b""
+    content_type: str = "text/plain; charset=utf-8"
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+RouteHandler = Callable[[HTTPRequest], Awaitable[HTTPResponse]]
+
+
+class MiniHTTPServer:
+    """
+    Servidor HTTP/1.1 mínimo sobre asyncio, sin dependencias externas.
+
+    Pensado para endpoints internos (webhook, salud, métricas): rutas exactas
+    por método y ruta, cuerpos con Content-Length y conexiones keep-alive.
+    stop() deja de aceptar conexiones y espera a las peticiones en curso.
+    """
+
+    def __init__(self, host: str, port: int, max_body: int = 1024 * 1024, idle_timeout: float = 30.0,
+                 request_timeout: float = 10.0):
+        """
+        Args:
+            host (str): Interfaz donde escuchar.
+            port (int): Puerto (0 para uno libre).
+            max_body (int): Tamaño máximo del cuerpo de una petición, en bytes.
+            idle_timeout (float): Segundos que se espera la siguiente petición en una conexión.
+            request_timeout (float): Segundos para recibir las cabeceras, y otros tantos para
+                el cuerpo, de una petición ya empezada (un cliente lento no retiene la conexión).
+        """
+        self.host = host
+        self.port = port
+        self.max_body = max_body
+        self.idle_timeout = idle_timeout
+        self.request_timeout = request_timeout
+        self._routes: Dict[Tuple[str, str], RouteHandler] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.Task] = set()
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._closing = False
+
+    def route(self, method: str, path: str, handler: RouteHandler) -> None:
+        """Registra un handler para el método y la ruta exactos."""
+        self._routes[(method.upper(), path)] = handler
+
+    async def start(self) -> None:
+        """Empieza a aceptar conexiones."""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Servidor HTTP escuchando en {self.host}:{self.port}")
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """
+        Deja de aceptar conexiones y espera a que terminen las peticiones en curso.
+
+        Args:
+            drain_timeout (float): Segundos máximos de espera antes de cortar las conexiones.
+        """
+        if self._server is None:
+            return
+        self._closing = True
+        self._server.close()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Quedaron {self._in_flight} peticiones sin terminar al detener el servidor HTTP")
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while not self._closing:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                except ValueError:
+                    # Línea más larga que el límite del StreamReader
+                    await self._write(writer, HTTPResponse(414, b"uri too long"), keep_alive=False)
+                    break
+                if not request_line:
+                    break
+                keep_alive = await self._handle_request(request_line, reader, writer)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _handle_request(self, request_line: bytes, reader: asyncio.StreamReader,
+                              writer: asyncio.StreamWriter) -> bool:
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            await self._write(writer, HTTPResponse(400, b"bad request"), keep_alive=False)
+            return False
+
+        try:
+            headers = await asyncio.wait_for(self._read_headers(reader), timeout=self.request_timeout)
+        except asyncio.TimeoutError:
+            await self._write(writer, HTTPResponse(408, b"request timeout"), keep_alive=False)
+            return False
+        except ValueError:
+            # Una cabecera más larga que el límite del StreamReader, o demasiadas
+            await self._write(writer, HTTPResponse(431, b"request header fields too large"), keep_alive=False)
+            return False
+
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        if "transfer-encoding" in headers:
+            await self._write(writer, HTTPResponse(411, b"length required"), keep_alive=False)
+            return False
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Sin un largo válido no se sabe dónde termina el cuerpo: cerrar la conexión
+            await self._write(writer, HTTPResponse(400, b"bad content-length"), keep_alive=False)
+            return False
+        if length > self.max_body:
+            await self._write(writer, HTTPResponse(413, b"payload too large"), keep_alive=False)
+            return False
+        try:
+            body = await asyncio.wait_for(reader.readexactly(length), timeout=self.request_timeout) if length else b""
+        except asyncio.TimeoutError:
+            await self._write(writer, HTTPResponse(408, b"request timeout"), keep_alive=False)
+            return False
+
+        path, _, query = target.partition("?")
+        handler = self._routes.get((method.upper(), path))
+        if handler is None:
+            allowed = any(route_path == path for _, route_path in self._routes)
+            response = HTTPResponse(405, b"method not allowed") if allowed else HTTPResponse(404, b"not found")
+        else:
+            self._in_flight += 1
+            self._idle.clear()
+            try:
+                response = await handler(HTTPRequest(method.upper(), path, query, headers, body))
+            except Exception as e:
+                logger.error(f"Error atendiendo {method} {path}: {e}", exc_info=True)
+                response = HTTPResponse(500, b"internal error")
+            finally:
+                self._in_flight -= 1
+                if self._in_flight == 0:
+                    self._idle.set()
+
+        keep_alive = keep_alive and not self._closing
+        await self._write(writer, response, keep_alive)
+        return keep_alive
+
+    @staticmethod
+    async def _read_headers(reader: asyncio.StreamReader) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        for _ in range(MAX_HEADERS + 1):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            name, _, value = line.decode('latin-1').partition(":")
+            headers[name.strip().lower()] = value.strip()
+        raise ValueError(f"Más de {MAX_HEADERS} cabeceras")
+
+    @staticmethod
+    async def _write(writer: asyncio.StreamWriter, response: HTTPResponse, keep_alive: bool) -> None:
+        head = [
+            f"HTTP/1.1 {response.status} {REASONS.get(response.status, 'Unknown')}",
+            f"Content-Type: {response.content_type}",
+            f"Content-Length: {len(response.body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        head.extend(f"{name}: {value}" for name, value in response.headers.items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + response.body)
+        await writer.drain()
@@ -0,0 +1,240 @@
+import asyncio
+import json
+import logging
+import random
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+DEFAULT_MODEL = "deepseek/deepseek-chat-v3.1:free"
+
+# Códigos HTTP que vale la pena reintentar (rate limit y errores del servidor)
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Error base al obtener una respuesta del LLM."""
+
+
+class LLMConnectionError(LLMError):
+    """Error de red o HTTP al hablar con el proveedor del LLM."""
+
+
+class LLMResponseError(LLMError):
+    """El proveedor respondió, pero sin un contenido utilizable."""
+
+
+class OpenRouterClient:
+    """
+    Cliente asíncrono para la API de chat completions de OpenRouter.
+
+    Mantiene una única sesión HTTP de larga duración (con keep-alive y pool
+    de conexiones) que se crea perezosamente en el event loop que la usa.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: str = OPENROUTER_BASE_URL,
+        model: str = DEFAULT_MODEL,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        max_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+    ):
+        """
+        Inicializa el cliente.
+
+        Args:
+            api_key (Optional[str]): API key de OpenRouter.
+            base_url (str): URL base de la API (configurable para pruebas).
+            model (str): Modelo por defecto para las peticiones.
+            connect_timeout (float): Segundos máximos para establecer la conexión.
+            read_timeout (float): Segundos máximos esperando la respuesta.
+            max_retries (int): Reintentos ante errores transitorios.
+            backoff_base (float): Base del backoff exponencial, en segundos.
+            backoff_max (float): Tope del backoff, en segundos.
+            max_connections (int): Tamaño máximo del pool de conexiones.
+            keepalive_expiry (float): Segundos que se mantiene viva una conexión ociosa.
+        """
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Devuelve la sesión HTTP compartida, creándola si hace falta."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self._timeout,
+                limits=self._limits,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+            )
+        return self._client
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Calcula la espera antes del siguiente intento (backoff exponencial con jitter completo)."""
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def complete(self, prompt: str, model: Optional[str] = None) -> str:
+        """
+        Envía un prompt al modelo y devuelve el texto generado.
+
+        Args:
+            prompt (str): Prompt a enviar como mensaje de usuario.
+            model (Optional[str]): Modelo a usar; por defecto el del cliente.
+
+        Returns:
+            str: El contenido de la respuesta, sin espacios sobrantes.
+
+        Raises:
+            LLMConnectionError: Si se agotan los reintentos por errores de red o HTTP.
+            LLMResponseError: Si la respuesta no trae contenido.
+        """
+        payload = {
+            "model": model or self.model,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        result = await self._post_with_retry("/chat/completions", payload)
+
+        choices = result.get('choices') or []
+        if choices and choices[0].get('message') and choices[0]['message'].get('content'):
+            return choices[0]['message']['content'].strip()
+        raise LLMResponseError(f"Respuesta inesperada de la API: {result}")
+
+    async def stream(self, prompt: str, model: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Envía un prompt al modelo y va entregando el texto a medida que se genera (SSE).
+
+        Los errores transitorios se reintentan solo antes de recibir el primer
+        fragmento; una vez empezado el stream, un corte se informa como error.
+
+        Args:
+            prompt (str): Prompt a enviar como mensaje de usuario.
+            model (Optional[str]): Modelo a usar; por defecto el del cliente.
+
+        Yields:
+            str: Fragmentos consecutivos del contenido generado.
+
+        Raises:
+            LLMConnectionError: Si falla la conexión o se corta el stream.
+            LLMResponseError: Si el stream termina sin contenido o trae un error.
+        """
+        payload = {
+            "model": model or self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True,
+        }
+        client = self._get_client()
+        attempt = 0
+        while True:
+            retry_after = None
+            received = False
+            try:
+                async with client.stream("POST", "/chat/completions", json=payload) as response:
+                    if response.status_code not in RETRYABLE_STATUS:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue  # comentarios de keep-alive (": OPENROUTER PROCESSING")
+                            data = line[5:].strip()
+                            if data == "[DONE]":
+                                break
+                            delta = self._parse_stream_chunk(data)
+                            if delta:
+                                received = True
+                                yield delta
+                        if not received:
+                            raise LLMResponseError("El stream terminó sin contenido")
+                        return
+                    retry_after = response.headers.get("Retry-After")
+                    error: Exception = httpx.HTTPStatusError(
+                        f"HTTP {response.status_code}", request=response.request, response=response
+                    )
+            except httpx.HTTPStatusError as e:
+                raise LLMConnectionError(f"Error HTTP {e.response.status_code}") from e
+            except httpx.TransportError as e:
+                if received:
+                    raise LLMConnectionError(f"El stream se cortó: {e!r}") from e
+                error = e
+
+            if attempt >= self.max_retries:
+                raise LLMConnectionError(f"Error de red o HTTP tras {attempt + 1} intentos: {error!r}") from error
+            delay = self._backoff(attempt, retry_after)
+            logger.warning(f"Fallo transitorio abriendo el stream del LLM ({error!r}); reintento en {delay:.2f}s")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _parse_stream_chunk(data: str) -> str:
+        """Extrae el texto de un evento SSE de chat completions."""
+        try:
+            chunk = json.loads(data)
+        except ValueError as e:
+            raise LLMResponseError(f"Evento de stream no es JSON válido: {data[:100]}") from e
+        if chunk.get('error'):
+            raise LLMResponseError(f"Error en el stream: {chunk['error']}")
+        choices = chunk.get('choices') or []
+        if not choices:
+            return ""
+        return (choices[0].get('delta') or {}).get('content') or ""
+
+    async def _post_with_retry(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        client = self._get_client()
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                response = await client.post(path, json=payload)
+                if response.status_code not in RETRYABLE_STATUS:
+                    response.raise_for_status()
+                    try:
+                        return response.json()
+                    except ValueError as e:
+                        raise LLMResponseError(f"Respuesta no es JSON válido: {e}") from e
+                retry_after = response.headers.get("Retry-After")
+                error: Exception = httpx.HTTPStatusError(
+                    f"HTTP {response.status_code}", request=response.request, response=response
+                )
+            except httpx.HTTPStatusError as e:
+                # Errores 4xx no reintentables
+                raise LLMConnectionError(f"Error HTTP {e.response.status_code}") from e
+            except httpx.TransportError as e:
+                error = e
+
+            if attempt >= self.max_retries:
+                raise LLMConnectionError(f"Error de red o HTTP tras {attempt + 1} intentos: {error!r}") from error
+            delay = self._backoff(attempt, retry_after)
+            logger.warning(f"Fallo transitorio hablando con el LLM ({error!r}); reintento en {delay:.2f}s")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        """Cierra la sesión HTTP compartida."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,352 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """
+    Token bucket clásico: se recarga a `rate` unidades por segundo hasta `capacity`.
+
+    Un `rate` de 0 desactiva el límite.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, amount: float = 1.0) -> float:
+        """Segundos que faltan para poder consumir `amount` (0 si ya se puede)."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        # Una petición más grande que la capacidad solo espera a tener el bucket lleno
+        amount = min(amount, self.capacity)
+        if self._tokens >= amount:
+            return 0.0
+        return (amount - self._tokens) / self.rate
+
+    def consume(self, amount: float = 1.0) -> None:
+        """Consume `amount` unidades (llamar solo cuando delay() devolvió 0)."""
+        if self.rate > 0:
+            self._tokens -= min(amount, self.capacity)
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """Espera hasta poder consumir `amount` unidades y las consume."""
+        while True:
+            wait = self.delay(amount)
+            if wait <= 0:
+                self.consume(amount)
+                return
+            await asyncio.sleep(wait)
+
+
+class SchedulerBusy(Exception):
+    """La cola del planificador está llena; la petición se rechaza de inmediato."""
+
+
+@dataclass
+class _Job:
+    fn: Callable[[], Awaitable[Any]]
+    tokens: int
+    future: asyncio.Future
+    background: bool = False
+    enqueued_at: float = field(default_factory=time.monotonic)
+    # Tarea de un trabajo en segundo plano en ejecución (para poder desalojarlo)
+    task: Optional[asyncio.Task] = None
+    preempted: bool = False
+
+
+class _Lane:
+    """Colas por clave recorridas en round-robin."""
+
+    def __init__(self):
+        self.queues: Dict[Hashable, Deque[_Job]] = {}
+        self.ring: Deque[Hashable] = deque()
+        self.queued = 0
+
+    def push(self, key: Hashable, job: _Job) -> None:
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = deque()
+            self.ring.append(key)
+        queue.append(job)
+        self.queued += 1
+
+    def peek(self) -> Optional[_Job]:
+        return self.queues[self.ring[0]][0] if self.ring else None
+
+    def pop(self) -> Optional[_Job]:
+        """Toma el siguiente trabajo en round-robin entre claves."""
+        while self.ring:
+            key = self.ring.popleft()
+            queue = self.queues[key]
+            job = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self.ring.append(key)
+            else:
+                del self.queues[key]
+            if not job.future.done():  # el solicitante pudo haberse cancelado
+                return job
+        return None
+
+    def cancel_all(self) -> None:
+        for queue in self.queues.values():
+            for job in queue:
+                job.future.cancel()
+        self.queues.clear()
+        self.ring.clear()
+        self.queued = 0
+
+
+class LLMScheduler:
+    """
+    Planificador global de llamadas al LLM.
+
+    - Un pool acotado de workers limita las llamadas simultáneas.
+    - Dos token buckets limitan peticiones por minuto y tokens por minuto.
+    - Cada chat tiene su propia cola y los workers las recorren en round-robin,
+      así que un grupo muy activo no deja sin turno a los demás.
+    - Con la cola llena, submit() falla de inmediato con SchedulerBusy.
+    - Los trabajos en segundo plano (background=True) van en un carril aparte:
+      solo corren si no hay trabajos interactivos esperando, nunca ocupan todos
+      los workers (salvo que haya uno solo), no gastan cupo de los límites de
+      tasa que haga esperar a nadie, y si llega un trabajo interactivo sin
+      workers libres se cancela uno de ellos para dejarle lugar.
+    """
+
+    def __init__(self, workers: int, max_queue: int, requests_per_minute: float = 0,
+                 tokens_per_minute: float = 0, max_background: Optional[int] = None):
+        """
+        Args:
+            workers (int): Máximo de llamadas al LLM en paralelo.
+            max_queue (int): Máximo de trabajos interactivos esperando turno.
+            requests_per_minute (float): Límite de peticiones por minuto (0 = sin límite).
+            tokens_per_minute (float): Límite de tokens por minuto (0 = sin límite).
+            max_background (Optional[int]): Máximo de trabajos en segundo plano en
+                espera (por defecto, igual que max_queue).
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_background = max_queue if max_background is None else max_background
+        self.background_slots = max(1, workers - 1)
+        self.request_bucket = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 6))
+        self.token_bucket = TokenBucket(tokens_per_minute / 60, max(1.0, tokens_per_minute / 6))
+        self._interactive = _Lane()
+        self._background = _Lane()
+        self._running = 0
+        self._running_background: List[_Job] = []
+        self._background_retry: Optional[float] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.preempted = 0
+        self.extra_requests = 0
+        self.extra_skipped = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @property
+    def saturated(self) -> bool:
+        """Indica si un trabajo interactivo nuevo sería rechazado."""
+        return self._interactive.queued >= self.max_queue
+
+    async def submit(self, key: Hashable, fn: Callable[[], Awaitable[T]], tokens: int = 0,
+                     background: bool = False) -> T:
+        """
+        Encola una llamada al LLM y espera su resultado.
+
+        Args:
+            key (Hashable): Clave de equidad (el chat_id que pidió el resumen).
+            fn (Callable[[], Awaitable[T]]): Corrutina que hace la llamada.
+            tokens (int): Tokens estimados de la llamada (prompt + respuesta).
+            background (bool): Trabajo de baja prioridad (ver la descripción de la clase).
+
+        Returns:
+            T: El resultado de `fn`.
+
+        Raises:
+            SchedulerBusy: Si la cola correspondiente está llena, o si el trabajo
+                era en segundo plano y fue desalojado por uno interactivo.
+        """
+        lane = self._background if background else self._interactive
+        limit = self.max_background if background else self.max_queue
+        if lane.queued >= limit:
+            self.rejected += 1
+            raise SchedulerBusy(f"Cola del LLM llena ({lane.queued} trabajos)")
+        self._ensure_workers()
+
+        job = _Job(fn, tokens, asyncio.get_running_loop().create_future(), background)
+        lane.push(key, job)
+        self.submitted += 1
+        if not background and self._running >= self.workers:
+            self._preempt_background()
+        self._wakeup.set()
+        return await job.future
+
+    async def charge_extra(self, tokens: int = 0, wait: bool = True) -> bool:
+        """
+        Cobra en los límites de tasa una petición adicional de un trabajo en curso
+        (una petición duplicada o un cambio de modelo dentro de la misma llamada).
+
+        Args:
+            tokens (int): Tokens estimados de la petición.
+            wait (bool): Esperar a que haya cupo; con False, no cobra nada si no lo hay ahora.
+
+        Returns:
+            bool: Si la petición quedó cobrada y puede enviarse.
+        """
+        while True:
+            delay = max(self.request_bucket.delay(1), self.token_bucket.delay(tokens))
+            if delay <= 0:
+                break
+            if not wait:
+                self.extra_skipped += 1
+                return False
+            await asyncio.sleep(delay)
+        self.request_bucket.consume(1)
+        self.token_bucket.consume(tokens)
+        self.extra_requests += 1
+        return True
+
+    def _preempt_background(self) -> None:
+        """Cancela el trabajo en segundo plano más reciente para liberar un worker."""
+        for job in reversed(self._running_background):
+            if not job.preempted and job.task is not None:
+                job.preempted = True
+                job.task.cancel()
+                self.preempted += 1
+                return
+
+    def _ensure_workers(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._tasks and self._loop is loop:
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(), name=f"llm-worker-{i}") for i in range(self.workers)]
+
+    def _next_job(self) -> Optional[_Job]:
+        """Siguiente trabajo: los interactivos primero; los de fondo solo con cupo libre."""
+        self._background_retry = None
+        job = self._interactive.pop()
+        if job is not None:
+            return job
+        candidate = self._background.peek()
+        if candidate is None or len(self._running_background) >= self.background_slots:
+            return None
+        wait = max(self.request_bucket.delay(1), self.token_bucket.delay(candidate.tokens))
+        if wait > 0:
+            # No gastar cupo de tasa en segundo plano: reintentar cuando se recargue
+            self._background_retry = wait
+            return None
+        return self._background.pop()
+
+    async def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                if self._background_retry is not None:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self._background_retry)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await self._wakeup.wait()
+                continue
+
+            self._running += 1
+            try:
+                while True:
+                    wait = max(self.request_bucket.delay(1), self.token_bucket.delay(job.tokens))
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                self.request_bucket.consume(1)
+                self.token_bucket.consume(job.tokens)
+
+                waited = time.monotonic() - job.enqueued_at
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+                if job.future.done():
+                    continue
+                try:
+                    result = await self._run(job)
+                except asyncio.CancelledError:
+                    if not job.preempted:
+                        job.future.cancel()
+                        raise
+                    if not job.future.done():
+                        job.future.set_exception(SchedulerBusy("Trabajo en segundo plano desalojado"))
+                    continue
+                except Exception as e:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                else:
+                    if not job.future.done():
+                        job.future.set_result(result)
+                self.completed += 1
+            finally:
+                self._running -= 1
+
+    async def _run(self, job: _Job) -> Any:
+        if not job.background:
+            return await job.fn()
+        # En una tarea propia para poder cancelarla sin cancelar al worker
+        job.task = asyncio.create_task(job.fn())
+        self._running_background.append(job)
+        try:
+            return await job.task
+        finally:
+            self._running_background.remove(job)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Devuelve el estado del planificador.
+
+        Returns:
+            Dict[str, float]: profundidad de cola, en curso, rechazos y tiempos de espera.
+        """
+        return {
+            'queue_depth': self._interactive.queued,
+            'queued_chats': len(self._interactive.queues),
+            'running': self._running,
+            'background_queue_depth': self._background.queued,
+            'background_running': len(self._running_background),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'preempted': self.preempted,
+            'extra_requests': self.extra_requests,
+            'extra_skipped': self.extra_skipped,
+            'wait_seconds_total': self.wait_seconds_total,
+            'wait_seconds_max': self.wait_seconds_max,
+        }
+
+    async def close(self) -> None:
+        """Detiene los workers y cancela los trabajos pendientes."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._interactive.cancel_all()
+        self._background.cancel_all()
@@ -0,0 +1,196 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+from typing import Any, Dict, Iterable, Optional
+
+# Patrones de secretos que nunca deben llegar a los logs, aunque no estén configurados
+_SECRET_PATTERNS = [
+    re.compile(r"bot\d+:[A-Za-z0-9_-]{20,}"),       # token de bot dentro de URLs de la API
+    re.compile(r"Bearer\s+[A-Za-z0-9._\-]+"),       # cabeceras Authorization
+    re.compile(r"sk-or-[A-Za-z0-9_-]{10,}"),         # API keys de OpenRouter
+]
+REDACTED = "***"
+
+# Tasa de muestreo por evento (1.0 = todos, 0 = ninguno)
+_sample_rates: Dict[str, float] = {}
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class RedactingFilter(logging.Filter):
+    """
+    Reemplaza secretos conocidos y patrones de credenciales en el mensaje final
+    y en los campos de los eventos estructurados (que JSONFormatter emite tal cual).
+    """
+
+    def __init__(self, secrets: Iterable[Optional[str]] = ()):
+        super().__init__()
+        self.secrets = [s for s in secrets if s and len(s) >= 6]
+
+    def redact(self, text: str) -> str:
+        for secret in self.secrets:
+            if secret in text:
+                text = text.replace(secret, REDACTED)
+        for pattern in _SECRET_PATTERNS:
+            text = pattern.sub(REDACTED, text)
+        return text
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        redacted = self.redact(message)
+        if redacted != message:
+            record.msg, record.args = redacted, None
+        structured = getattr(record, 'structured', None)
+        if structured is not None:
+            record.structured = _StructuredMessage(
+                structured.event, {k: self._redact_value(v) for k, v in structured.fields.items()}
+            )
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.redact(logging.Formatter().formatException(record.exc_info))
+            record.exc_info = None
+        return True
+
+    def _redact_value(self, value: Any) -> Any:
+        # Los números y booleanos no pueden contener secretos; el resto se emite como texto
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        text = value if isinstance(value, str) else str(value)
+        redacted = self.redact(text)
+        return value if redacted == text else redacted
+
+
+class _StructuredMessage:
+    """Mensaje de un evento estructurado; solo se convierte a texto si se llega a emitir."""
+
+    __slots__ = ("event", "fields")
+
+    def __init__(self, event: str, fields: Dict[str, Any]):
+        self.event = event
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return " ".join([f"event={self.event}"] + [f"{k}={v}" for k, v in self.fields.items()])
+
+
+class JSONFormatter(logging.Formatter):
+    """Una línea JSON por registro; los eventos estructurados aportan sus campos."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            'ts': self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        structured = getattr(record, 'structured', None)
+        if structured is not None:
+            payload['event'] = structured.event
+            payload.update(structured.fields)
+        else:
+            payload['msg'] = record.getMessage()
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, **fields: Any) -> None:
+    """
+    Registra un evento estructurado con costo casi nulo cuando no se emite.
+
+    El nivel se comprueba antes de hacer nada; después se aplica el muestreo
+    configurado para el evento. Los campos pueden ser callables sin argumentos,
+    que solo se evalúan si el evento se emite.
+
+    Args:
+        logger (logging.Logger): Logger a usar.
+        event (str): Nombre del evento (p. ej. "mensaje_recibido").
+        level (int): Nivel de logging.
+        **fields (Any): Campos del evento.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    rate = _sample_rates.get(event, 1.0)
+    if rate < 1.0 and (rate <= 0.0 or random.random() >= rate):
+        return
+    resolved = {k: (v() if callable(v) else v) for k, v in fields.items()}
+    message = _StructuredMessage(event, resolved)
+    logger.log(level, "%s", message, extra={'structured': message})
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """
+    Interpreta una lista "evento=tasa,evento=tasa" de tasas de muestreo.
+
+    Args:
+        spec (str): Especificación, p. ej. "mensaje_recibido=0.01".
+
+    Returns:
+        Dict[str, float]: Tasa por evento.
+    """
+    rates: Dict[str, float] = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            event, _, rate = item.partition("=")
+            rates[event.strip()] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+
+def configure_logging(level: str = "INFO", fmt: str = "text", secrets: Iterable[Optional[str]] = (),
+                      sample_rates: Optional[Dict[str, float]] = None, stream: Any = None) -> None:
+    """
+    Configura el logging del bot: cola no bloqueante, redacción de secretos y formato.
+
+    Los registros se encolan desde el event loop y un hilo aparte les da
+    el formato final (texto o JSON) y los escribe, así la E/S de stdout no
+    bloquea el procesamiento. La interpolación del mensaje y la redacción
+    sí ocurren en el hilo que registra (QueueHandler.prepare y el filtro),
+    para no encolar argumentos que podrían cambiar antes de emitirse.
+
+    Args:
+        level (str): Nivel mínimo ("DEBUG", "INFO", "WARNING"...).
+        fmt (str): "text" o "json".
+        secrets (Iterable[Optional[str]]): Valores a ocultar (tokens, API keys).
+        sample_rates (Optional[Dict[str, float]]): Tasa de muestreo por evento.
+        stream (Any): Destino de los logs (por defecto stderr).
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    _sample_rates.clear()
+    _sample_rates.update(sample_rates or {})
+
+    if fmt == "json":
+        formatter: logging.Formatter = JSONFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(formatter)
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RedactingFilter(secrets))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+
+    # httpx registra cada petición (con el token del bot en la URL) a nivel INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener() -> None:
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_stop_listener)
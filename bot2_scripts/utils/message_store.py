@@ -0,0 +1,252 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .compact_messages import ChatBuffer, MessageView, to_epoch
+from .storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# Costo aproximado en bytes de un mensaje en memoria, sin contar el texto:
+# objeto bytes del texto más su posición en las columnas del ChatBuffer
+# (el nombre del usuario se guarda una sola vez por chat).
+MESSAGE_OVERHEAD = 64
+
+
+def estimate_message_size(message: Dict[str, Any]) -> int:
+    """
+    Estima cuántos bytes ocupa un mensaje del buffer.
+
+    Args:
+        message (Dict[str, Any]): Mensaje con 'user', 'text' y 'timestamp'.
+
+    Returns:
+        int: Tamaño estimado en bytes.
+    """
+    return MESSAGE_OVERHEAD + len(message.get('text', ''))
+
+
+class MessageStore:
+    """
+    Almacén de mensajes recientes por chat.
+
+    Cada chat tiene un buffer circular de capacidad fija (append y descarte
+    en O(1)) guardado por columnas (ver ChatBuffer); get() devuelve vistas
+    compatibles con dict. Además hay un presupuesto global de bytes: cuando se supera,
+    se descartan los chats menos usados recientemente (LRU).
+
+    Los callbacks opcionales permiten mantener estado derivado (p. ej. métricas)
+    sincronizado con el contenido de los buffers.
+
+    Si se indica un backend de almacenamiento, cada mensaje nuevo se persiste
+    a través de él y la historia de un chat se carga de forma perezosa la
+    primera vez que se accede a ese chat (no al arrancar). Desde el event
+    loop conviene llamar antes a preload(), que hace esa lectura en un hilo.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        max_bytes: int,
+        on_append: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+        on_evict: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+        on_drop: Optional[Callable[[int], None]] = None,
+        backend: Optional[StorageBackend] = None,
+    ):
+        """
+        Inicializa el almacén.
+
+        Args:
+            capacity (int): Máximo de mensajes guardados por chat.
+            max_bytes (int): Presupuesto total de memoria (estimada) para todos los chats.
+            on_append (Optional[Callable]): Se llama con (chat_id, mensaje) al agregar un mensaje.
+            on_evict (Optional[Callable]): Se llama con (chat_id, mensaje) al descartar un mensaje.
+            on_drop (Optional[Callable]): Se llama con (chat_id) al eliminar un chat completo.
+            backend (Optional[StorageBackend]): Persistencia de los mensajes.
+        """
+        if capacity <= 0:
+            raise ValueError("La capacidad por chat debe ser mayor que cero.")
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self._chats: "OrderedDict[int, ChatBuffer]" = OrderedDict()
+        self._chat_bytes: Dict[int, int] = {}
+        self.total_bytes = 0
+        self.total_messages = 0
+        self.evicted_messages = 0
+        self.evicted_chats = 0
+        self.on_append = on_append
+        self.on_evict = on_evict
+        self.on_drop = on_drop
+        self.backend = backend
+        self.loaded_chats = 0
+
+    def append(self, chat_id: int, message: Dict[str, Any]) -> None:
+        """
+        Agrega un mensaje al buffer del chat, descartando el más antiguo si está lleno.
+
+        Args:
+            chat_id (int): ID del chat.
+            message (Dict[str, Any]): Mensaje a guardar.
+        """
+        buffer = self._ensure_loaded(chat_id)
+        self._push(chat_id, buffer, message)
+        if self.backend is not None:
+            self.backend.append(chat_id, message)
+
+        if self.total_bytes > self.max_bytes:
+            self._enforce_budget(chat_id)
+
+    def get(self, chat_id: int, since: Optional[datetime] = None) -> List[MessageView]:
+        """
+        Devuelve los mensajes del chat, del más antiguo al más reciente.
+
+        Args:
+            chat_id (int): ID del chat.
+            since (Optional[datetime]): Si se indica, solo los mensajes desde ese
+                momento (búsqueda binaria sobre los timestamps del buffer).
+
+        Returns:
+            List[MessageView]: Vistas de los mensajes guardados (vacía si no hay).
+        """
+        buffer = self._ensure_loaded(chat_id)
+        if not buffer:
+            # No guardar entradas vacías: solo ocuparían lugar en el LRU
+            self._chats.pop(chat_id, None)
+            self._chat_bytes.pop(chat_id, None)
+            return []
+        if since is not None:
+            return buffer.since(to_epoch(since))
+        return list(buffer)
+
+    async def preload(self, chat_id: int) -> None:
+        """
+        Carga la historia del chat desde el backend en un hilo aparte.
+
+        append() y get() cargan el chat de forma síncrona si no está en
+        memoria; llamando antes a preload() esa lectura no bloquea el event loop.
+
+        Args:
+            chat_id (int): ID del chat.
+        """
+        if self.backend is None or chat_id in self._chats:
+            return
+        history = await asyncio.to_thread(self.backend.load_recent, chat_id, self.capacity)
+        if chat_id in self._chats:
+            # Otro pedido lo cargó mientras tanto; su copia ya incluye esta historia
+            return
+        self._install(chat_id, history)
+
+    def seq(self, chat_id: int) -> int:
+        """
+        Número de secuencia del último mensaje del chat en memoria.
+
+        Crece con cada mensaje agregado; la diferencia entre dos lecturas es la
+        cantidad de mensajes nuevos. Vuelve a empezar si el chat se descarta.
+
+        Args:
+            chat_id (int): ID del chat.
+
+        Returns:
+            int: Mensajes agregados al buffer del chat (0 si no está en memoria).
+        """
+        buffer = self._chats.get(chat_id)
+        return buffer.seq if buffer is not None else 0
+
+    def drop(self, chat_id: int) -> None:
+        """Elimina todos los mensajes de un chat."""
+        buffer = self._chats.pop(chat_id, None)
+        if buffer is None:
+            return
+        self.total_bytes -= self._chat_bytes.pop(chat_id)
+        self.total_messages -= len(buffer)
+        if self.on_drop is not None:
+            self.on_drop(chat_id)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Devuelve contadores de ocupación y descarte.
+
+        Returns:
+            Dict[str, int]: chats, mensajes, bytes usados, presupuesto y descartes.
+        """
+        return {
+            'chats': len(self._chats),
+            'messages': self.total_messages,
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'evicted_messages': self.evicted_messages,
+            'evicted_chats': self.evicted_chats,
+            'loaded_chats': self.loaded_chats,
+        }
+
+    def __contains__(self, chat_id: int) -> bool:
+        return chat_id in self._chats
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._chats))
+
+    def _ensure_loaded(self, chat_id: int) -> ChatBuffer:
+        """Devuelve el buffer del chat, cargándolo desde el backend si no está en memoria."""
+        buffer = self._chats.get(chat_id)
+        if buffer is not None:
+            self._chats.move_to_end(chat_id)
+            return buffer
+
+        history = self.backend.load_recent(chat_id, self.capacity) if self.backend is not None else []
+        return self._install(chat_id, history)
+
+    def _install(self, chat_id: int, history: List[Dict[str, Any]]) -> ChatBuffer:
+        """Crea el buffer del chat con la historia leída del backend."""
+        buffer = self._chats[chat_id] = ChatBuffer(self.capacity)
+        self._chat_bytes[chat_id] = 0
+        for message in history:
+            self._push(chat_id, buffer, message)
+        if history:
+            self.loaded_chats += 1
+            if self.total_bytes > self.max_bytes:
+                self._enforce_budget(chat_id)
+        return buffer
+
+    def _push(self, chat_id: int, buffer: ChatBuffer, message: Dict[str, Any]) -> None:
+        if len(buffer) == self.capacity:
+            self._account_removed(chat_id, buffer[0])
+            self.evicted_messages += 1
+
+        # Los callbacks reciben el mensaje tal como quedó guardado, igual que al descartarlo
+        record = buffer.append(message)
+        size = estimate_message_size(record)
+        self._chat_bytes[chat_id] += size
+        self.total_bytes += size
+        self.total_messages += 1
+        if self.on_append is not None:
+            self.on_append(chat_id, record)
+
+    def _account_removed(self, chat_id: int, message: MessageView) -> None:
+        size = estimate_message_size(message)
+        self._chat_bytes[chat_id] -= size
+        self.total_bytes -= size
+        self.total_messages -= 1
+        if self.on_evict is not None:
+            self.on_evict(chat_id, message)
+
+    def _enforce_budget(self, current_chat: int) -> None:
+        """Descarta chats inactivos (LRU) hasta volver al presupuesto."""
+        while self.total_bytes > self.max_bytes and len(self._chats) > 1:
+            chat_id = next(iter(self._chats))
+            if chat_id == current_chat:
+                break
+            self.evicted_messages += len(self._chats[chat_id])
+            self.evicted_chats += 1
+            self.drop(chat_id)
+            logger.debug(f"Chat {chat_id} descartado por presupuesto de memoria")
+
+        # Si un solo chat excede el presupuesto, se recorta desde su mensaje más antiguo
+        buffer = self._chats.get(current_chat)
+        while self.total_bytes > self.max_bytes and buffer and len(buffer) > 1:
+            self._account_removed(current_chat, buffer.popleft())
+            self.evicted_messages += 1
@@ -0,0 +1,237 @@
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from .http_server import HTTPRequest, HTTPResponse, MiniHTTPServer
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (10, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+LabelValues = Tuple[str, ...]
+# (nombre, tipo, ayuda, etiquetas, valor) que devuelven los collectors
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Contador monótono."""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Valor que sube y baja."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}" for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Histograma con buckets fijos (acumulativos al exportar, como espera Prometheus)."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[Dict[str, str]]:
+        """
+        Mide la duración del bloque. Las etiquetas pueden completarse dentro del
+        bloque modificando el diccionario devuelto (p. ej. el resultado).
+        """
+        labels = dict(labels)
+        start = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def total(self, **labels: str) -> float:
+        return self._sums.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(self._sums[key])}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas con exportación en formato de texto de Prometheus.
+
+    Además de métricas propias admite collectors: funciones que devuelven
+    muestras calculadas en el momento del scrape (p. ej. el estado de la cola).
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], List[Sample]]] = {}
+
+    def _get_or_create(self, cls, name: str, help_text: str, labels: Sequence[str], **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, help_text, labels, **kwargs)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labels, buckets=buckets)
+
+    def register_collector(self, name: str, collector: Callable[[], List[Sample]]) -> None:
+        """Registra (o reemplaza) un collector con el nombre dado."""
+        self._collectors[name] = collector
+
+    def unregister_collector(self, name: str) -> None:
+        self._collectors.pop(name, None)
+
+    def render(self) -> str:
+        """Devuelve todas las métricas en formato de exposición de texto de Prometheus."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            body = metric.render()
+            if body:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(body)
+
+        seen = set()
+        for collector in list(self._collectors.values()):
+            for name, kind, help_text, labels, value in collector():
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                label_str = _format_labels(list(labels), list(labels.values()))
+                lines.append(f"{name}{label_str} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def stats_collector(prefix: str, stats: Callable[[], Dict[str, float]], help_text: str,
+                    counters: Sequence[str] = ()) -> Callable[[], List[Sample]]:
+    """
+    Convierte un método stats() en un collector de métricas.
+
+    Args:
+        prefix (str): Prefijo de los nombres (p. ej. "bot_summary_cache").
+        stats (Callable[[], Dict[str, float]]): Función que devuelve los contadores.
+        help_text (str): Descripción común.
+        counters (Sequence[str]): Claves que son contadores monótonos (el resto son gauges).
+
+    Returns:
+        Callable[[], List[Sample]]: El collector.
+    """
+    def collect() -> List[Sample]:
+        return [
+            (f"{prefix}_{key}", "counter" if key in counters else "gauge", f"{help_text} ({key})", {}, value)
+            for key, value in stats().items()
+        ]
+    return collect
+
+
+# Registro por defecto del proceso
+REGISTRY = MetricsRegistry()
+
+
+class MetricsServer:
+    """Expone un registro de métricas en GET /metrics."""
+
+    def __init__(self, registry: MetricsRegistry, host: str, port: int):
+        self.registry = registry
+        self.server = MiniHTTPServer(host, port)
+        self.server.route("GET", "/metrics", self._metrics)
+
+    @property
+    def port(self) -> int:
+        return self.server.port
+
+    async def start(self) -> None:
+        await self.server.start()
+
+    async def stop(self) -> None:
+        await self.server.stop(drain_timeout=1.0)
+
+    async def _metrics(self, request: HTTPRequest) -> HTTPResponse:
+        return HTTPResponse(200, self.registry.render().encode('utf-8'),
+                            content_type="text/plain; version=0.0.4; charset=utf-8")
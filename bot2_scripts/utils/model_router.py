@@ -0,0 +1,446 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence
+
+from .llm_client import LLMConnectionError, LLMError, LLMResponseError, OpenRouterClient
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Cuánto pesa la tasa de error frente a la latencia al elegir modelo
+ERROR_WEIGHT = 4.0
+
+LLM_MODEL_SECONDS = REGISTRY.histogram(
+    "bot_llm_model_seconds", "Latencia de cada intento contra un modelo, según el resultado", labels=("model", "outcome")
+)
+LLM_HEDGES = REGISTRY.counter(
+    "bot_llm_hedges_total", "Peticiones duplicadas a un segundo modelo, según cuál respondió primero", labels=("winner",)
+)
+LLM_BREAKER_OPEN = REGISTRY.gauge(
+    "bot_llm_breaker_open", "1 si el circuit breaker del modelo está abierto", labels=("model",)
+)
+
+# Modelos que produjeron las respuestas de la operación en curso (ver record_models)
+_reply_models: ContextVar[Optional[List[str]]] = ContextVar("llm_reply_models", default=None)
+
+
+@contextmanager
+def record_models(models: Optional[List[str]]) -> Iterator[Optional[List[str]]]:
+    """
+    Anota en `models` el modelo que respondió cada llamada hecha dentro del bloque.
+
+    La lista se comparte con las tareas creadas dentro del bloque; pasar None
+    no anota nada.
+    """
+    token = _reply_models.set(models)
+    try:
+        yield models
+    finally:
+        _reply_models.reset(token)
+
+
+def current_models() -> Optional[List[str]]:
+    """Lista de modelos de la operación en curso (None si nadie los está anotando)."""
+    return _reply_models.get()
+
+
+def _note_model(model: str) -> None:
+    models = _reply_models.get()
+    if models is not None:
+        models.append(model)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de un modelo.
+
+    Tras `failure_threshold` fallos seguidos se abre y el modelo deja de
+    recibir peticiones durante `reset_timeout` segundos; después deja pasar una
+    sola petición de prueba (semiabierto): si sale bien se cierra, si falla
+    vuelve a abrirse.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            failure_threshold (int): Fallos seguidos que abren el circuito (0 lo desactiva).
+            reset_timeout (float): Segundos abierto antes de probar de nuevo.
+            clock (Callable[[], float]): Reloj monotónico (inyectable para pruebas).
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opens = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def available(self) -> bool:
+        """Indica si el modelo puede recibir una petición ahora."""
+        if self.failure_threshold <= 0 or self.state == "closed":
+            return True
+        if self.state == "open":
+            return self._clock() - self._opened_at >= self.reset_timeout
+        return not self._probing
+
+    def acquire(self) -> bool:
+        """Reserva el paso de una petición (en semiabierto, la única de prueba)."""
+        if not self.available:
+            return False
+        if self.state == "open":
+            self.state = "half_open"
+        if self.state == "half_open":
+            self._probing = True
+        return True
+
+    def release(self) -> None:
+        """La petición se canceló sin resultado: libera la prueba sin contarla."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.state = "closed"
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._probing = False
+        self.failures += 1
+        if self.failure_threshold <= 0:
+            return
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opens += 1
+            self.state = "open"
+            self._opened_at = self._clock()
+
+
+class ModelStats:
+    """
+    Latencias y resultados recientes de un modelo (últimos `window` intentos).
+
+    Un intento cuenta como fallido si dio error o si, siendo el principal,
+    perdió la carrera contra la petición duplicada.
+    """
+
+    def __init__(self, window: int = 50):
+        self.latencies: deque = deque(maxlen=window)
+        self.outcomes: deque = deque(maxlen=window)
+
+    def record(self, seconds: float, ok: bool) -> None:
+        self.latencies.append(seconds)
+        self.outcomes.append(ok)
+
+    def record_latency(self, seconds: float) -> None:
+        """Intento cancelado sin resultado: solo se sabe que tardaba al menos `seconds`."""
+        self.latencies.append(seconds)
+
+    def record_lost_race(self) -> None:
+        """El modelo era el principal y respondió antes la petición duplicada, lanzada después."""
+        self.outcomes.append(False)
+
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+
+class ModelRouter:
+    """
+    Reparte las llamadas al LLM entre un conjunto ordenado de modelos.
+
+    Cada llamada elige el modelo principal al azar, ponderado por el orden de
+    la lista y por la latencia p95 y la tasa de error recientes de cada modelo
+    (los modelos con el circuit breaker abierto no participan). Si el
+    principal no respondió tras `hedge_delay` segundos, se lanza la misma
+    petición al siguiente modelo y gana la primera respuesta; si un intento
+    falla, se pasa al siguiente modelo disponible.
+
+    La primera petición de cada llamada la cobra quien llama (el planificador);
+    las adicionales se cobran con `charge`: una duplicada solo se envía si hay
+    cupo en ese momento, y un cambio de modelo espera a tenerlo.
+
+    Expone la misma interfaz que OpenRouterClient (complete, stream, aclose).
+    """
+
+    def __init__(
+        self,
+        client: OpenRouterClient,
+        models: Sequence[str],
+        hedge_delay: float = 3.0,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        window: int = 50,
+        rng: Optional[random.Random] = None,
+        clock: Callable[[], float] = time.monotonic,
+        charge: Optional[Callable[[str, bool], Awaitable[bool]]] = None,
+    ):
+        """
+        Args:
+            client (OpenRouterClient): Cliente HTTP que hace las peticiones.
+            models (Sequence[str]): Modelos en orden de preferencia.
+            hedge_delay (float): Segundos antes de duplicar la petición en otro modelo (0 sin duplicar).
+            failure_threshold (int): Fallos seguidos que abren el circuito de un modelo (0 lo desactiva).
+            reset_timeout (float): Segundos que un circuito queda abierto antes de probar de nuevo.
+            window (int): Intentos recientes considerados para la latencia y la tasa de error.
+            rng (Optional[random.Random]): Generador para la elección ponderada (inyectable para pruebas).
+            clock (Callable[[], float]): Reloj monotónico.
+            charge (Optional[Callable[[str, bool], Awaitable[bool]]]): Cobra en los límites
+                de tasa cada petición adicional a la primera (duplicada o cambio de modelo):
+                recibe el prompt y si debe esperar cupo, y devuelve si se puede enviar.
+        """
+        if not models:
+            raise ValueError("Se necesita al menos un modelo.")
+        self.client = client
+        self.models = list(dict.fromkeys(models))
+        self.hedge_delay = hedge_delay
+        self._rng = rng or random.Random()
+        self._clock = clock
+        self._breakers = {m: CircuitBreaker(failure_threshold, reset_timeout, clock) for m in self.models}
+        self._stats = {m: ModelStats(window) for m in self.models}
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.hedges_skipped = 0
+        self._charge = charge
+
+    @property
+    def api_key(self) -> Optional[str]:
+        return self.client.api_key
+
+    def _weight(self, index: int, model: str) -> float:
+        stats = self._stats[model]
+        latency = stats.p95()
+        if latency is None:
+            # Sin historial no se asume que sea más rápido que el peor modelo conocido
+            # ni que el retardo de duplicación
+            known = [s.p95() for s in self._stats.values() if s.latencies]
+            latency = max(known + [self.hedge_delay or 1.0])
+        return 1.0 / ((index + 1) * max(latency, 0.01) * (1 + ERROR_WEIGHT * stats.error_rate()))
+
+    def candidates(self) -> List[str]:
+        """
+        Modelos disponibles en el orden en que se probarán: el primero elegido
+        al azar según su peso, el resto de mayor a menor peso.
+        """
+        weights = {m: self._weight(i, m) for i, m in enumerate(self.models) if self._breakers[m].available}
+        if not weights:
+            return []
+        ranked = sorted(weights, key=weights.get, reverse=True)
+        primary = self._rng.choices(list(weights), weights=list(weights.values()))[0]
+        return [primary] + [m for m in ranked if m != primary]
+
+    async def complete(self, prompt: str, model: Optional[str] = None) -> str:
+        """
+        Envía el prompt al mejor modelo disponible y devuelve el texto generado.
+
+        Args:
+            prompt (str): Prompt a enviar como mensaje de usuario.
+            model (Optional[str]): Si se indica, se usa ese modelo sin enrutar.
+
+        Returns:
+            str: La primera respuesta exitosa.
+
+        Raises:
+            LLMConnectionError: Si no hay modelos disponibles o fallaron todos.
+            LLMResponseError: Si el último intento respondió sin contenido.
+        """
+        if model is not None:
+            return await self.client.complete(prompt, model)
+
+        candidates = self.candidates()
+        if not candidates:
+            raise LLMConnectionError("Ningún modelo disponible: todos los circuit breakers están abiertos")
+
+        pending: Dict[asyncio.Task, str] = {}
+        remaining = deque(candidates)
+        last_error: Optional[LLMError] = None
+        hedged = False
+
+        async def launch(extra: bool, wait: bool = True) -> bool:
+            while remaining:
+                candidate = remaining.popleft()
+                if not self._breakers[candidate].acquire():
+                    continue
+                if extra and self._charge is not None:
+                    try:
+                        charged = await self._charge(prompt, wait)
+                    except BaseException:
+                        self._breakers[candidate].release()
+                        raise
+                    if not charged:
+                        # Sin cupo de tasa: el modelo queda para un posible cambio posterior
+                        self._breakers[candidate].release()
+                        remaining.appendleft(candidate)
+                        return False
+                pending[asyncio.create_task(self._attempt(candidate, prompt))] = candidate
+                return True
+            return False
+
+        await launch(extra=False)
+        primary = next(iter(pending.values()), None)
+        try:
+            while pending:
+                can_hedge = not hedged and self.hedge_delay > 0 and len(pending) == 1
+                done, _ = await asyncio.wait(
+                    pending, timeout=self.hedge_delay if can_hedge else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # El principal tarda: duplicar la petición en el siguiente modelo, si hay cupo
+                    hedged = True
+                    if await launch(extra=True, wait=False):
+                        self.hedges += 1
+                        logger.info(f"Modelo {next(iter(pending.values()))} lento; duplicando la petición")
+                    elif remaining:
+                        self.hedges_skipped += 1
+                    continue
+                for task in done:
+                    candidate = pending.pop(task)
+                    try:
+                        text = task.result()
+                    except LLMError as e:
+                        last_error = e
+                        logger.warning(f"El modelo {candidate} falló: {e}")
+                        continue
+                    if hedged:
+                        winner = "primary" if candidate == primary else "hedge"
+                        LLM_HEDGES.inc(winner=winner)
+                        if winner == "hedge":
+                            self.hedge_wins += 1
+                            if primary in pending.values():
+                                self._stats[primary].record_lost_race()
+                    _note_model(candidate)
+                    return text
+                if not pending and await launch(extra=True):
+                    self.failovers += 1
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        raise last_error or LLMConnectionError("Ningún modelo disponible: todos los circuit breakers están abiertos")
+
+    async def stream(self, prompt: str, model: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Como complete, pero en streaming.
+
+        No se duplican peticiones (dos streams no se pueden mezclar); si un
+        modelo falla antes del primer fragmento se pasa al siguiente.
+
+        Yields:
+            str: Fragmentos consecutivos del contenido generado.
+        """
+        if model is not None:
+            async for delta in self.client.stream(prompt, model):
+                yield delta
+            return
+
+        last_error: Optional[LLMError] = None
+        first = True
+        for candidate in self.candidates():
+            breaker = self._breakers[candidate]
+            if not breaker.acquire():
+                continue
+            if not first and self._charge is not None:
+                try:
+                    await self._charge(prompt, True)
+                except BaseException:
+                    breaker.release()
+                    raise
+            first = False
+            started = self._clock()
+            received = False
+            try:
+                async for delta in self.client.stream(prompt, candidate):
+                    if not received:
+                        received = True
+                        _note_model(candidate)
+                    yield delta
+            except LLMError as e:
+                self._record(candidate, started, e)
+                if received:
+                    raise
+                last_error = e
+                self.failovers += 1
+                logger.warning(f"El modelo {candidate} falló al abrir el stream: {e}")
+                continue
+            except BaseException:
+                # Cancelación o consumidor que dejó de leer: sin resultado que contar
+                breaker.release()
+                raise
+            self._record(candidate, started, None)
+            return
+        raise last_error or LLMConnectionError("Ningún modelo disponible: todos los circuit breakers están abiertos")
+
+    async def _attempt(self, model: str, prompt: str) -> str:
+        started = self._clock()
+        try:
+            text = await self.client.complete(prompt, model)
+        except LLMError as e:
+            self._record(model, started, e)
+            raise
+        except BaseException:
+            # Perdió la carrera o se canceló el pedido: sin fallo para el circuit breaker,
+            # pero la espera cuenta como latencia (si no, un modelo lento que siempre
+            # pierde nunca tendría historial y seguiría pareciendo rápido)
+            self._breakers[model].release()
+            elapsed = self._clock() - started
+            self._stats[model].record_latency(elapsed)
+            LLM_MODEL_SECONDS.observe(elapsed, model=model, outcome="cancelled")
+            raise
+        self._record(model, started, None)
+        return text
+
+    def _record(self, model: str, started: float, error: Optional[LLMError]) -> None:
+        elapsed = self._clock() - started
+        breaker = self._breakers[model]
+        self._stats[model].record(elapsed, error is None)
+        if error is None:
+            outcome = "ok"
+            breaker.record_success()
+        else:
+            outcome = "response_error" if isinstance(error, LLMResponseError) else "connection_error"
+            breaker.record_failure()
+            if breaker.state == "open":
+                logger.warning(f"Circuit breaker del modelo {model} abierto tras {breaker.failures} fallos")
+        LLM_MODEL_SECONDS.observe(elapsed, model=model, outcome=outcome)
+        LLM_BREAKER_OPEN.set(1 if breaker.state == "open" else 0, model=model)
+
+    def snapshot(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """Estado de cada modelo: circuito, p95 y tasa de error recientes."""
+        return {
+            m: {
+                'state': self._breakers[m].state,
+                'p95': self._stats[m].p95(),
+                'error_rate': self._stats[m].error_rate(),
+            }
+            for m in self.models
+        }
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'models': len(self.models),
+            'available': sum(1 for b in self._breakers.values() if b.available),
+            'breaker_opens': sum(b.opens for b in self._breakers.values()),
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'hedges_skipped': self.hedges_skipped,
+            'failovers': self.failovers,
+        }
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,311 @@
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from telegram.error import RetryAfter
+
+from .llm_scheduler import TokenBucket
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_WAIT_SECONDS = REGISTRY.histogram(
+    "bot_outbound_wait_seconds", "Espera de cada mensaje saliente por los límites de Telegram y la cola de su chat"
+)
+
+FENCE = "```"
+# Cortes posibles en orden de preferencia; el grupo 1 es lo que se descarta entre trozos
+_BOUNDARIES = (
+    re.compile(r"(\n[ \t]*\n)"),              # párrafo
+    re.compile(r"(\n)"),                      # línea
+    re.compile(r"[.!?…]+[\"'»)\]]*([ \t]+)"),  # oración
+    re.compile(r"([ \t]+)"),                  # palabra
+)
+# Lo máximo que ocupa el cierre de un formato abierto ("\n```")
+_CLOSER_RESERVE = len(FENCE) + 1
+
+
+def _open_markup(text: str) -> Tuple[str, str]:
+    """
+    Formato que queda abierto al final de un texto Markdown.
+
+    Returns:
+        Tuple[str, str]: Texto que lo cierra y texto que lo reabre en el trozo
+            siguiente (ambos vacíos si no queda nada abierto).
+    """
+    parts = text.split(FENCE)
+    if len(parts) % 2 == 0:
+        # Termina dentro de un bloque de código: se cierra y se reabre con el mismo lenguaje
+        language = parts[-1].split("\n", 1)[0].strip()
+        return "\n" + FENCE, FENCE + language + "\n"
+    prose = parts[-1]
+    bold = prose.count("**") % 2 == 1
+    code = prose.replace("**", "").count("`") % 2 == 1
+    opener = ("**" if bold else "") + ("`" if code else "")
+    return opener[::-1], opener
+
+
+def _cut(text: str, limit: int) -> Tuple[str, str]:
+    """Primer trozo (con el formato cerrado) y el resto (con el formato reabierto)."""
+    window = max(1, limit - _CLOSER_RESERVE)
+    fallback: Optional[Tuple[int, int]] = None
+    for pattern in _BOUNDARIES:
+        spans = [m.span(1) for m in pattern.finditer(text, 0, window + 1) if m.start(1) >= window // 3]
+        for start, end in reversed(spans):
+            closer, opener = _open_markup(text[:start])
+            if not closer:
+                return text[:start], text[end:]
+            # El resto lleva el formato reabierto delante: el corte tiene que dejarlo más
+            # corto que el texto (no sirve, p. ej., la línea que abre el bloque de código)
+            if fallback is None and len(opener) < start:
+                fallback = (start, end)
+    # Ningún corte deja el formato cerrado: cerrarlo en el corte y reabrirlo después
+    start, end = fallback or (window, window)
+    head, rest = text[:start], text[end:]
+    closer, opener = _open_markup(head)
+    if len(opener) >= start:
+        # La apertura (p. ej. un lenguaje muy largo) no cabe: reabrir sin lenguaje o no reabrir
+        opener = FENCE + "\n" if opener.startswith(FENCE) and len(FENCE) + 1 < start else ""
+    return head + closer, opener + rest
+
+
+def split_message(text: str, limit: int) -> List[str]:
+    """
+    Divide un texto en mensajes de hasta `limit` caracteres.
+
+    Corta preferentemente entre párrafos, después entre líneas, oraciones y
+    palabras, sin dejar bloques de código, negritas ni código en línea sin
+    cerrar: si no hay otro remedio, el formato se cierra al final de un
+    trozo y se reabre al principio del siguiente.
+
+    Los mensajes se envían sin parse_mode, así que esos cierres y
+    aperturas se ven tal cual: solo sirven para que cada trozo se lea bien
+    por separado (y para que el texto siga siendo Markdown válido).
+
+    Args:
+        text (str): Texto a dividir.
+        limit (int): Largo máximo de cada mensaje.
+
+    Returns:
+        List[str]: Los trozos, en orden (ninguno vacío).
+    """
+    chunks = []
+    while len(text) > limit:
+        head, text = _cut(text, limit)
+        if head.strip():
+            chunks.append(head)
+    if text.strip():
+        chunks.append(text)
+    return chunks
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return float(retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else retry_after)
+
+
+@dataclass
+class _Delivery:
+    calls: List[Callable[[], Awaitable[Any]]]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class _ChatLane:
+    """Cola y límites de un chat; un solo envío a la vez para conservar el orden."""
+
+    def __init__(self, rate: float, burst: float, group_per_minute: float, group: bool):
+        self.queue: Deque[_Delivery] = deque()
+        self.bucket = TokenBucket(rate, max(1.0, burst))
+        self.group_bucket = TokenBucket(group_per_minute / 60, max(1.0, group_per_minute)) if group else None
+        self.task: Optional[asyncio.Task] = None
+        self.idle_since = time.monotonic()
+
+
+class OutboundSender:
+    """
+    Envío de mensajes a Telegram con los límites de la API.
+
+    Cada chat tiene su propia cola atendida por una tarea que envía de a un
+    mensaje, así que los mensajes de un chat salen en orden mientras los de
+    chats distintos se envían en paralelo: un resumen largo no demora las
+    respuestas de los demás chats. Cada envío respeta un token bucket global,
+    uno por chat y, en grupos, el límite por minuto; ante un 429 (RetryAfter)
+    la cola del chat se pausa el tiempo indicado y se reintenta.
+    """
+
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 10.0,
+                 group_per_minute: float = 20.0, max_retries: int = 3, idle_ttl: float = 60.0):
+        """
+        Args:
+            global_rate (float): Mensajes por segundo sumando todos los chats (0 sin límite).
+            chat_rate (float): Mensajes por segundo en un mismo chat (0 sin límite).
+            chat_burst (float): Mensajes seguidos permitidos en un chat antes de aplicar chat_rate.
+            group_per_minute (float): Mensajes por minuto en un mismo grupo (0 sin límite).
+            max_retries (int): Reintentos de un mensaje tras recibir RetryAfter.
+            idle_ttl (float): Segundos sin envíos tras los que se olvida el estado de un chat.
+        """
+        self.global_bucket = TokenBucket(global_rate, max(1.0, global_rate))
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_per_minute = group_per_minute
+        self.max_retries = max_retries
+        self.idle_ttl = idle_ttl
+        self._lanes: Dict[int, _ChatLane] = {}
+        self._prune_at = 64
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.queued = 0
+
+    async def send(self, chat_id: int, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Encola un envío en el chat y espera a que se haga.
+
+        Args:
+            chat_id (int): Chat de destino (los ids negativos son grupos).
+            call (Callable[[], Awaitable[Any]]): Hace la petición a Telegram.
+
+        Returns:
+            Any: El resultado de la petición (p. ej. el mensaje enviado).
+        """
+        results = await self.post(chat_id, call)
+        return results[0]
+
+    def post(self, chat_id: int, call: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """
+        Encola un envío sin esperarlo: lo que se encole después en el mismo chat
+        sale después.
+
+        Returns:
+            asyncio.Future: Se resuelve con [resultado] al enviarse.
+        """
+        return self._enqueue(chat_id, [call])
+
+    async def send_text(self, chat_id: int, send: Callable[[str], Awaitable[Any]], text: str,
+                        limit: int) -> List[Any]:
+        """
+        Envía un texto largo dividido con split_message, en orden y sin
+        intercalar otros mensajes del mismo chat.
+
+        Args:
+            chat_id (int): Chat de destino.
+            send (Callable[[str], Awaitable[Any]]): Envía un trozo (p. ej. message.reply_text).
+            text (str): Texto completo.
+            limit (int): Largo máximo de cada mensaje.
+
+        Returns:
+            List[Any]: El resultado de cada envío.
+        """
+        calls = [lambda part=part: send(part) for part in split_message(text, limit)]
+        if not calls:
+            return []
+        return await self._enqueue(chat_id, calls)
+
+    def _enqueue(self, chat_id: int, calls: List[Callable[[], Awaitable[Any]]]) -> asyncio.Future:
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            self._prune()
+            lane = self._lanes[chat_id] = _ChatLane(self.chat_rate, self.chat_burst, self.group_per_minute,
+                                                    group=chat_id < 0)
+        delivery = _Delivery(calls, asyncio.get_running_loop().create_future())
+        lane.queue.append(delivery)
+        self.queued += 1
+        if lane.task is None:
+            lane.task = asyncio.create_task(self._drain(chat_id, lane))
+        return delivery.future
+
+    def _prune(self) -> None:
+        # Olvidar los chats inactivos, revisando solo cuando la tabla crece
+        if len(self._lanes) < self._prune_at:
+            return
+        now = time.monotonic()
+        for chat_id, lane in list(self._lanes.items()):
+            if lane.task is None and now - lane.idle_since > self.idle_ttl:
+                del self._lanes[chat_id]
+        self._prune_at = max(64, 2 * len(self._lanes))
+
+    async def _drain(self, chat_id: int, lane: _ChatLane) -> None:
+        try:
+            while lane.queue:
+                delivery = lane.queue[0]
+                # Quien lo encoló ya no espera el envío (p. ej. se canceló su handler)
+                if not delivery.future.cancelled():
+                    await self._run(chat_id, lane, delivery)
+                lane.queue.popleft()
+                self.queued -= 1
+        finally:
+            # Al cancelar (cierre del bot) no quedan esperas colgadas
+            while lane.queue:
+                lane.queue.popleft().future.cancel()
+                self.queued -= 1
+            lane.task = None
+            lane.idle_since = time.monotonic()
+
+    async def _run(self, chat_id: int, lane: _ChatLane, delivery: _Delivery) -> None:
+        try:
+            results = []
+            for call in delivery.calls:
+                await self._wait_turn(lane)
+                if not results:
+                    OUTBOUND_WAIT_SECONDS.observe(time.monotonic() - delivery.enqueued_at)
+                results.append(await self._deliver(chat_id, call))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # El resto de los trozos no se envía: quedaría un mensaje incompleto
+            self.failed += 1
+            if not delivery.future.done():
+                delivery.future.set_exception(e)
+        else:
+            if not delivery.future.done():
+                delivery.future.set_result(results)
+
+    async def _wait_turn(self, lane: _ChatLane) -> None:
+        await lane.bucket.acquire()
+        if lane.group_bucket is not None:
+            await lane.group_bucket.acquire()
+        await self.global_bucket.acquire()
+
+    async def _deliver(self, chat_id: int, call: Callable[[], Awaitable[Any]]) -> Any:
+        attempt = 0
+        while True:
+            try:
+                result = await call()
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retried += 1
+                wait = _retry_seconds(e)
+                logger.warning(f"Control de flujo de Telegram en el chat {chat_id}: reintento {attempt} en {wait:.0f}s")
+                # La cola del chat queda en pausa; los demás chats siguen enviando
+                await asyncio.sleep(wait)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'chats': len(self._lanes),
+            'sending_chats': sum(1 for lane in self._lanes.values() if lane.task is not None),
+            'queued': self.queued,
+            'sent': self.sent,
+            'retried': self.retried,
+            'failed': self.failed,
+        }
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Espera a que salgan los mensajes encolados; cancela los que no alcanzan."""
+        tasks = [lane.task for lane in self._lanes.values() if lane.task is not None]
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Se descartaron mensajes salientes de {len(pending)} chats al detener el bot")
+            await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,57 @@
+import io
+import time
+from typing import Optional
+
+# cProfile y pstats se importan al usarse: casi nunca hacen falta y no deben sumar al arranque
+
+
+class ProfilerToggle:
+    """
+    Activa y desactiva cProfile sobre el hilo del event loop.
+
+    Pensado para usarse desde un comando de administración: se enciende,
+    se deja correr bajo carga real y al apagarlo se obtiene el reporte.
+    """
+
+    def __init__(self, top: int = 25, dump_path: Optional[str] = None):
+        """
+        Args:
+            top (int): Cantidad de funciones a incluir en el reporte.
+            dump_path (Optional[str]): Si se indica, ahí se guardan las estadísticas crudas (.prof).
+        """
+        self.top = top
+        self.dump_path = dump_path
+        self._profile: Optional["cProfile.Profile"] = None
+        self._started_at = 0.0
+
+    @property
+    def active(self) -> bool:
+        return self._profile is not None
+
+    def start(self) -> None:
+        """Empieza a perfilar (no hace nada si ya está activo)."""
+        if self._profile is None:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._started_at = time.monotonic()
+            self._profile.enable()
+
+    def stop(self) -> str:
+        """
+        Detiene el profiler y devuelve un reporte ordenado por tiempo acumulado.
+
+        Returns:
+            str: Reporte de texto (vacío si el profiler no estaba activo).
+        """
+        if self._profile is None:
+            return ""
+        self._profile.disable()
+        profile, self._profile = self._profile, None
+        if self.dump_path:
+            profile.dump_stats(self.dump_path)
+        import pstats
+        output = io.StringIO()
+        output.write(f"Perfilado durante {time.monotonic() - self._started_at:.1f}s\n")
+        stats = pstats.Stats(profile, stream=output)
+        stats.strip_dirs().sort_stats("cumulative").print_stats(self.top)
+        return output.getvalue()
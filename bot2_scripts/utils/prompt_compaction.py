@@ -0,0 +1,278 @@
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Aproximación habitual para texto en español: ~4 caracteres por token
+CHARS_PER_TOKEN = 4
+
+# Pasos disponibles, en el orden en que se aplican
+STEPS = ("shorten", "dedupe", "collapse", "budget")
+
+URL_RE = re.compile(r'(?:https?://|www\.)[^\s<>()]+', re.IGNORECASE)
+CODE_BLOCK_RE = re.compile(r'```(?:[\w+-]*\n)?(.*?)```', re.DOTALL)
+WORD_RE = re.compile(r'\w+')
+# Repeticiones de una sílaba corta: "jajajaja" -> "ja", "siiii" -> "si"
+REPEAT_RE = re.compile(r'(\w{1,3}?)\1+')
+
+OMITTED_USER = "(…)"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estima la cantidad de tokens de un texto."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def parse_steps(spec: str) -> Tuple[str, ...]:
+    """
+    Interpreta la lista de pasos de compactación ("shorten,dedupe,...").
+
+    Args:
+        spec (str): Pasos separados por comas (vacío desactiva la compactación).
+
+    Returns:
+        Tuple[str, ...]: Los pasos, en el orden de aplicación.
+
+    Raises:
+        ValueError: Si algún paso no existe.
+    """
+    requested = {step.strip().lower() for step in spec.split(",") if step.strip()}
+    unknown = requested - set(STEPS)
+    if unknown:
+        raise ValueError(f"Pasos de compactación desconocidos: {', '.join(sorted(unknown))}")
+    return tuple(step for step in STEPS if step in requested)
+
+
+def signature(text: str) -> str:
+    """
+    Forma normalizada de un texto para detectar mensajes repetidos.
+
+    Ignora mayúsculas, tildes, puntuación, emojis y letras o sílabas estiradas,
+    así "JAJAJAJA!!", "jajaja" y "Jaja 😂" tienen la misma firma.
+    """
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    normalized = REPEAT_RE.sub(r'\1', " ".join(WORD_RE.findall(folded)))
+    # Mensajes sin palabras (solo emojis o símbolos) se comparan tal cual
+    return normalized or text.strip()
+
+
+@dataclass
+class _Entry:
+    user: str
+    text: str
+    timestamp: Any = None
+    count: int = 1
+    others: List[str] = field(default_factory=list)
+
+    def render(self) -> str:
+        if self.count == 1:
+            return self.text
+        if self.others:
+            return f"{self.text} [x{self.count}, también {', '.join(self.others)}]"
+        return f"{self.text} [x{self.count}]"
+
+
+@dataclass
+class CompactionResult:
+    """Mensajes compactados y cuánto se redujo el texto."""
+    messages: List[Dict[str, Any]]
+    original_messages: int
+    original_chars: int
+    compacted_chars: int
+
+    @property
+    def ratio(self) -> float:
+        """Caracteres compactados sobre originales (1.0 = sin reducción)."""
+        return self.compacted_chars / self.original_chars if self.original_chars else 1.0
+
+
+def _chars(messages: Iterable[Dict[str, Any]]) -> int:
+    # Mismo formato que el prompt: "usuario: texto\n"
+    return sum(len(m['user']) + len(m['text']) + 3 for m in messages)
+
+
+class PromptCompactor:
+    """
+    Reduce los mensajes de una ventana antes de armar el prompt.
+
+    Los pasos se aplican siempre en el mismo orden:
+
+    - shorten: los enlaces se reemplazan por su dominio y los bloques de
+      código largos por una línea que los describe.
+    - dedupe: mensajes iguales o casi iguales (misma firma normalizada, o
+      parecidos por encima de `near_duplicate_ratio` a uno reciente) se
+      guardan una sola vez con la cantidad de repeticiones y quiénes los
+      repitieron.
+    - collapse: mensajes consecutivos del mismo usuario se unen en uno.
+    - budget: si el resultado supera `token_budget` tokens, se conservan los
+      mensajes más recientes y con más contenido, en orden cronológico, y se
+      marca cuántos se omitieron en cada hueco.
+    """
+
+    def __init__(
+        self,
+        steps: Iterable[str] = STEPS,
+        token_budget: int = 0,
+        near_duplicate_ratio: float = 0.9,
+        max_code_chars: int = 200,
+        lookback: int = 8,
+    ):
+        """
+        Args:
+            steps (Iterable[str]): Pasos habilitados (ver STEPS).
+            token_budget (int): Tokens máximos de los mensajes (0 sin límite).
+            near_duplicate_ratio (float): Similitud mínima para considerar dos mensajes
+                casi iguales (1 solo detecta repeticiones exactas de la firma).
+            max_code_chars (int): Bloques de código más largos que esto se abrevian.
+            lookback (int): Mensajes recientes contra los que se buscan casi duplicados.
+        """
+        self.steps = tuple(step for step in STEPS if step in set(steps))
+        self.token_budget = token_budget
+        self.near_duplicate_ratio = near_duplicate_ratio
+        self.max_code_chars = max_code_chars
+        self.lookback = lookback
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifica la configuración (cambia el prompt, así que invalida la caché)."""
+        return f"{','.join(self.steps)}|{self.token_budget}|{self.near_duplicate_ratio}|{self.max_code_chars}"
+
+    def compact(self, messages: List[Dict[str, Any]], budget: bool = True) -> CompactionResult:
+        """
+        Aplica los pasos habilitados a la ventana de mensajes.
+
+        Args:
+            messages (List[Dict[str, Any]]): Mensajes en orden cronológico.
+            budget (bool): Si es False se omite el recorte por presupuesto
+                (p. ej. en los bloques del resumen jerárquico).
+
+        Returns:
+            CompactionResult: Los mensajes resultantes ('user', 'text', 'timestamp') y la reducción.
+        """
+        entries = [_Entry(m['user'], m['text'], m.get('timestamp')) for m in messages]
+        if "shorten" in self.steps:
+            for entry in entries:
+                entry.text = self.shorten(entry.text)
+        if "dedupe" in self.steps:
+            entries = self._dedupe(entries)
+        rendered = [{'user': e.user, 'text': e.render(), 'timestamp': e.timestamp} for e in entries]
+        if "collapse" in self.steps:
+            rendered = self._collapse(rendered)
+        if budget and "budget" in self.steps and self.token_budget > 0:
+            rendered = self._fit_budget(rendered, [e.count for e in entries] if "collapse" not in self.steps else None)
+        return CompactionResult(rendered, len(messages), _chars(messages), _chars(rendered))
+
+    def shorten(self, text: str) -> str:
+        """Reemplaza enlaces por su dominio y abrevia los bloques de código largos."""
+        text = URL_RE.sub(self._shorten_url, text)
+        return CODE_BLOCK_RE.sub(self._shorten_code, text)
+
+    @staticmethod
+    def _shorten_url(match: re.Match) -> str:
+        url = match.group(0)
+        host = re.sub(r'^(?:https?://)?(?:www\.)?', '', url, flags=re.IGNORECASE).split('/', 1)[0]
+        host = host.split('?', 1)[0].split('#', 1)[0]
+        return f"[enlace {host}]"
+
+    def _shorten_code(self, match: re.Match) -> str:
+        code = match.group(1).strip()
+        if len(match.group(0)) <= self.max_code_chars:
+            return match.group(0)
+        lines = code.count("\n") + 1
+        first = code.split("\n", 1)[0][:60]
+        return f"[código de {lines} líneas: {first}…]"
+
+    def _dedupe(self, entries: List[_Entry]) -> List[_Entry]:
+        kept: List[_Entry] = []
+        by_signature: Dict[str, _Entry] = {}
+        recent: List[Tuple[str, _Entry]] = []
+        for entry in entries:
+            sig = signature(entry.text)
+            original = by_signature.get(sig)
+            if original is None and self.near_duplicate_ratio < 1:
+                original = self._near_duplicate(sig, recent)
+            if original is not None:
+                original.count += 1
+                if entry.user != original.user and entry.user not in original.others:
+                    original.others.append(entry.user)
+                continue
+            by_signature[sig] = entry
+            kept.append(entry)
+            recent.append((sig, entry))
+            if len(recent) > self.lookback:
+                recent.pop(0)
+        return kept
+
+    def _near_duplicate(self, sig: str, recent: List[Tuple[str, _Entry]]) -> Optional[_Entry]:
+        # Textos muy cortos con firma distinta son mensajes distintos ("si" / "no")
+        if len(sig) < 12:
+            return None
+        for other_sig, entry in reversed(recent):
+            if abs(len(other_sig) - len(sig)) > len(sig) * (1 - self.near_duplicate_ratio) + 1:
+                continue
+            matcher = SequenceMatcher(None, sig, other_sig, autojunk=False)
+            if matcher.quick_ratio() >= self.near_duplicate_ratio and matcher.ratio() >= self.near_duplicate_ratio:
+                return entry
+        return None
+
+    @staticmethod
+    def _collapse(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        collapsed: List[Dict[str, Any]] = []
+        for message in messages:
+            if collapsed and collapsed[-1]['user'] == message['user']:
+                last = collapsed[-1]
+                last['text'] = f"{last['text']} / {message['text']}"
+                last['timestamp'] = message['timestamp']
+            else:
+                collapsed.append(dict(message))
+        return collapsed
+
+    def _fit_budget(self, messages: List[Dict[str, Any]], counts: Optional[List[int]]) -> List[Dict[str, Any]]:
+        costs = [estimate_tokens(f"{m['user']}: {m['text']}") for m in messages]
+        if sum(costs) <= self.token_budget:
+            return messages
+
+        total = len(messages)
+
+        def score(index: int) -> float:
+            text = messages[index]['text']
+            words = len(WORD_RE.findall(text))
+            value = (index + 1) / total  # los recientes pesan más
+            value += min(words, 40) / 40  # y los que tienen contenido
+            if '?' in text:
+                value += 0.3
+            if words <= 2:
+                value -= 0.3
+            if counts is not None and counts[index] > 1:
+                value += 0.2 * min(counts[index] - 1, 5) / 5
+            return value
+
+        # El último mensaje siempre entra, aunque haya que cortarlo
+        last = total - 1
+        selected = {last}
+        # Cada hueco agrega una línea "(…): N mensajes omitidos"
+        marker_cost = estimate_tokens(f"{OMITTED_USER}: 9999 mensajes omitidos")
+        used = costs[last] + marker_cost
+        for index in sorted(range(last), key=score, reverse=True):
+            if used + costs[index] + marker_cost <= self.token_budget:
+                selected.add(index)
+                used += costs[index] + marker_cost
+
+        result: List[Dict[str, Any]] = []
+        omitted = 0
+        for index, message in enumerate(messages):
+            if index not in selected:
+                omitted += 1
+                continue
+            if omitted:
+                result.append({'user': OMITTED_USER, 'text': f"{omitted} mensajes omitidos", 'timestamp': None})
+                omitted = 0
+            result.append(message)
+
+        if costs[last] + marker_cost > self.token_budget:
+            tail = result[-1]
+            max_chars = max(0, (self.token_budget - marker_cost) * CHARS_PER_TOKEN - len(tail['user']) - 2)
+            result[-1] = dict(tail, text=tail['text'][:max_chars] + "…")
+        return result
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..handlers.cinico_handler import CinicoHandler
+from .llm_scheduler import SchedulerBusy
+from .message_store import MessageStore
+from .summarizer import HierarchicalSummarizer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RollingState:
+    """Resumen acumulado de un chat y hasta qué mensaje cubre."""
+    summary: Optional[str] = None
+    covered_seq: int = 0
+    task: Optional[asyncio.Task] = None
+    idle_timer: Optional[asyncio.TimerHandle] = None
+
+
+class RollingSummarizer:
+    """
+    Mantiene un resumen por chat actualizado en segundo plano.
+
+    Cada `every_messages` mensajes nuevos, o tras `idle_seconds` sin mensajes,
+    los mensajes nuevos se pliegan sobre el resumen anterior con una llamada de
+    baja prioridad. Un /resumen posterior solo tiene que plegar el pequeño
+    delta desde el último pliegue (o nada, si no hubo mensajes nuevos).
+    """
+
+    def __init__(
+        self,
+        handler: CinicoHandler,
+        store: MessageStore,
+        interactive: HierarchicalSummarizer,
+        background: HierarchicalSummarizer,
+        every_messages: int = 50,
+        idle_seconds: float = 300.0,
+    ):
+        """
+        Args:
+            handler (CinicoHandler): Handler que construye los prompts.
+            store (MessageStore): Buffers de mensajes (con números de secuencia por chat).
+            interactive (HierarchicalSummarizer): Resumidor para los /resumen de usuarios.
+            background (HierarchicalSummarizer): Resumidor cuyas llamadas van por el
+                carril de baja prioridad del planificador.
+            every_messages (int): Mensajes nuevos que disparan un pliegue.
+            idle_seconds (float): Segundos de inactividad del grupo que disparan un pliegue
+                (0 lo desactiva).
+        """
+        self.handler = handler
+        self.store = store
+        self.interactive = interactive
+        self.background = background
+        self.every_messages = every_messages
+        self.idle_seconds = idle_seconds
+        self._states: Dict[int, RollingState] = {}
+        self.folds = 0
+        self.skipped = 0
+
+    def on_message(self, chat_id: int) -> None:
+        """Avisa que llegó un mensaje al chat; programa un pliegue si corresponde."""
+        state = self._states.get(chat_id)
+        if state is None:
+            state = self._states[chat_id] = RollingState()
+        if state.idle_timer is not None:
+            state.idle_timer.cancel()
+            state.idle_timer = None
+        if state.task is not None:
+            # El pliegue en curso vuelve a programar el siguiente al terminar
+            return
+        self._schedule(chat_id, state, fold_now=True)
+
+    def forget(self, chat_id: int) -> None:
+        """Descarta el estado de un chat (p. ej. cuando su buffer sale de memoria)."""
+        state = self._states.pop(chat_id, None)
+        if state is None:
+            return
+        if state.idle_timer is not None:
+            state.idle_timer.cancel()
+        if state.task is not None:
+            state.task.cancel()
+
+    async def close(self) -> None:
+        """Cancela los pliegues y temporizadores pendientes."""
+        tasks = [s.task for s in self._states.values() if s.task is not None]
+        for chat_id in list(self._states):
+            self.forget(chat_id)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def snapshot(self, chat_id: int) -> RollingState:
+        """Estado actual del chat (vacío si no hay resumen)."""
+        return self._states.get(chat_id) or RollingState()
+
+    async def summarize(self, chat_id: int, messages: List[Dict[str, Any]], seq: int,
+                        on_delta: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        """
+        Resumen interactivo de la ventana, partiendo del resumen acumulado si existe.
+
+        Args:
+            chat_id (int): ID del chat.
+            messages (List[Dict[str, Any]]): Ventana completa de mensajes.
+            seq (int): Número de secuencia del último mensaje de `messages`.
+            on_delta (Optional[Callable[[str], Awaitable[None]]]): Fragmentos en streaming.
+
+        Returns:
+            str: El resumen actualizado.
+        """
+        return await self._fold(chat_id, messages, seq, self.interactive, on_delta)
+
+    def _on_idle(self, chat_id: int) -> None:
+        state = self._states.get(chat_id)
+        if state is None:
+            return
+        state.idle_timer = None
+        if state.task is None and self.store.seq(chat_id) > state.covered_seq:
+            self._start_fold(chat_id, state)
+
+    def _schedule(self, chat_id: int, state: RollingState, fold_now: bool) -> None:
+        """Pliega ya si se juntaron `every_messages` mensajes; si no, arma el temporizador de inactividad."""
+        if fold_now and self.store.seq(chat_id) - state.covered_seq >= self.every_messages:
+            self._start_fold(chat_id, state)
+        elif self.idle_seconds > 0:
+            state.idle_timer = asyncio.get_running_loop().call_later(
+                self.idle_seconds, self._on_idle, chat_id
+            )
+
+    def _start_fold(self, chat_id: int, state: RollingState) -> None:
+        state.task = asyncio.create_task(self._background_fold(chat_id, state))
+
+    async def _background_fold(self, chat_id: int, state: RollingState) -> None:
+        folded = cancelled = False
+        try:
+            messages = self.store.get(chat_id)
+            seq = self.store.seq(chat_id)
+            if messages:
+                await self._fold(chat_id, messages, seq, self.background)
+            folded = True
+        except SchedulerBusy as e:
+            # Cola llena o desalojado por un pedido interactivo: se reintenta en el próximo disparo
+            self.skipped += 1
+            logger.debug(f"Pliegue del chat {chat_id} pospuesto: {e}")
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        except Exception as e:
+            self.skipped += 1
+            logger.warning(f"Error actualizando el resumen acumulado del chat {chat_id}: {e}")
+        finally:
+            if self._states.get(chat_id) is state:
+                state.task = None
+                # on_message no programa nada mientras hay un pliegue en curso: si llegaron
+                # mensajes entretanto, se pliegan ahora o tras la inactividad. Tras un fallo
+                # solo el temporizador, para no reintentar en seguida.
+                if not cancelled and state.idle_timer is None and self.store.seq(chat_id) > state.covered_seq:
+                    self._schedule(chat_id, state, fold_now=folded)
+
+    async def _fold(self, chat_id: int, messages: List[Dict[str, Any]], seq: int,
+                    summarizer: HierarchicalSummarizer,
+                    on_delta: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        state = self._states.get(chat_id)
+        if state is None:
+            state = self._states[chat_id] = RollingState()
+
+        pending = seq - state.covered_seq
+        if state.summary is not None and pending <= 0:
+            return state.summary
+
+        if state.summary is not None and pending < len(messages):
+            # Solo el delta: resumen previo + mensajes posteriores
+            prompt = self.handler.get_fold_prompt(state.summary, messages[-pending:], messages, chat_id)
+            summary = await summarizer.complete_prompt(prompt, chat_id, on_delta)
+        else:
+            # Sin resumen previo (o el delta ya no está en el buffer): ventana completa
+            summary = await summarizer.summarize(messages, chat_id, on_delta)
+
+        # Otro pliegue pudo terminar antes cubriendo más mensajes
+        if seq > state.covered_seq or state.summary is None:
+            state.summary = summary
+            state.covered_seq = seq
+            self.folds += 1
+        return summary
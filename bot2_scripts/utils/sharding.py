@@ -0,0 +1,257 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from telegram import Bot
+from telegram.error import NetworkError, TelegramError
+
+from .llm_scheduler import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# (shard, id de la petición, endpoint, parámetros)
+RelayRequest = Tuple[int, Tuple[int, int], str, Dict[str, Any]]
+# (id de la petición, éxito, resultado o excepción)
+RelayReply = Tuple[Tuple[int, int], bool, Any]
+
+
+def shard_for(chat_id: int, shards: int) -> int:
+    """
+    Shard estable de un chat: el mismo chat_id va siempre al mismo worker
+    (entre reinicios y entre plataformas, a diferencia de hash()).
+    """
+    if shards <= 1:
+        return 0
+    return zlib.crc32(str(chat_id).encode()) % shards
+
+
+def shard_path(path: str, index: int) -> str:
+    """Ruta propia de un shard: bot_messages.db -> bot_messages.shard2.db."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{index}{ext}"
+
+
+class RemoteBot(Bot):
+    """
+    Bot de un proceso worker: en lugar de llamar a la API de Telegram, cada
+    petición se envía al proceso frontal, que la ejecuta con el límite global
+    de tasa y devuelve el resultado (o la excepción de Telegram original).
+    """
+
+    def __init__(self, token: str, shard: int, outbox, replies):
+        """
+        Args:
+            token (str): Token del bot (solo para construir el Bot base).
+            shard (int): Índice de este worker.
+            outbox (multiprocessing.Queue): Cola compartida hacia el relay del frontal.
+            replies (multiprocessing.Queue): Cola de respuestas propia de este worker.
+        """
+        super().__init__(token)
+        self._shard = shard
+        self._outbox = outbox
+        self._replies = replies
+        self._ids = itertools.count()
+        self._pending: Dict[Tuple[int, int], asyncio.Future] = {}
+        self._reader: Optional[asyncio.Task] = None
+
+    async def _do_post(self, endpoint: str, data: Dict[str, Any], **kwargs) -> Any:
+        if self._reader is None:
+            self._reader = asyncio.create_task(self._read_replies())
+        # Los parámetros (incluidos objetos de Telegram) viajan serializados con pickle;
+        # el frontal los convierte a JSON al hacer la petición real
+        params = dict(data)
+        # El pid evita confundir respuestas dirigidas a un worker anterior del mismo shard
+        request_id = (os.getpid(), next(self._ids))
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._outbox.put((self._shard, request_id, endpoint, params))
+        try:
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _read_replies(self) -> None:
+        while True:
+            reply: Optional[RelayReply] = await asyncio.to_thread(self._replies.get)
+            if reply is None:
+                return
+            request_id, ok, value = reply
+            future = self._pending.get(request_id)
+            if future is None or future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    async def close_relay(self) -> None:
+        """Detiene el lector de respuestas."""
+        if self._reader is not None:
+            self._replies.put(None)
+            await self._reader
+            self._reader = None
+
+
+class TelegramRelay:
+    """
+    Emisor compartido del proceso frontal: ejecuta las peticiones de todos los
+    workers con el bot real, respetando un límite global de peticiones por segundo.
+    """
+
+    def __init__(self, bot: Bot, outbox, replies: List, rate: float = 30.0):
+        """
+        Args:
+            bot (Bot): Bot real (el de la aplicación del frontal).
+            outbox (multiprocessing.Queue): Cola compartida con las peticiones de los workers.
+            replies (List[multiprocessing.Queue]): Cola de respuestas de cada shard.
+            rate (float): Peticiones por segundo hacia Telegram (0 sin límite).
+        """
+        self.bot = bot
+        self.outbox = outbox
+        self.replies = replies
+        self.bucket = TokenBucket(rate, max(1.0, rate))
+        self.relayed = 0
+        self.failed = 0
+        self._reader: Optional[asyncio.Task] = None
+        self._tasks = set()
+
+    def start(self) -> None:
+        self._reader = asyncio.create_task(self._read_requests())
+
+    async def _read_requests(self) -> None:
+        while True:
+            request: Optional[RelayRequest] = await asyncio.to_thread(self.outbox.get)
+            if request is None:
+                return
+            task = asyncio.create_task(self._execute(request))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, request: RelayRequest) -> None:
+        shard, request_id, endpoint, params = request
+        await self.bucket.acquire()
+        try:
+            result = await self.bot._do_post(endpoint, params)
+            reply: RelayReply = (request_id, True, result)
+            self.relayed += 1
+        except TelegramError as e:
+            self.failed += 1
+            reply = (request_id, False, e)
+        except Exception as e:
+            self.failed += 1
+            reply = (request_id, False, NetworkError(f"{type(e).__name__}: {e}"))
+        self.replies[shard].put(reply)
+
+    async def stop(self) -> None:
+        """Deja de leer peticiones y espera a las que están en curso."""
+        if self._reader is not None:
+            self.outbox.put(None)
+            await self._reader
+            self._reader = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+class ShardSupervisor:
+    """
+    Lanza y vigila N procesos worker, cada uno dueño de los chats de su shard.
+
+    Cada worker tiene su cola de entrada (updates serializados) y su cola de
+    respuestas del relay. Si un worker muere se relanza sin tocar a los demás
+    shards; sus colas se recrean porque un proceso que muere dentro de get()
+    deja tomado el lock de lectura, así que se pierden los updates que tenía
+    pendientes (no la historia, que está en su SQLite).
+    """
+
+    def __init__(self, target: Callable, shards: int, check_interval: float = 1.0):
+        """
+        Args:
+            target (Callable): Función del worker: target(shard, inbox, outbox, replies).
+                Debe ser importable a nivel de módulo (se usa el método "spawn").
+            shards (int): Cantidad de workers.
+            check_interval (float): Segundos entre comprobaciones de salud.
+        """
+        self.target = target
+        self.shards = shards
+        self.check_interval = check_interval
+        self._ctx = multiprocessing.get_context("spawn")
+        self.inboxes = [self._ctx.Queue() for _ in range(shards)]
+        self.replies = [self._ctx.Queue() for _ in range(shards)]
+        self.outbox = self._ctx.Queue()
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * shards
+        self.restarts = [0] * shards
+        self.routed = [0] * shards
+        self._monitor: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def _spawn(self, index: int) -> None:
+        process = self._ctx.Process(
+            target=self.target,
+            args=(index, self.inboxes[index], self.outbox, self.replies[index]),
+            name=f"shard-{index}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info(f"Worker del shard {index} iniciado (pid {process.pid})")
+
+    def start(self) -> None:
+        """Lanza todos los workers y la vigilancia de procesos."""
+        for index in range(self.shards):
+            self._spawn(index)
+        self._monitor = asyncio.create_task(self._watch())
+
+    def route(self, chat_id: int, payload: Any) -> int:
+        """Encola el update para el worker dueño del chat. Devuelve el shard."""
+        index = shard_for(chat_id, self.shards)
+        self.inboxes[index].put(payload)
+        self.routed[index] += 1
+        return index
+
+    async def _watch(self) -> None:
+        while not self._stopping:
+            await asyncio.sleep(self.check_interval)
+            for index, process in enumerate(self.processes):
+                if self._stopping or process is None or process.is_alive():
+                    continue
+                logger.error(f"El worker del shard {index} terminó (código {process.exitcode}); relanzando")
+                self.restarts[index] += 1
+                # Reemplazo en el lugar: el relay comparte la lista de colas de respuesta
+                self.inboxes[index] = self._ctx.Queue()
+                self.replies[index] = self._ctx.Queue()
+                self._spawn(index)
+
+    async def stop(self, timeout: float = 15.0) -> None:
+        """
+        Pide a cada worker que termine lo que tiene encolado y espera a que salga;
+        los que no terminan a tiempo se matan.
+        """
+        self._stopping = True
+        if self._monitor is not None:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for index, process in enumerate(self.processes):
+            if process is None:
+                continue
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                logger.warning(f"El worker del shard {index} no terminó a tiempo; forzando salida")
+                process.terminate()
+                await asyncio.to_thread(process.join, 5)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'shards': self.shards,
+            'alive': sum(1 for p in self.processes if p is not None and p.is_alive()),
+            'restarts': sum(self.restarts),
+            'routed': sum(self.routed),
+        }
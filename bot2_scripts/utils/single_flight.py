@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalescencia de peticiones concurrentes por clave.
+
+    Mientras hay una ejecución en curso para una clave, las llamadas
+    posteriores con la misma clave esperan ese mismo resultado en lugar de
+    lanzar otra ejecución.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Indica si hay una ejecución en curso para la clave."""
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Ejecuta `fn` una sola vez por clave entre llamadas concurrentes.
+
+        Args:
+            key (Hashable): Clave de coalescencia (p. ej. el chat_id).
+            fn (Callable[[], Awaitable[T]]): Corrutina a ejecutar si no hay una en curso.
+
+        Returns:
+            T: El resultado de la ejecución (compartido por todos los que esperaban).
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield: si un solicitante se cancela, no cancela a los demás
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.executed += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # marcar como recuperada si nadie más esperaba
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Devuelve cuántas ejecuciones hubo y cuántas peticiones se coalescieron."""
+        return {'in_flight': len(self._inflight), 'executed': self.executed, 'coalesced': self.coalesced}
+
+
+class Cooldown:
+    """Período de espera por clave tras una ejecución."""
+
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            seconds (float): Duración del período de espera (0 lo desactiva).
+            clock (Callable[[], float]): Reloj monotónico (inyectable para pruebas).
+        """
+        self.seconds = seconds
+        self._clock = clock
+        self._last: Dict[Hashable, float] = {}
+        self.rejected = 0
+
+    def mark(self, key: Hashable) -> None:
+        """Registra que la clave acaba de ejecutarse."""
+        if self.seconds > 0:
+            self._last[key] = self._clock()
+
+    def remaining(self, key: Hashable) -> float:
+        """Segundos que faltan para que la clave salga del período de espera (0 si ya salió)."""
+        last = self._last.get(key)
+        if last is None:
+            return 0.0
+        remaining = self.seconds - (self._clock() - last)
+        if remaining <= 0:
+            del self._last[key]
+            return 0.0
+        return remaining
@@ -0,0 +1,71 @@
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+STARTUP_SECONDS = REGISTRY.gauge(
+    "bot_startup_seconds", "Segundos desde el inicio del proceso hasta el fin de cada fase del arranque",
+    labels=("phase",)
+)
+
+
+class StartupTimer:
+    """
+    Mide cuánto tarda cada fase del arranque hasta poder recibir updates.
+
+    Las fases se marcan en orden con `mark`; `finish` marca el final y, si se
+    pidió (--profile-startup), imprime la tabla de tiempos. Los valores quedan
+    además en la métrica bot_startup_seconds.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.report = False
+        self.phases: List[Tuple[str, float]] = []
+        self.finished = False
+
+    def start(self, origin: Optional[float] = None, report: bool = False) -> None:
+        """
+        Args:
+            origin (Optional[float]): perf_counter() del inicio del proceso (por defecto, ahora).
+            report (bool): Imprimir la tabla de tiempos al terminar.
+        """
+        self.origin = time.perf_counter() if origin is None else origin
+        self.report = report
+        self.phases = []
+        self.finished = False
+
+    def mark(self, phase: str) -> None:
+        """Registra el fin de una fase."""
+        if self.finished:
+            return
+        elapsed = time.perf_counter() - self.origin
+        self.phases.append((phase, elapsed))
+        STARTUP_SECONDS.set(elapsed, phase=phase)
+
+    def finish(self, phase: str = "listo") -> None:
+        """Marca el fin del arranque (solo la primera vez) e informa los tiempos."""
+        if self.finished:
+            return
+        self.mark(phase)
+        self.finished = True
+        total = self.phases[-1][1]
+        logger.info(f"Arranque completo en {total * 1000:.0f} ms")
+        if self.report:
+            print(self.format())
+
+    def format(self) -> str:
+        """Tabla de fases con la duración de cada una y el acumulado."""
+        lines = ["⏱️ Tiempos de arranque:"]
+        previous = 0.0
+        for phase, elapsed in self.phases:
+            lines.append(f"   {phase:<28} {(elapsed - previous) * 1000:8.1f} ms  (total {elapsed * 1000:8.1f} ms)")
+            previous = elapsed
+        return "\n".join(lines)
+
+
+# Temporizador del proceso: bot.py fija el origen antes de importar el resto
+STARTUP = StartupTimer()
@@ -0,0 +1,259 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SENTINEL = None
+
+
+class StorageBackend:
+    """
+    Interfaz de persistencia para los buffers de mensajes.
+
+    Las implementaciones deben hacer que append() sea barato y no bloqueante,
+    porque se llama desde el event loop por cada mensaje recibido.
+    """
+
+    def append(self, chat_id: int, message: Dict[str, Any]) -> None:
+        """Encola un mensaje para persistirlo."""
+        raise NotImplementedError
+
+    def load_recent(self, chat_id: int, limit: int) -> List[Dict[str, Any]]:
+        """Devuelve los últimos `limit` mensajes del chat, del más antiguo al más reciente."""
+        raise NotImplementedError
+
+    def write_many(self, chat_id: int, messages: List[Dict[str, Any]]) -> int:
+        """
+        Guarda un lote de mensajes de forma síncrona (importaciones masivas).
+
+        Los mensajes con un message_id ya guardado en el chat se ignoran.
+
+        Returns:
+            int: Mensajes efectivamente agregados.
+        """
+        for message in messages:
+            self.append(chat_id, message)
+        return len(messages)
+
+    def flush(self) -> None:
+        """Espera a que todas las escrituras pendientes estén en disco."""
+
+    def close(self) -> None:
+        """Vacía las escrituras pendientes y libera los recursos."""
+
+
+class MemoryBackend(StorageBackend):
+    """Backend sin persistencia: la historia vive solo en memoria."""
+
+    def append(self, chat_id: int, message: Dict[str, Any]) -> None:
+        pass
+
+    def load_recent(self, chat_id: int, limit: int) -> List[Dict[str, Any]]:
+        return []
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Backend SQLite en modo WAL con escrituras agrupadas.
+
+    append() solo deja el mensaje en una cola; un hilo escritor las agrupa en
+    lotes (hasta `batch_size` filas o `flush_interval` segundos) y las confirma
+    en una sola transacción, fuera del event loop. load_recent() incluye los
+    mensajes encolados que todavía no se confirmaron.
+    """
+
+    def __init__(self, path: str, batch_size: int = 200, flush_interval: float = 0.5):
+        """
+        Inicializa el backend y arranca el hilo escritor.
+
+        Args:
+            path (str): Ruta del archivo de la base de datos.
+            batch_size (int): Máximo de filas por transacción.
+            flush_interval (float): Segundos máximos que espera un lote en formarse.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batches_written = 0
+        self.rows_written = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._read_conn = self._connect()
+        self._create_schema(self._read_conn)
+        self._bulk_conn: Optional[sqlite3.Connection] = None
+        # Mensajes encolados y aún no confirmados, por chat y en orden de llegada
+        self._pending: Dict[int, Deque[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        # Una lectura ve cada lote o en la base o entre los pendientes, nunca en ambos
+        self._commit_lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[Tuple[int, Dict[str, Any]]]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, name="sqlite-writer", daemon=True)
+        self._writer.start()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection) -> None:
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                message_id INTEGER,
+                user TEXT NOT NULL,
+                text TEXT NOT NULL,
+                ts REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_chat ON messages (chat_id, id);
+            CREATE INDEX IF NOT EXISTS idx_messages_chat_ts ON messages (chat_id, ts, id);
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_chat_msg
+                ON messages (chat_id, message_id) WHERE message_id IS NOT NULL;
+        """)
+
+    @staticmethod
+    def _to_row(chat_id: int, message: Dict[str, Any]) -> Tuple[int, Optional[int], str, str, float]:
+        timestamp = message.get('timestamp') or datetime.now()
+        return (chat_id, message.get('message_id'), message['user'], message['text'], timestamp.timestamp())
+
+    def append(self, chat_id: int, message: Dict[str, Any]) -> None:
+        if self._closed:
+            raise RuntimeError("El backend SQLite ya está cerrado.")
+        with self._lock:
+            self._pending.setdefault(chat_id, deque()).append(message)
+        self._queue.put((chat_id, message))
+
+    def load_recent(self, chat_id: int, limit: int) -> List[Dict[str, Any]]:
+        # La conexión de lectura puede usarse desde varios hilos (asyncio.to_thread)
+        with self._commit_lock:
+            rows = self._read_conn.execute(
+                # Por fecha y no por orden de inserción: la historia importada puede llegar después
+                "SELECT message_id, user, text, ts FROM messages WHERE chat_id = ? ORDER BY ts DESC, id DESC LIMIT ?",
+                (chat_id, limit),
+            ).fetchall()
+            with self._lock:
+                pending = list(self._pending.get(chat_id, ()))
+        messages = [
+            {'user': user, 'text': text, 'timestamp': datetime.fromtimestamp(ts), 'message_id': message_id}
+            for message_id, user, text, ts in reversed(rows)
+        ]
+        if not pending:
+            return messages
+        # Sumar lo que el escritor todavía no confirmó (un chat descartado y recargado
+        # enseguida perdería sus últimos mensajes)
+        stored = {m['message_id'] for m in messages if m['message_id'] is not None}
+        merged = messages + [m for m in pending if m.get('message_id') is None or m['message_id'] not in stored]
+        merged.sort(key=lambda m: self._to_row(chat_id, m)[4])
+        return merged[-limit:]
+
+    def write_many(self, chat_id: int, messages: List[Dict[str, Any]]) -> int:
+        if self._closed:
+            raise RuntimeError("El backend SQLite ya está cerrado.")
+        if self._bulk_conn is None:
+            self._bulk_conn = self._connect()
+        conn = self._bulk_conn
+        before = conn.total_changes
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO messages (chat_id, message_id, user, text, ts) VALUES (?, ?, ?, ?, ?)",
+                [self._to_row(chat_id, message) for message in messages],
+            )
+        inserted = conn.total_changes - before
+        self.batches_written += 1
+        self.rows_written += inserted
+        return inserted
+
+    def _writer_loop(self) -> None:
+        conn = self._connect()
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _SENTINEL:
+                self._queue.task_done()
+                break
+            batch = [item]
+            # Agrupar lo que llegue hasta completar el lote o agotar el intervalo, contado
+            # desde el primer mensaje: con tráfico constante el lote igual se confirma a tiempo
+            deadline = time.monotonic() + self.flush_interval
+            try:
+                while len(batch) < self.batch_size:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    if item is _SENTINEL:
+                        stop = True
+                        break
+                    batch.append(item)
+            except queue.Empty:
+                pass
+
+            with self._commit_lock:
+                try:
+                    # Una sola transacción (y un solo fsync) por lote
+                    before = conn.total_changes
+                    with conn:
+                        conn.executemany(
+                            "INSERT OR IGNORE INTO messages (chat_id, message_id, user, text, ts) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            [self._to_row(chat_id, message) for chat_id, message in batch],
+                        )
+                    self.batches_written += 1
+                    # Sin contar los que INSERT OR IGNORE descartó por repetidos
+                    self.rows_written += conn.total_changes - before
+                except Exception as e:
+                    logger.error(f"Error escribiendo lote de {len(batch)} mensajes en SQLite: {e}")
+                finally:
+                    with self._lock:
+                        for chat_id, _ in batch:
+                            pending = self._pending[chat_id]
+                            pending.popleft()
+                            if not pending:
+                                del self._pending[chat_id]
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+        conn.close()
+
+    def flush(self) -> None:
+        self._queue.join()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_SENTINEL)
+        self._writer.join()
+        self._read_conn.close()
+        if self._bulk_conn is not None:
+            self._bulk_conn.close()
+
+
+def create_storage_backend(kind: str, sqlite_path: str, batch_size: int = 200,
+                           flush_interval: float = 0.5) -> StorageBackend:
+    """
+    Crea el backend de almacenamiento indicado por configuración.
+
+    Args:
+        kind (str): "sqlite" o "memory".
+        sqlite_path (str): Ruta del archivo para el backend SQLite.
+        batch_size (int): Tamaño máximo de lote de escritura.
+        flush_interval (float): Espera máxima para formar un lote, en segundos.
+
+    Returns:
+        StorageBackend: El backend configurado.
+    """
+    kind = (kind or "sqlite").lower()
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(sqlite_path, batch_size=batch_size, flush_interval=flush_interval)
+    raise ValueError(f"Backend de almacenamiento desconocido: {kind}")
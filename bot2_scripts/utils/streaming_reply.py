@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+def split_point(text: str, limit: int) -> int:
+    """
+    Elige dónde cortar un texto largo: el último salto de línea o espacio antes del límite.
+
+    Args:
+        text (str): Texto a cortar.
+        limit (int): Largo máximo del primer trozo.
+
+    Returns:
+        int: Índice de corte (el primer trozo es text[:índice]).
+    """
+    if len(text) <= limit:
+        return len(text)
+    for separator in ("\n", " "):
+        index = text.rfind(separator, 0, limit)
+        if index > limit // 2:
+            return index + 1
+    return limit
+
+
+class ProgressiveReply:
+    """
+    Respuesta que se va editando a medida que llega el texto de un stream.
+
+    El mensaje se crea con el primer fragmento. Las ediciones se agrupan para
+    no editar más de una vez cada `min_interval` segundos (límite de Telegram),
+    y al llegar a `max_length` el mensaje se cierra y se continúa en uno nuevo.
+    """
+
+    def __init__(self, message: Any, max_length: int, min_interval: float = 1.5,
+                 clock: Callable[[], float] = time.monotonic,
+                 send: Optional[Callable[[str], Awaitable[Any]]] = None,
+                 edit: Optional[Callable[[Any, str], Awaitable[Any]]] = None):
+        """
+        Args:
+            message (Any): Mensaje de Telegram al que se responde.
+            max_length (int): Largo máximo de cada mensaje enviado.
+            min_interval (float): Segundos mínimos entre ediciones.
+            clock (Callable[[], float]): Reloj monotónico (inyectable para pruebas).
+            send (Optional[Callable[[str], Awaitable[Any]]]): Envía cada mensaje nuevo
+                (por defecto message.reply_text).
+            edit (Optional[Callable[[Any, str], Awaitable[Any]]]): Edita un mensaje enviado
+                con el texto dado (por defecto su edit_text). Conviene que pase por los
+                mismos límites de envío que `send`: las ediciones también cuentan para Telegram.
+        """
+        self.message = message
+        self._send = send or message.reply_text
+        self._edit_message = edit or (lambda sent, text: sent.edit_text(text))
+        self.max_length = max_length
+        self.min_interval = min_interval
+        self._clock = clock
+        self._current: Optional[Any] = None
+        self._text = ""
+        self._shown = ""
+        self._next_edit_at = 0.0
+        self.sent: List[Any] = []
+        self.edits = 0
+
+    @property
+    def started(self) -> bool:
+        """Indica si ya se envió al menos un mensaje."""
+        return self._current is not None
+
+    async def feed(self, delta: str) -> None:
+        """
+        Agrega un fragmento de texto; edita el mensaje si corresponde.
+
+        Args:
+            delta (str): Texto nuevo del stream.
+        """
+        self._text += delta
+        await self._sync(force=False)
+
+    async def finish(self) -> None:
+        """Publica el texto pendiente (sin esperar el intervalo entre ediciones)."""
+        await self._sync(force=True)
+
+    async def _sync(self, force: bool) -> None:
+        while True:
+            if self._current is None:
+                self._text = self._text.lstrip()
+                if not self._text:
+                    return
+                head = self._text[:split_point(self._text, self.max_length)]
+                self._current = await self._send(head)
+                self.sent.append(self._current)
+                self._shown = head
+                self._next_edit_at = self._clock() + self.min_interval
+            if len(self._text) <= self.max_length:
+                break
+            # Cerrar el mensaje actual en el límite y continuar en uno nuevo
+            cut = split_point(self._text, self.max_length)
+            head, self._text = self._text[:cut], self._text[cut:]
+            await self._edit(head, force=True)
+            self._current = None
+
+        if self._text != self._shown:
+            await self._edit(self._text, force)
+
+    async def _edit(self, text: str, force: bool) -> None:
+        while text != self._shown and (force or self._clock() >= self._next_edit_at):
+            try:
+                await self._edit_message(self._current, text)
+                self._shown = text
+                self.edits += 1
+                self._next_edit_at = self._clock() + self.min_interval
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+                self._next_edit_at = self._clock() + float(retry_after)
+                logger.debug(f"Edición progresiva pospuesta {retry_after}s por control de flujo")
+                if not force:
+                    return  # el texto se publicará en una edición posterior
+                await asyncio.sleep(float(retry_after))
+            except BadRequest as e:
+                if "not modified" not in str(e).lower():
+                    raise
+                self._shown = text
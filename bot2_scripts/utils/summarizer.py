@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from ..handlers.cinico_handler import CinicoHandler
+from .prompt_compaction import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def chunk_by_tokens(items: List[T], max_tokens: int, render: Callable[[T], str]) -> List[List[T]]:
+    """
+    Agrupa elementos consecutivos en bloques que no superen el presupuesto de tokens.
+
+    Un elemento que por sí solo supera el presupuesto forma su propio bloque.
+
+    Args:
+        items (List[T]): Elementos en orden.
+        max_tokens (int): Presupuesto de tokens por bloque.
+        render (Callable[[T], str]): Cómo se verá cada elemento en el prompt.
+
+    Returns:
+        List[List[T]]: Bloques consecutivos, en el mismo orden.
+    """
+    chunks: List[List[T]] = []
+    current: List[T] = []
+    used = 0
+    for item in items:
+        tokens = estimate_tokens(render(item))
+        if current and used + tokens > max_tokens:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class HierarchicalSummarizer:
+    """
+    Resumen jerárquico (map-reduce) de ventanas largas de mensajes.
+
+    Si el prompt directo cabe en `prompt_char_limit`, se hace una sola pasada
+    con la personalidad del handler. Si no, los mensajes se dividen en bloques
+    de `chunk_tokens`, se resumen en paralelo (como mucho `max_concurrency` a
+    la vez), los resúmenes parciales se combinan por niveles hasta que caben
+    en un bloque, y la pasada final aplica la personalidad sobre ellos.
+    """
+
+    def __init__(
+        self,
+        handler: CinicoHandler,
+        complete: Callable[[str, Optional[int]], Awaitable[str]],
+        prompt_char_limit: int = 4000,
+        chunk_tokens: int = 1500,
+        max_concurrency: int = 4,
+        stream: Optional[Callable[[str, Optional[int], Callable[[str], Awaitable[None]]], Awaitable[str]]] = None,
+    ):
+        """
+        Args:
+            handler (CinicoHandler): Handler que construye los prompts.
+            complete (Callable[[str, Optional[int]], Awaitable[str]]): Llamada al LLM
+                (prompt, chat_id) -> texto.
+            prompt_char_limit (int): Longitud máxima del prompt para hacer una sola pasada.
+            chunk_tokens (int): Presupuesto de tokens de entrada por bloque.
+            max_concurrency (int): Máximo de llamadas parciales simultáneas.
+            stream (Optional[Callable]): Llamada al LLM en modo streaming
+                (prompt, chat_id, on_delta) -> texto completo; se usa en la pasada final.
+        """
+        self.handler = handler
+        self.complete = complete
+        self.prompt_char_limit = prompt_char_limit
+        self.chunk_tokens = chunk_tokens
+        self.max_concurrency = max_concurrency
+        self.stream = stream
+
+    async def summarize(self, messages: List[Dict[str, Any]], chat_id: Optional[int] = None,
+                        on_delta: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        """
+        Resume la ventana de mensajes con la personalidad del handler.
+
+        Args:
+            messages (List[Dict[str, Any]]): Mensajes a resumir, en orden.
+            chat_id (Optional[int]): ID del chat, para reutilizar sus métricas.
+            on_delta (Optional[Callable[[str], Awaitable[None]]]): Si se indica (y hay
+                llamada en streaming), recibe los fragmentos de la pasada final.
+
+        Returns:
+            str: El resumen final.
+        """
+        prompt = self.handler.get_prompt(messages, chat_id=chat_id)
+        if len(prompt) <= self.prompt_char_limit:
+            return await self._final_pass(prompt, chat_id, on_delta)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(prompt_text: str) -> str:
+            async with semaphore:
+                return await self.complete(prompt_text, chat_id)
+
+        # Map: un resumen neutral por bloque de mensajes
+        chunks = chunk_by_tokens(messages, self.chunk_tokens, lambda m: f"{m['user']}: {m['text']}")
+        partials = await asyncio.gather(*(bounded(self.handler.get_chunk_prompt(c)) for c in chunks))
+        level = 1
+        logger.info(f"Resumen jerárquico del chat {chat_id}: {len(messages)} mensajes en {len(chunks)} bloques")
+
+        # Reduce: combinar por niveles mientras no quepan en un bloque
+        while len(partials) > 1 and sum(estimate_tokens(p) for p in partials) > self.chunk_tokens:
+            groups = chunk_by_tokens(list(partials), self.chunk_tokens, lambda p: p)
+            if len(groups) == len(partials):
+                # Cada parcial ya llena un bloque: combinarlos de a pares para avanzar
+                groups = [list(partials[i:i + 2]) for i in range(0, len(partials), 2)]
+            partials = await asyncio.gather(*(bounded(self.handler.get_merge_prompt(g)) for g in groups))
+            level += 1
+            logger.debug(f"Nivel {level} del resumen del chat {chat_id}: {len(partials)} parciales")
+
+        # Pasada final con la personalidad del handler
+        final_prompt = self.handler.get_prompt_from_partials(list(partials), messages, chat_id)
+        return await self._final_pass(final_prompt, chat_id, on_delta)
+
+    async def complete_prompt(self, prompt: str, chat_id: Optional[int] = None,
+                              on_delta: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        """Ejecuta un prompt ya construido (en streaming si se pidió y está disponible)."""
+        return await self._final_pass(prompt, chat_id, on_delta)
+
+    async def _final_pass(self, prompt: str, chat_id: Optional[int],
+                          on_delta: Optional[Callable[[str], Awaitable[None]]]) -> str:
+        if on_delta is not None and self.stream is not None:
+            return await self.stream(prompt, chat_id, on_delta)
+        return await self.complete(prompt, chat_id)
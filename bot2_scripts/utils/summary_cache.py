@@ -0,0 +1,96 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+CacheKey = Tuple[int, str]
+
+
+class SummaryCache:
+    """
+    Caché de resúmenes direccionada por contenido.
+
+    La clave es el chat más un hash de la ventana de mensajes y de la versión
+    del handler/prompt: si nada cambió, el resumen guardado sigue siendo
+    válido. Las entradas expiran tras `ttl` segundos y, si se supera
+    `max_entries`, se descartan las menos usadas (LRU).
+    """
+
+    def __init__(self, ttl: float, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        """
+        Inicializa la caché.
+
+        Args:
+            ttl (float): Segundos de vida de cada entrada.
+            max_entries (int): Máximo de entradas guardadas.
+            clock (Callable[[], float]): Reloj monotónico (inyectable para pruebas).
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[CacheKey, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(chat_id: int, messages: List[Dict[str, Any]], version: str) -> CacheKey:
+        """
+        Calcula la clave de caché para una ventana de mensajes.
+
+        Args:
+            chat_id (int): ID del chat.
+            messages (List[Dict[str, Any]]): Mensajes que se resumirían.
+            version (str): Versión del handler y su prompt.
+
+        Returns:
+            CacheKey: Par (chat_id, hash hexadecimal).
+        """
+        digest = hashlib.sha256(version.encode('utf-8'))
+        for m in messages:
+            timestamp = m.get('timestamp')
+            digest.update(f"{m['user']}\x1f{m['text']}\x1f{timestamp.timestamp() if timestamp else ''}\x1e".encode('utf-8'))
+        return chat_id, digest.hexdigest()
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        """Devuelve el resumen guardado para la clave, o None si no hay o expiró."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, summary = entry
+        if self._clock() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return summary
+
+    def put(self, key: CacheKey, summary: str) -> None:
+        """Guarda un resumen, descartando las entradas menos usadas si hace falta."""
+        self._entries[key] = (self._clock() + self.ttl, summary)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Devuelve los contadores de la caché.
+
+        Returns:
+            Dict[str, int]: entradas, aciertos, fallos, descartes y expiraciones.
+        """
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Dict, Hashable, Optional, Tuple
+
+from telegram import MessageEntity
+from telegram.ext import BaseUpdateProcessor
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+UPDATE_WAIT_SECONDS = REGISTRY.histogram(
+    "bot_update_wait_seconds", "Espera de cada update hasta empezar a procesarse (turno del chat y cupo del carril)",
+    labels=("lane",)
+)
+
+INGEST = "ingesta"
+COMMAND = "comando"
+
+
+def update_lane(update: object) -> str:
+    """Carril de un update: los comandos van aparte de la captura de mensajes."""
+    message = getattr(update, "effective_message", None)
+    entities = getattr(message, "entities", None) or ()
+    if any(entity.type == MessageEntity.BOT_COMMAND and entity.offset == 0 for entity in entities):
+        return COMMAND
+    return INGEST
+
+
+def update_chat(update: object) -> Optional[int]:
+    chat = getattr(update, "effective_chat", None)
+    return chat.id if chat is not None else None
+
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Procesa updates en paralelo conservando el orden dentro de cada chat.
+
+    Cada chat tiene dos colas en serie, una para la captura de mensajes y otra
+    para los comandos, cada una con su propio límite de handlers en ejecución.
+    Un comando espera a que terminen los mensajes de su chat recibidos antes
+    que él (un /resumen ve todo lo anterior), pero los mensajes posteriores
+    no esperan al comando: un resumen lento no frena la captura de su chat ni
+    de los demás. Los updates sin chat no tienen orden que respetar.
+
+    El límite de la clase base (`max_pending`) cuenta también los updates que
+    esperan su turno en su chat; conviene que sea holgado para que un chat
+    saturado no ocupe todos los lugares.
+    """
+
+    def __init__(self, max_pending: int = 1024, ingest_concurrency: int = 64, command_concurrency: int = 16):
+        """
+        Args:
+            max_pending (int): Updates en proceso a la vez, incluidos los que esperan su turno.
+            ingest_concurrency (int): Handlers de captura de mensajes ejecutándose a la vez.
+            command_concurrency (int): Handlers de comandos ejecutándose a la vez.
+        """
+        super().__init__(max_pending)
+        self._limits = {INGEST: ingest_concurrency, COMMAND: command_concurrency}
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        # Último update encolado por (carril, chat): cada uno espera al anterior
+        self._tails: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+        self._running = {INGEST: 0, COMMAND: 0}
+        self._waiting = 0
+        self._processed = {INGEST: 0, COMMAND: 0}
+
+    async def initialize(self) -> None:
+        # Los semáforos se crean dentro del event loop que los usa
+        self._slots = {lane: asyncio.Semaphore(limit) for lane, limit in self._limits.items()}
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        if not self._slots:
+            await self.initialize()
+        lane = update_lane(update)
+        chat_id = update_chat(update)
+        arrived = time.monotonic()
+
+        previous = barrier = None
+        done: Optional[asyncio.Future] = None
+        if chat_id is not None:
+            key = (lane, chat_id)
+            previous = self._tails.get(key)
+            if lane == COMMAND:
+                # Los mensajes recibidos antes que el comando ya deben estar capturados
+                barrier = self._tails.get((INGEST, chat_id))
+            done = self._tails[key] = asyncio.get_running_loop().create_future()
+
+        started = False
+        self._waiting += 1
+        try:
+            for waiting_for in (previous, barrier):
+                if waiting_for is not None:
+                    # shield: si se cancela este update, el anterior sigue su curso
+                    await asyncio.shield(waiting_for)
+            async with self._slots[lane]:
+                self._waiting -= 1
+                started = True
+                UPDATE_WAIT_SECONDS.observe(time.monotonic() - arrived, lane=lane)
+                self._running[lane] += 1
+                try:
+                    await coroutine
+                finally:
+                    self._running[lane] -= 1
+                    self._processed[lane] += 1
+        finally:
+            if not started:
+                self._waiting -= 1
+                # Cancelado antes de empezar: evitar el aviso de corrutina nunca esperada
+                close = getattr(coroutine, "close", None)
+                if close is not None:
+                    close()
+            if done is not None:
+                done.set_result(None)
+                if self._tails.get(key) is done:
+                    del self._tails[key]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'running_ingest': self._running[INGEST],
+            'running_commands': self._running[COMMAND],
+            'waiting': self._waiting,
+            'ordered_chats': len({chat for _, chat in self._tails}),
+            'processed_ingest': self._processed[INGEST],
+            'processed_commands': self._processed[COMMAND],
+        }
@@ -0,0 +1,86 @@
+import hmac
+import json
+import logging
+from typing import Any
+
+from telegram import Update
+
+from .http_server import HTTPRequest, HTTPResponse, MiniHTTPServer
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+
+class WebhookServer:
+    """
+    Recepción de updates de Telegram por webhook.
+
+    Valida el secret token de cada POST, deserializa el Update y lo encola en
+    la Application (que lo procesa igual que con polling). Expone /healthz
+    (el proceso responde) y /readyz (la Application está lista y no se está
+    deteniendo) para el balanceador.
+    """
+
+    def __init__(self, application: Any, host: str, port: int, path: str, secret_token: str):
+        """
+        Args:
+            application (Any): Application de python-telegram-bot (usa `bot`, `update_queue` y `running`).
+            host (str): Interfaz donde escuchar.
+            port (int): Puerto local.
+            path (str): Ruta donde Telegram envía los updates.
+            secret_token (str): Valor esperado en la cabecera X-Telegram-Bot-Api-Secret-Token.
+        """
+        self.application = application
+        self.path = path
+        self.secret_token = secret_token
+        self.draining = False
+        self.received = 0
+        self.rejected = 0
+        self.server = MiniHTTPServer(host, port)
+        self.server.route("POST", path, self._handle_update)
+        self.server.route("GET", "/healthz", self._healthz)
+        self.server.route("GET", "/readyz", self._readyz)
+
+    @property
+    def port(self) -> int:
+        return self.server.port
+
+    async def start(self) -> None:
+        """Empieza a escuchar peticiones."""
+        await self.server.start()
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """
+        Deja de aceptar updates (readyz pasa a 503) y espera los que están en curso.
+
+        Args:
+            drain_timeout (float): Segundos máximos de espera.
+        """
+        self.draining = True
+        await self.server.stop(drain_timeout)
+
+    async def _handle_update(self, request: HTTPRequest) -> HTTPResponse:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret_token):
+            self.rejected += 1
+            logger.warning("Update rechazado: secret token inválido")
+            return HTTPResponse(403, b"forbidden")
+        if self.draining:
+            # Telegram reintentará el update, que atenderá otra réplica o este proceso al volver
+            return HTTPResponse(503, b"draining")
+        try:
+            update = Update.de_json(json.loads(request.body), self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Update con JSON inválido: {e}")
+            return HTTPResponse(400, b"invalid update")
+        self.received += 1
+        await self.application.update_queue.put(update)
+        return HTTPResponse(200, b"ok")
+
+    async def _healthz(self, request: HTTPRequest) -> HTTPResponse:
+        return HTTPResponse(200, b"ok")
+
+    async def _readyz(self, request: HTTPRequest) -> HTTPResponse:
+        if self.draining or not self.application.running:
+            return HTTPResponse(503, b"not ready")
+        return HTTPResponse(200, b"ready")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Prueba rápida del harness de benchmarks (generador, stub LLM y replayer)
+"""
+import asyncio
+import json
+
+from benchmarks.chat_generator import ChatGenerator
+from benchmarks.replay import percentile
+from benchmarks.run import BenchmarkConfig, main, run_benchmark
+from benchmarks.stub_llm import StubLLMServer
+
+
+def test_generator_is_reproducible():
+    first = [(m.chat_id, m.user, m.text) for m in ChatGenerator(chats=3, seed=7).messages(50)]
+    second = [(m.chat_id, m.user, m.text) for m in ChatGenerator(chats=3, seed=7).messages(50)]
+    assert first == second
+    assert len({chat_id for chat_id, _, _ in first}) == 3
+
+
+def test_percentile_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 99) == 0.0
+
+
+def test_small_run_reports_throughput_latency_and_errors():
+    config = BenchmarkConfig(chats=4, messages=400, rounds=2, latency=0.01, jitter=0.0, error_rate=0.5)
+    with StubLLMServer(config.latency, error_rate=config.error_rate, seed=3) as stub:
+        results = asyncio.run(run_benchmark(config, stub.url))
+        assert stub.requests == 8
+
+    assert results['ingest']['messages'] == 400
+    assert results['ingest']['messages_per_second'] > 0
+    assert results['summary_latency']['count'] == 8
+    assert results['summary_latency']['p99'] >= results['summary_latency']['p50'] > 0
+    assert results['outcomes']['summary']['ok'] + results['outcomes']['summary']['connection_error'] == 8
+    assert 0 < results['prompt_compaction']['mean_ratio'] <= 1
+    assert results['rss']['samples']
+
+
+def test_cli_writes_json(tmp_path):
+    output = tmp_path / "bench.json"
+    main(["--chats", "2", "--messages", "100", "--rounds", "1", "--latency", "0", "--jitter", "0",
+          "--output", str(output)])
+    results = json.loads(output.read_text(encoding="utf-8"))
+    assert results['config']['chats'] == 2
+    assert results['stub']['requests'] == 2
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Pruebas de las métricas incrementales del CinicoHandler
+"""
+from datetime import datetime, timedelta
+
+from bot2_scripts.handlers.cinico_handler import CinicoHandler, format_time_span
+from bot2_scripts.utils.message_store import MessageStore
+
+
+def _comparable(metrics):
+    # chaos_level tiene un componente aleatorio
+    return (metrics.total_messages, metrics.active_users, metrics.time_span,
+            metrics.dominant_topics, metrics.sentiment_score, metrics.repetition_rate)
+
+
+def test_incremental_metrics_match_full_recomputation():
+    handler = CinicoHandler("{joined}", [])
+    store = MessageStore(4, 10 ** 6, on_append=handler.track_message,
+                         on_evict=handler.untrack_message, on_drop=handler.forget_chat)
+    start = datetime(2024, 1, 1, 12, 0)
+    texts = ["no me gusta nada esto", "horrible partido anoche", "partido partido gol",
+             "mañana hay partido", "odio los lunes", "quien trae comida mañana"]
+    for i, text in enumerate(texts):
+        store.append(7, {'user': ["Ana", "Luis", "Ana"][i % 3], 'text': text,
+                         'timestamp': start + timedelta(minutes=10 * i)})
+
+    messages = store.get(7)
+    incremental = handler._trackers[7].build()
+    assert _comparable(incremental) == _comparable(handler.get_analizar_metricas(messages))
+    assert incremental.total_messages == 4
+    assert incremental.time_span == "últimos 30 minutos"
+    assert incremental.dominant_topics[0] == "partido"
+
+    store.drop(7)
+    assert 7 not in handler._trackers
+
+
+def test_metrics_follow_the_snapshot_when_the_full_ring_moves_on():
+    handler = CinicoHandler("{total_messages}|{active_users}|{dominant_topics}", [])
+    store = MessageStore(3, 10 ** 6, on_append=handler.track_message,
+                         on_evict=handler.untrack_message, on_drop=handler.forget_chat)
+    start = datetime(2024, 1, 1, 12, 0)
+    for i in range(3):
+        store.append(7, {'user': "ana", 'text': "futbol", 'timestamp': start + timedelta(minutes=i), 'message_id': i})
+    snapshot = store.get(7)
+    # Mientras se resumen los bloques llegan otros mensajes: misma cantidad, otra ventana
+    for i in range(3, 6):
+        store.append(7, {'user': "beto", 'text': "politica elecciones votos",
+                         'timestamp': start + timedelta(minutes=i), 'message_id': i})
+
+    prompt = handler.get_prompt_from_partials(["parcial"], snapshot, chat_id=7)
+    assert prompt.startswith("3|ana|futbol")
+    assert handler.get_prompt_from_partials(["parcial"], store.get(7), chat_id=7).startswith("3|beto|")
+
+
+def test_format_time_span():
+    now = datetime(2024, 1, 1)
+    assert format_time_span(now, now + timedelta(seconds=30)) == "último minuto"
+    assert format_time_span(now, now + timedelta(hours=2)) == "últimas 2 horas"
+    assert format_time_span(None, None) == "desconocido"
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la importación de historia desde exportaciones de Telegram Desktop
+"""
+import io
+import json
+
+import pytest
+
+from bot2_scripts.bot2_core import MAX_MESSAGE_LENGTH, normalize_message
+from bot2_scripts.utils.history_import import (
+    Checkpoint, ExportFormatError, HistoryImporter, bot_chat_id, iter_export,
+)
+from bot2_scripts.utils.message_store import MessageStore
+from bot2_scripts.utils.storage import SQLiteBackend
+
+
+def _message(i, text=None, **extra):
+    return {"id": i, "type": "message", "date": "2024-03-01T10:00:00", "date_unixtime": str(1709287200 + i),
+            "from": "Ana Pérez", "from_id": "user1", "text": f"mensaje {i}" if text is None else text, **extra}
+
+
+def _export(messages):
+    return {"name": "Grupo", "type": "private_supergroup", "id": 555, "messages": messages}
+
+
+def test_stream_parser_handles_account_exports_in_small_chunks():
+    account = {
+        "about": "Exportación completa",
+        "frequent_contacts": {"list": [{"id": 1, "name": "x", "rating": 1.5}]},
+        "chats": {"about": "chats", "list": [
+            {"name": "Privado", "type": "personal_chat", "id": 9, "messages": [_message(1)]},
+            {"name": "Grupo", "type": "private_group", "id": 77, "messages": [
+                _message(1, ["hola ", {"type": "bold", "text": "\"mundo\""}]),
+                _message(2, "¿qué tal? 😀"),
+            ]},
+        ]},
+    }
+    source = io.StringIO(json.dumps(account, ensure_ascii=False, indent=1))
+    # Bloques de 7 caracteres: los valores quedan partidos entre lecturas
+    items = list(iter_export(source, chunk_size=7))
+    assert [(info['id'], info['type'], raw['id']) for info, raw in items] == [
+        (9, "personal_chat", 1), (77, "private_group", 1), (77, "private_group", 2)
+    ]
+    assert items[1][1]['text'][1]['text'] == "\"mundo\""
+    assert bot_chat_id(77, "private_group") == -77
+    assert bot_chat_id(555, "public_supergroup") == -100555
+
+    with pytest.raises(ExportFormatError):
+        list(iter_export(io.StringIO('{"messages": [{"id": 1}, ')))
+
+
+def test_import_normalizes_like_live_messages_and_is_idempotent(tmp_path):
+    export = _export([
+        _message(1, "hola"),
+        _message(2, "x" * (MAX_MESSAGE_LENGTH + 50)),
+        _message(3, ["link ", {"type": "link", "text": "https://ejemplo.com"}]),
+        _message(4, "/resumen"),
+        _message(5, "pie de foto", photo="photos/1.jpg"),
+        {"id": 6, "type": "service", "action": "pin_message", "text": ""},
+        _message(7, "sin autor", **{"from": None}),
+    ])
+    backend = SQLiteBackend(str(tmp_path / "bot.db"))
+    importer = HistoryImporter(lambda chat_id: backend, normalize_message, batch_size=2)
+
+    result = importer.run(io.StringIO(json.dumps(export)))
+    assert (result.parsed, result.imported, result.skipped) == (7, 4, 3)
+    assert result.chats == {-100555: 4}
+
+    store = MessageStore(10, 10 ** 6, backend=backend)
+    messages = store.get(-100555)
+    assert [m['user'] for m in messages] == ["Ana", "Ana", "Ana", "UsuarioDesconocido"]
+    assert len(messages[1]['text']) == MAX_MESSAGE_LENGTH
+    assert messages[2]['text'] == "link https://ejemplo.com"
+    assert messages[0]['timestamp'].timestamp() == 1709287201
+
+    # Reimportar el mismo archivo no duplica nada
+    again = importer.run(io.StringIO(json.dumps(export)))
+    assert (again.imported, again.duplicates) == (0, 4)
+    backend.close()
+
+
+class _Interrupted(io.StringIO):
+    """Archivo que entrega de a poco y falla después de `limit` caracteres, como una importación cortada."""
+
+    def __init__(self, text, limit):
+        super().__init__(text)
+        self.limit = limit
+
+    def read(self, size=-1):
+        if self.tell() >= self.limit:
+            raise OSError("conexión perdida")
+        return super().read(256)
+
+
+def test_interrupted_import_resumes_from_checkpoint(tmp_path):
+    export_path = tmp_path / "result.json"
+    text = json.dumps(_export([_message(i) for i in range(1, 101)]))
+    export_path.write_text(text, encoding="utf-8")
+    checkpoint = Checkpoint(str(tmp_path / "progreso.json"), str(export_path))
+    backend = SQLiteBackend(str(tmp_path / "bot.db"))
+    importer = HistoryImporter(lambda chat_id: backend, normalize_message, batch_size=10)
+
+    with pytest.raises(OSError):
+        importer.run(_Interrupted(text, len(text) // 2), checkpoint)
+    saved = checkpoint.load()
+    assert 0 < saved < 100 and saved % 10 == 0
+
+    result = importer.run(io.StringIO(text), checkpoint)
+    assert result.resumed == saved and result.imported == 100 - saved
+    assert len(backend.load_recent(-100555, 1000)) == 100
+    backend.close()
+
+
+def test_backfilled_history_loads_before_newer_live_messages(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "bot.db"), flush_interval=0.01)
+    live = MessageStore(10, 10 ** 6, backend=backend)
+    live.append(-100555, normalize_message("Luis", "en vivo", message_id=500))
+    backend.flush()
+
+    HistoryImporter(lambda chat_id: backend, normalize_message).run(
+        io.StringIO(json.dumps(_export([_message(1), _message(2)]))))
+
+    store = MessageStore(10, 10 ** 6, backend=backend)
+    assert [m['text'] for m in store.get(-100555)] == ["mensaje 1", "mensaje 2", "en vivo"]
+    backend.close()
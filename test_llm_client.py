@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Pruebas del cliente LLM asíncrono contra un servidor OpenRouter simulado local
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from bot2_scripts.bot2_core import CinicoSummaryBot
+from bot2_scripts.utils.llm_client import OpenRouterClient, LLMConnectionError
+from bot2_scripts.utils.storage import MemoryBackend
+from bot2_scripts.utils.llm_scheduler import LLMScheduler
+
+STUB_DELAY = 0.5
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Responde a /chat/completions tras una latencia fija"""
+    fail_first = 0
+    calls = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).calls += 1
+        if type(self).fail_first > 0:
+            type(self).fail_first -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        time.sleep(STUB_DELAY)
+        payload = json.dumps({
+            "choices": [{"message": {"content": f"  resumen de {len(body['messages'][0]['content'])} chars  "}}]
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class _StubServer(ThreadingHTTPServer):
+    # El backlog por defecto (5) descarta conexiones simultáneas y agrega ~1s de reintento TCP
+    request_queue_size = 64
+
+
+def _start_stub():
+    server = _StubServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _fake_update(chat_id, text="/resumen", chat_type="group", replies=None):
+    async def reply_text(reply, **kwargs):
+        if replies is not None:
+            replies.append(reply)
+
+    message = SimpleNamespace(
+        chat=SimpleNamespace(id=chat_id, type=chat_type),
+        from_user=SimpleNamespace(first_name="Ana"),
+        text=text,
+        message_id=None,
+        reply_text=reply_text,
+    )
+    return SimpleNamespace(message=message)
+
+
+def test_concurrent_resumen_runs_in_parallel():
+    """N /resumen concurrentes tardan aproximadamente lo mismo que uno solo"""
+    server, url = _start_stub()
+    bot = CinicoSummaryBot("123:TEST", storage=MemoryBackend())
+    bot.llm_client = OpenRouterClient("test-key", base_url=url, max_retries=0)
+    n = 10
+    # Sin límites de tasa: la prueba mide la concurrencia del cliente
+    bot.llm_scheduler = LLMScheduler(workers=n, max_queue=n)
+
+    async def scenario():
+        for chat_id in range(n):
+            await bot.handle_message(_fake_update(chat_id, "hola a todos"), None)
+        replies = [[] for _ in range(n)]
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(bot.resumen(_fake_update(i, replies=replies[i]), None)) for i in range(n)]
+
+        # La ingesta sigue fluyendo mientras se generan los resúmenes
+        await asyncio.sleep(STUB_DELAY / 5)
+        ingest_start = time.perf_counter()
+        await bot.handle_message(_fake_update(0, "sigo escribiendo"), None)
+        ingest_elapsed = time.perf_counter() - ingest_start
+
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        await bot.llm_client.aclose()
+        return replies, elapsed, ingest_elapsed
+
+    try:
+        replies, elapsed, ingest_elapsed = asyncio.run(scenario())
+    finally:
+        server.shutdown()
+
+    assert all(r[-1].startswith("resumen de") for r in replies)
+    # En serie tardarían n * STUB_DELAY; en paralelo, cerca de uno solo
+    assert elapsed < STUB_DELAY * 3, f"{n} resúmenes tardaron {elapsed:.2f}s"
+    assert ingest_elapsed < STUB_DELAY / 2
+
+
+def test_retries_transient_errors():
+    """Los 503 se reintentan con backoff antes de fallar"""
+    server, url = _start_stub()
+    _StubHandler.fail_first = 2
+    _StubHandler.calls = 0
+    client = OpenRouterClient("test-key", base_url=url, max_retries=2, backoff_base=0.01)
+
+    async def scenario():
+        try:
+            return await client.complete("hola")
+        finally:
+            await client.aclose()
+
+    try:
+        assert asyncio.run(scenario()).startswith("resumen de")
+        assert _StubHandler.calls == 3
+
+        _StubHandler.fail_first = 5
+        client.max_retries = 1
+        try:
+            asyncio.run(scenario())
+        except LLMConnectionError:
+            pass
+        else:
+            raise AssertionError("Se esperaba LLMConnectionError")
+    finally:
+        _StubHandler.fail_first = 0
+        server.shutdown()
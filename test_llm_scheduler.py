@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Pruebas del planificador global de llamadas al LLM
+"""
+import asyncio
+
+from bot2_scripts.utils.llm_scheduler import LLMScheduler, SchedulerBusy, TokenBucket
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_over_time():
+    clock = _FakeClock()
+    bucket = TokenBucket(rate=2, capacity=4, clock=clock)
+    for _ in range(4):
+        assert bucket.delay() == 0
+        bucket.consume()
+    assert bucket.delay() == 0.5
+    clock.now = 0.5
+    assert bucket.delay() == 0
+    assert TokenBucket(rate=0, capacity=1).delay(100) == 0
+
+
+def test_round_robin_between_chats():
+    scheduler = LLMScheduler(workers=1, max_queue=100)
+    order = []
+
+    def job(chat, i):
+        async def run():
+            order.append((chat, i))
+            await asyncio.sleep(0)
+        return run
+
+    async def scenario():
+        # El chat "ruidoso" encola 5 trabajos antes de que lleguen los demás
+        tasks = [asyncio.create_task(scheduler.submit("ruidoso", job("ruidoso", i))) for i in range(5)]
+        tasks += [asyncio.create_task(scheduler.submit(chat, job(chat, 0))) for chat in ("a", "b")]
+        await asyncio.gather(*tasks)
+        await scheduler.close()
+
+    asyncio.run(scenario())
+    # "a" y "b" no esperan a que el chat ruidoso vacíe su cola
+    assert order.index(("a", 0)) <= 2 and order.index(("b", 0)) <= 3
+    assert scheduler.stats()['completed'] == 7
+
+
+def test_full_queue_rejects_immediately():
+    scheduler = LLMScheduler(workers=1, max_queue=2)
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def slow():
+            await gate.wait()
+            return "ok"
+
+        first = asyncio.create_task(scheduler.submit(1, slow))
+        await asyncio.sleep(0)  # el worker toma el primero
+        queued = [asyncio.create_task(scheduler.submit(2, slow)) for _ in range(2)]
+        await asyncio.sleep(0)
+        try:
+            await scheduler.submit(3, slow)
+        except SchedulerBusy:
+            rejected = True
+        else:
+            rejected = False
+        gate.set()
+        results = await asyncio.gather(first, *queued)
+        await scheduler.close()
+        return rejected, results
+
+    rejected, results = asyncio.run(scenario())
+    assert rejected
+    assert results == ["ok"] * 3
+    assert scheduler.stats()['rejected'] == 1
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Pruebas del logging estructurado: redacción, muestreo y evaluación perezosa
+"""
+import io
+import json
+import logging
+
+from bot2_scripts.utils import logging_setup
+from bot2_scripts.utils.logging_setup import configure_logging, log_event, parse_sample_rates
+
+TOKEN = "123456789:AAHdqTcvCH1vGWJxfSeofSAs0K5PALDsaw"
+
+
+def _capture(**kwargs):
+    stream = io.StringIO()
+    configure_logging(stream=stream, **kwargs)
+    return stream
+
+
+def _flush():
+    logging_setup._listener.stop()
+    logging_setup._listener.start()
+
+
+def test_secrets_are_redacted():
+    stream = _capture(level="INFO", secrets=[TOKEN, "clave-super-secreta"])
+    try:
+        logger = logging.getLogger("prueba.redaccion")
+        logger.info("POST https://api.telegram.org/bot%s/getUpdates", TOKEN)
+        logger.info("Authorization: Bearer abc.def-123 clave=clave-super-secreta")
+        _flush()
+        output = stream.getvalue()
+        assert TOKEN not in output and "clave-super-secreta" not in output
+        assert "abc.def-123" not in output
+        assert output.count("***") == 3
+    finally:
+        configure_logging()
+
+
+def test_sampling_level_gating_and_json_format():
+    stream = _capture(level="INFO", fmt="json", sample_rates=parse_sample_rates("ruidoso=0, normal=1"))
+    evaluated = []
+    try:
+        logger = logging.getLogger("prueba.eventos")
+        log_event(logger, "ruidoso", logging.INFO, costo=lambda: evaluated.append("ruidoso"))
+        log_event(logger, "detalle", logging.DEBUG, costo=lambda: evaluated.append("detalle"))
+        log_event(logger, "normal", logging.INFO, chat_id=5, costo=lambda: "calculado")
+        _flush()
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert evaluated == []
+        assert len(lines) == 1
+        assert lines[0]['event'] == "normal" and lines[0]['chat_id'] == 5 and lines[0]['costo'] == "calculado"
+    finally:
+        configure_logging()
+
+
+def test_structured_fields_are_redacted_in_json():
+    stream = _capture(level="INFO", fmt="json", secrets=[TOKEN])
+    try:
+        logger = logging.getLogger("prueba.campos")
+        log_event(logger, "peticion", url=f"https://api.telegram.org/bot{TOKEN}/getMe",
+                  auth="Bearer abc.def-123", chat_id=5)
+        _flush()
+        output = stream.getvalue()
+        assert TOKEN not in output and "abc.def-123" not in output
+        line = json.loads(output)
+        assert line['url'] == "https://api.telegram.org/bot***/getMe" and line['auth'] == "***"
+        assert line['chat_id'] == 5
+    finally:
+        configure_logging()
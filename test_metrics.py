@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Pruebas del endpoint de métricas y del comando /profile
+"""
+import asyncio
+import urllib.request
+from types import SimpleNamespace
+
+from bot2_scripts import bot2_core
+from bot2_scripts.bot2_core import CinicoSummaryBot, HANDLE_MESSAGE_SECONDS
+from bot2_scripts.utils.metrics import MetricsRegistry, MetricsServer, REGISTRY
+from bot2_scripts.utils.storage import MemoryBackend
+
+
+def _fake_update(chat_id, text, user_id=1, replies=None):
+    async def reply_text(reply):
+        if replies is not None:
+            replies.append(reply)
+
+    message = SimpleNamespace(
+        chat=SimpleNamespace(id=chat_id, type='group'),
+        from_user=SimpleNamespace(id=user_id, first_name=f"Usuario{user_id}"),
+        text=text,
+        message_id=None,
+        reply_text=reply_text,
+    )
+    return SimpleNamespace(message=message)
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    latency = registry.histogram("demo_seconds", "Demo", labels=("outcome",), buckets=(0.1, 1))
+    latency.observe(0.05, outcome="ok")
+    latency.observe(0.5, outcome="ok")
+    latency.observe(5, outcome="ok")
+    registry.counter("demo_total", "Demo").inc(3)
+    registry.register_collector("extra", lambda: [("demo_queue", "gauge", "Cola", {}, 2)])
+
+    text = registry.render()
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{outcome="ok",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{outcome="ok",le="1.0"} 2' in text
+    assert 'demo_seconds_bucket{outcome="ok",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{outcome="ok"} 3' in text
+    assert 'demo_total 3.0' in text
+    assert 'demo_queue 2' in text
+
+
+def test_metrics_endpoint_exposes_bot_instrumentation():
+    bot = CinicoSummaryBot("123:TEST", storage=MemoryBackend())
+    bot.register_metrics_collectors()
+    before = HANDLE_MESSAGE_SECONDS.count()
+
+    async def scenario():
+        for i in range(5):
+            await bot.handle_message(_fake_update(-100, f"mensaje {i}"), None)
+        bot.build_prompt(bot.message_store.get(-100), chat_id=-100)
+
+        server = MetricsServer(REGISTRY, "127.0.0.1", 0)
+        await server.start()
+        url = f"http://127.0.0.1:{server.port}/metrics"
+        body = await asyncio.to_thread(lambda: urllib.request.urlopen(url, timeout=5).read().decode())
+        await server.stop()
+        return body
+
+    body = asyncio.run(scenario())
+    assert HANDLE_MESSAGE_SECONDS.count() == before + 5
+    assert 'bot_handle_message_seconds_bucket' in body
+    assert 'bot_prompt_build_seconds_count{stage="prompt"}' in body
+    assert 'bot_prompt_chars_bucket{kind="final"' in body
+    assert 'bot_message_store_messages' in body
+    assert 'bot_llm_scheduler_queue_depth' in body
+
+
+def test_profile_command_only_for_admins(monkeypatch):
+    bot = CinicoSummaryBot("123:TEST", storage=MemoryBackend())
+    monkeypatch.setattr(bot2_core, "ADMIN_USER_IDS", {99})
+    replies = []
+
+    async def scenario():
+        await bot.profile(_fake_update(-100, "/profile", user_id=1, replies=replies), None)
+        assert not bot.profiler.active and not replies
+
+        await bot.profile(_fake_update(-100, "/profile", user_id=99, replies=replies), None)
+        assert bot.profiler.active
+        await bot.handle_message(_fake_update(-100, "hola"), None)
+        await bot.profile(_fake_update(-100, "/profile", user_id=99, replies=replies), None)
+
+    asyncio.run(scenario())
+    assert not bot.profiler.active
+    assert len(replies) >= 2
+    assert "Perfilado durante" in replies[1]
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Pruebas del reparto de llamadas entre modelos: circuit breakers, peticiones duplicadas y elección ponderada
+"""
+import asyncio
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from bot2_scripts.bot2_core import SUMMARY_MODELS, CinicoSummaryBot
+from bot2_scripts.utils.llm_client import LLMConnectionError
+from bot2_scripts.utils.llm_scheduler import LLMScheduler
+from bot2_scripts.utils.model_router import CircuitBreaker, ModelRouter, record_models
+from bot2_scripts.utils.storage import MemoryBackend
+
+
+class FirstChoice(random.Random):
+    """Elige siempre el primer candidato, para fijar el modelo principal."""
+
+    def choices(self, population, weights=None, k=1):
+        return [population[0]]
+
+
+def _client(latencies, failing=(), calls=None):
+    calls = [] if calls is None else calls
+
+    async def complete(prompt, model=None):
+        calls.append(model)
+        await asyncio.sleep(latencies.get(model, 0))
+        if model in failing:
+            raise LLMConnectionError(f"{model} caído")
+        return f"respuesta de {model}"
+
+    async def stream(prompt, model=None):
+        calls.append(model)
+        if model in failing:
+            raise LLMConnectionError(f"{model} caído")
+        for part in ("hola ", model):
+            yield part
+
+    async def aclose():
+        pass
+
+    return SimpleNamespace(api_key="k", complete=complete, stream=stream, aclose=aclose)
+
+
+def test_circuit_breaker_opens_probes_and_closes():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.available
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.available
+
+    now[0] = 10
+    assert breaker.acquire() and breaker.state == "half_open"
+    # Una sola petición de prueba a la vez
+    assert not breaker.acquire()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.opens == 2
+
+    now[0] = 20
+    assert breaker.acquire()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.available
+
+
+def test_slow_primary_is_hedged_and_first_answer_wins():
+    calls = []
+    router = ModelRouter(_client({"lento": 5, "rapido": 0.01}, calls=calls), ["lento", "rapido"],
+                         hedge_delay=0.05, rng=FirstChoice())
+
+    async def scenario():
+        with record_models([]) as models:
+            text = await asyncio.wait_for(router.complete("p"), 1)
+        return text, models
+
+    text, models = asyncio.run(scenario())
+    assert text == "respuesta de rapido"
+    assert models == ["rapido"]
+    assert calls == ["lento", "rapido"]
+    assert router.stats()['hedges'] == 1 and router.stats()['hedge_wins'] == 1
+    # El intento cancelado no cuenta como fallo del modelo lento
+    assert router.snapshot()['lento']['state'] == "closed"
+
+
+def test_failing_model_fails_over_and_trips_breaker():
+    calls = []
+    router = ModelRouter(_client({}, failing={"roto"}, calls=calls), ["roto", "bueno"],
+                         hedge_delay=0, failure_threshold=2, rng=FirstChoice())
+
+    async def scenario():
+        return [await router.complete("p") for _ in range(3)]
+
+    assert asyncio.run(scenario()) == ["respuesta de bueno"] * 3
+    # Tras dos fallos el circuito se abre y "roto" deja de recibir peticiones
+    assert calls == ["roto", "bueno", "roto", "bueno", "bueno"]
+    assert router.snapshot()['roto']['state'] == "open"
+    assert router.stats()['failovers'] == 2 and router.stats()['available'] == 1
+
+
+def test_all_breakers_open_fails_fast():
+    router = ModelRouter(_client({}, failing={"a"}), ["a"], hedge_delay=0, failure_threshold=1)
+
+    async def scenario():
+        with pytest.raises(LLMConnectionError):
+            await router.complete("p")
+        with pytest.raises(LLMConnectionError, match="circuit breakers"):
+            await router.complete("p")
+
+    asyncio.run(scenario())
+
+
+def test_selection_prefers_fast_reliable_models():
+    router = ModelRouter(_client({}), ["a", "b", "c"], hedge_delay=1, rng=random.Random(7))
+    for _ in range(20):
+        router._stats["a"].record(6.0, True)
+        router._stats["b"].record(0.5, True)
+        router._stats["c"].record(0.5, False)
+    primaries = [router.candidates()[0] for _ in range(500)]
+    assert primaries.count("b") > primaries.count("a") > 0
+    assert primaries.count("b") > primaries.count("c")
+    # Después del principal, los demás van de mayor a menor peso
+    candidates = router.candidates()
+    assert candidates[1:] == [m for m in ("b", "a", "c") if m != candidates[0]]
+
+
+def test_always_slow_model_loses_primary_share():
+    router = ModelRouter(_client({"lento": 1, "rapido": 0.02}), ["lento", "rapido"],
+                         hedge_delay=0.01, rng=random.Random(1))
+    primaries = []
+    candidates = router.candidates
+
+    def recorded():
+        ranked = candidates()
+        primaries.append(ranked[0])
+        return ranked
+
+    router.candidates = recorded
+
+    async def scenario():
+        for _ in range(60):
+            await router.complete("p")
+
+    asyncio.run(scenario())
+    # El modelo lento siempre pierde la carrera y se cancela, pero igual acumula historial
+    snapshot = router.snapshot()
+    assert snapshot['lento']['p95'] is not None and snapshot['lento']['p95'] > snapshot['rapido']['p95']
+    assert snapshot['lento']['state'] == "closed"
+    assert primaries[-30:].count("lento") < 10
+
+
+def test_hedges_and_failovers_are_charged_to_the_scheduler_rate_limit():
+    def routed(requests_per_minute, latencies, failing=()):
+        scheduler = LLMScheduler(workers=1, max_queue=10, requests_per_minute=requests_per_minute)
+        calls = []
+        router = ModelRouter(_client(latencies, failing, calls), ["a", "b"], hedge_delay=0.02, rng=FirstChoice(),
+                             charge=lambda prompt, wait: scheduler.charge_extra(0, wait))
+
+        async def scenario():
+            try:
+                return await scheduler.submit(1, lambda: router.complete("p"))
+            finally:
+                await scheduler.close()
+
+        return asyncio.run(scenario()), calls, router, scheduler
+
+    # Con cupo para una sola petición por minuto, el principal lento no se duplica
+    text, calls, router, scheduler = routed(6, {"a": 0.1, "b": 0})
+    assert text == "respuesta de a" and calls == ["a"]
+    assert router.stats()['hedges_skipped'] == 1 and scheduler.stats()['extra_skipped'] == 1
+
+    # Con cupo, la duplicada se envía y se cobra como otra petición
+    text, calls, router, scheduler = routed(60, {"a": 0.1, "b": 0})
+    assert text == "respuesta de b" and calls == ["a", "b"]
+    assert scheduler.stats()['extra_requests'] == 1
+
+    # Un cambio de modelo tras un fallo espera su cupo en lugar de saltarse el límite
+    text, calls, router, scheduler = routed(600, {}, failing={"a"})
+    assert text == "respuesta de b" and calls == ["a", "b"]
+    assert scheduler.stats()['extra_requests'] == 1
+
+
+def test_stream_fails_over_before_first_chunk():
+    router = ModelRouter(_client({}, failing={"roto"}), ["roto", "bueno"], hedge_delay=0, rng=FirstChoice())
+
+    async def scenario():
+        with record_models([]) as models:
+            parts = [delta async for delta in router.stream("p")]
+        return parts, models
+
+    parts, models = asyncio.run(scenario())
+    assert "".join(parts) == "hola bueno"
+    assert models == ["bueno"]
+
+
+def test_bot_records_the_model_that_wrote_each_summary():
+    bot = CinicoSummaryBot("123:TEST", storage=MemoryBackend())
+    bot.llm_client = ModelRouter(_client({}, failing={"roto"}), ["roto", "bueno"], hedge_delay=0, rng=FirstChoice())
+    before = SUMMARY_MODELS.value(model="bueno")
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    update = SimpleNamespace(message=SimpleNamespace(
+        chat=SimpleNamespace(id=3, type="group"), from_user=SimpleNamespace(first_name="Ana"),
+        text="hola", message_id=None, reply_text=reply_text))
+
+    async def scenario():
+        await bot.handle_message(update, None)
+        await bot.resumen(update, None)
+        await bot.llm_scheduler.close()
+
+    asyncio.run(scenario())
+    assert replies[-1] == "respuesta de bueno"
+    assert SUMMARY_MODELS.value(model="bueno") == before + 1
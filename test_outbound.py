@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Pruebas de los envíos a Telegram: división de mensajes, orden por chat y control de flujo
+"""
+import asyncio
+import time
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+
+from bot2_scripts.utils.outbound import OutboundSender, split_message
+
+
+def test_split_prefers_paragraphs_and_sentences():
+    text = "Primer párrafo. Sigue.\n\nSegundo párrafo con una oración. Y otra oración más larga que la anterior."
+    chunks = split_message(text, 60)
+    assert chunks[0] == "Primer párrafo. Sigue."
+    assert chunks[1] == "Segundo párrafo con una oración."
+    assert chunks[2] == "Y otra oración más larga que la anterior."
+    # Sin límite alcanzado no se divide, y nunca se corta una palabra
+    assert split_message("corto", 60) == ["corto"]
+    words = split_message("palabra " * 40, 50)
+    assert all(len(c) <= 50 and "palabra" in c.split() for c in words)
+
+
+def test_split_keeps_markdown_balanced():
+    code = "\n".join(f"x = {i}" for i in range(40))
+    text = f"Antes **del código**.\n```python\n{code}\n```\nDespués."
+    chunks = split_message(text, 80)
+    assert all(len(c) <= 80 for c in chunks)
+    for chunk in chunks:
+        assert chunk.count("```") % 2 == 0
+        assert chunk.count("**") % 2 == 0
+    # El bloque se reabre con su lenguaje en cada trozo
+    assert all(c.startswith("```python\n") for c in chunks[1:-1])
+    body = [line for c in chunks for line in c.split("\n") if line.startswith("x = ")]
+    assert body == code.split("\n")
+
+    # Una negrita más larga que el límite se cierra y se reabre
+    bold = split_message("**" + "muy " * 30 + "largo**", 40)
+    assert all(c.count("**") == 2 for c in bold)
+
+
+def test_split_always_shrinks_the_rest():
+    # El único corte posible es la línea que abre el bloque: antes se repetía sin fin
+    chunks = split_message("```\n" + "b" * 20 + "\n```", 10)
+    assert all(len(c) <= 10 and c.count("```") == 2 for c in chunks)
+    assert "".join(c[len("```\n"):-len("\n```")] for c in chunks) == "b" * 20
+
+    # Un lenguaje largo ocupa más de un tercio del límite
+    code = "y" * 60
+    chunks = split_message("```" + "x" * 15 + "\n" + code + "\n```", 30)
+    assert all(len(c) <= 30 and c.count("```") == 2 for c in chunks)
+    assert "".join(c.split("\n")[1] for c in chunks) == code
+
+
+def test_chats_send_in_parallel_and_in_order():
+    sender = OutboundSender(global_rate=0, chat_rate=0)
+    sent = []
+
+    def call(chat, text, delay):
+        async def send():
+            await asyncio.sleep(delay)
+            sent.append((chat, text))
+            return text
+        return send
+
+    async def scenario():
+        slow = asyncio.gather(*(sender.send(1, call(1, f"largo {i}", 0.05)) for i in range(4)))
+        await asyncio.sleep(0.01)
+        # El chat 2 no espera a que termine el resumen largo del chat 1
+        assert await sender.send(2, call(2, "rápido", 0)) == "rápido"
+        assert sent == [(2, "rápido")]
+        return await slow
+
+    assert asyncio.run(scenario()) == [f"largo {i}" for i in range(4)]
+    assert [text for chat, text in sent if chat == 1] == [f"largo {i}" for i in range(4)]
+    assert sender.stats()['sent'] == 5 and sender.stats()['queued'] == 0
+
+
+def test_retry_after_pauses_only_that_chat():
+    sender = OutboundSender(global_rate=0, chat_rate=0, max_retries=2)
+    attempts = []
+    other = []
+
+    async def flooded(text):
+        attempts.append((text, time.monotonic()))
+        if len(attempts) == 1:
+            raise RetryAfter(timedelta(milliseconds=200))
+        return text
+
+    async def scenario():
+        long_text = "Primer párrafo.\n\nSegundo párrafo."
+        delivery = asyncio.ensure_future(sender.send_text(-100, flooded, long_text, 20))
+        await asyncio.sleep(0.05)
+        await sender.send(7, lambda: asyncio.sleep(0, result=other.append("hola")))
+        # Mientras el grupo espera, el otro chat ya recibió su mensaje
+        assert other == ["hola"] and not delivery.done()
+        return await delivery
+
+    assert asyncio.run(scenario()) == ["Primer párrafo.", "Segundo párrafo."]
+    assert [text for text, _ in attempts] == ["Primer párrafo.", "Primer párrafo.", "Segundo párrafo."]
+    assert attempts[1][1] - attempts[0][1] >= 0.2
+    assert sender.stats()['retried'] == 1
+
+
+def test_chat_bucket_paces_sustained_sends():
+    sender = OutboundSender(global_rate=0, chat_rate=20, chat_burst=2)
+
+    async def scenario():
+        start = time.monotonic()
+        await asyncio.gather(*(sender.send(1, lambda: asyncio.sleep(0)) for _ in range(4)))
+        return time.monotonic() - start
+
+    # Dos de ráfaga y dos más a 20 por segundo
+    assert asyncio.run(scenario()) >= 0.09
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la compactación de mensajes antes de armar el prompt
+"""
+import pytest
+
+from bot2_scripts.handlers.cinico_handler import CinicoHandler
+from bot2_scripts.utils.prompt_compaction import PromptCompactor, estimate_tokens, parse_steps, signature
+
+TEMPLATE = "PERSONA {total_messages} {active_users}\n{joined}\nResumen:"
+
+
+def _msgs(*pairs):
+    return [{'user': user, 'text': text} for user, text in pairs]
+
+
+def test_shorten_links_and_long_code():
+    compactor = PromptCompactor(["shorten"], max_code_chars=40)
+    code = "```python\n" + "\n".join(f"x{i} = {i}" for i in range(20)) + "\n```"
+    result = compactor.compact(_msgs(
+        ("Ana", "miren https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42s jaja"),
+        ("Luis", f"arreglado: {code}"),
+        ("Ana", "```ok```"),
+    ))
+    texts = [m['text'] for m in result.messages]
+    assert texts[0] == "miren [enlace youtube.com] jaja"
+    assert texts[1] == "arreglado: [código de 20 líneas: x0 = 0…]"
+    assert texts[2] == "```ok```"
+    assert result.ratio < 1
+
+
+def test_dedupe_exact_and_near_duplicates_with_counts():
+    assert signature("JAJAJAJA!!") == signature("jajaja") == signature("Jaja 😂")
+    compactor = PromptCompactor(["dedupe"])
+    result = compactor.compact(_msgs(
+        ("Ana", "jajaja"),
+        ("Luis", "JAJAJAJAJA"),
+        ("Pedro", "el partido de hoy empieza a las nueve en punto"),
+        ("Ana", "jaja!"),
+        ("Luis", "el partido de hoy empieza a las nueve en punto!!"),
+        ("Luis", "el partido de hoy empieza a las nueve y media"),
+        ("Pedro", "si"),
+        ("Ana", "no"),
+    ))
+    assert [(m['user'], m['text']) for m in result.messages] == [
+        ("Ana", "jajaja [x3, también Luis]"),
+        ("Pedro", "el partido de hoy empieza a las nueve en punto [x2, también Luis]"),
+        ("Luis", "el partido de hoy empieza a las nueve y media"),
+        ("Pedro", "si"),
+        ("Ana", "no"),
+    ]
+
+
+def test_collapse_consecutive_messages_from_same_user():
+    result = PromptCompactor(["collapse"]).compact(_msgs(
+        ("Ana", "hola"), ("Ana", "alguien?"), ("Luis", "acá"), ("Ana", "bien"),
+    ))
+    assert [(m['user'], m['text']) for m in result.messages] == [
+        ("Ana", "hola / alguien?"), ("Luis", "acá"), ("Ana", "bien"),
+    ]
+
+
+def test_budget_keeps_recent_and_high_signal_messages_in_order():
+    messages = _msgs(*[("Ana", "ok") for _ in range(30)])
+    messages[3] = {'user': 'Luis', 'text': "¿alguien sabe a qué hora sale el último tren hacia la costa este sábado?"}
+    messages.append({'user': 'Pedro', 'text': "nos vemos mañana en la estación con las entradas"})
+    compactor = PromptCompactor(["budget"], token_budget=60)
+
+    result = compactor.compact(messages)
+    lines = [f"{m['user']}: {m['text']}" for m in result.messages]
+    assert sum(estimate_tokens(line) for line in lines) <= 60
+    assert result.messages[-1]['user'] == "Pedro"
+    assert any("último tren" in m['text'] for m in result.messages)
+    assert any(m['text'].endswith("mensajes omitidos") for m in result.messages)
+    # Sin presupuesto (bloques del resumen jerárquico) no se recorta nada
+    assert len(compactor.compact(messages, budget=False).messages) == len(messages)
+
+
+def test_parse_steps():
+    assert parse_steps("budget, dedupe") == ("dedupe", "budget")
+    assert parse_steps("") == ()
+    with pytest.raises(ValueError):
+        parse_steps("dedupe,magia")
+
+
+def test_handler_compacts_prompt_but_keeps_full_metrics():
+    messages = _msgs(*[("Ana", "jajaja") for _ in range(20)], ("Luis", "ya basta https://example.com/a/b/c"))
+    plain = CinicoHandler(TEMPLATE, [])
+    compacting = CinicoHandler(TEMPLATE, [], PromptCompactor())
+
+    prompt = compacting.get_prompt(messages)
+    assert prompt.startswith("PERSONA 21 Ana, Luis")
+    assert "Ana: jajaja [x20]\nLuis: ya basta [enlace example.com]" in prompt
+    assert len(prompt) < len(plain.get_prompt(messages)) / 3
+    # Cambiar la compactación cambia la versión (y con ella las claves de caché)
+    assert compacting.version != plain.version
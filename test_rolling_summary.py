@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Pruebas de los resúmenes acumulados en segundo plano y del carril de baja prioridad
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from bot2_scripts.handlers.cinico_handler import CinicoHandler
+from bot2_scripts.utils.llm_scheduler import LLMScheduler, SchedulerBusy
+from bot2_scripts.utils.message_store import MessageStore
+from bot2_scripts.utils.rolling_summary import RollingSummarizer
+from bot2_scripts.utils.summarizer import HierarchicalSummarizer
+
+TEMPLATE = "PERSONA {total_messages}\n{joined}\nResumen:"
+
+
+def test_interactive_jobs_preempt_background_work():
+    scheduler = LLMScheduler(workers=1, max_queue=10)
+    started = asyncio.Event()
+    order = []
+
+    async def slow_background():
+        started.set()
+        await asyncio.sleep(10)
+        return "fondo"
+
+    async def interactive():
+        order.append("interactivo")
+        return "ok"
+
+    async def scenario():
+        background = asyncio.create_task(scheduler.submit(1, slow_background, background=True))
+        await started.wait()
+        assert await asyncio.wait_for(scheduler.submit(2, interactive), 1) == "ok"
+        with pytest.raises(SchedulerBusy):
+            await background
+        await scheduler.close()
+
+    asyncio.run(scenario())
+    assert order == ["interactivo"]
+    assert scheduler.stats()['preempted'] == 1
+
+
+def test_background_waits_for_interactive_queue():
+    scheduler = LLMScheduler(workers=2, max_queue=10)
+    order = []
+
+    def job(name):
+        async def run():
+            order.append(name)
+            await asyncio.sleep(0.01)
+        return run
+
+    async def scenario():
+        tasks = [asyncio.create_task(scheduler.submit("b", job("fondo"), background=True))]
+        tasks += [asyncio.create_task(scheduler.submit(i, job(f"i{i}"))) for i in range(3)]
+        await asyncio.gather(*tasks)
+        await scheduler.close()
+
+    asyncio.run(scenario())
+    assert order.index("fondo") == 3
+
+
+def _rolling(every_messages=5, idle_seconds=0.0, delay=0.0):
+    handler = CinicoHandler(TEMPLATE, [])
+    store = MessageStore(100, 10 ** 6, on_append=handler.track_message, on_evict=handler.untrack_message)
+    calls = []
+
+    def fake(lane):
+        async def complete(prompt, chat_id=None):
+            calls.append((lane, prompt))
+            await asyncio.sleep(delay)
+            return f"resumen {len(calls)}"
+        return complete
+
+    rolling = RollingSummarizer(
+        handler, store,
+        HierarchicalSummarizer(handler, fake("interactivo")),
+        HierarchicalSummarizer(handler, fake("fondo")),
+        every_messages=every_messages,
+        idle_seconds=idle_seconds,
+    )
+    return rolling, store, calls
+
+
+def _say(rolling, store, chat_id, text, minute):
+    store.append(chat_id, {'user': "Ana", 'text': text, 'timestamp': datetime(2024, 1, 1) + timedelta(minutes=minute)})
+    rolling.on_message(chat_id)
+
+
+def test_resumen_folds_only_the_delta_after_background_fold():
+    rolling, store, calls = _rolling(every_messages=5)
+
+    async def scenario():
+        for i in range(5):
+            _say(rolling, store, 1, f"viejo {i}", i)
+        await asyncio.sleep(0.01)
+        assert [lane for lane, _ in calls] == ["fondo"]
+
+        _say(rolling, store, 1, "nuevo A", 10)
+        _say(rolling, store, 1, "nuevo B", 11)
+        summary = await rolling.summarize(1, store.get(1), store.seq(1))
+        # Sin mensajes nuevos no hace falta volver a llamar al LLM
+        again = await rolling.summarize(1, store.get(1), store.seq(1))
+        await rolling.close()
+        return summary, again
+
+    summary, again = asyncio.run(scenario())
+    assert summary == again == "resumen 2"
+    lane, prompt = calls[1]
+    assert lane == "interactivo"
+    assert "resumen 1" in prompt and "nuevo A" in prompt and "nuevo B" in prompt
+    assert "viejo" not in prompt
+    assert prompt.startswith("PERSONA 7")
+
+
+def test_idle_chat_is_folded_in_background():
+    rolling, store, calls = _rolling(every_messages=100, idle_seconds=0.05)
+
+    async def scenario():
+        _say(rolling, store, 1, "hola", 0)
+        _say(rolling, store, 1, "chau", 1)
+        await asyncio.sleep(0.02)
+        assert calls == []
+        await asyncio.sleep(0.1)
+        await rolling.close()
+
+    asyncio.run(scenario())
+    assert [lane for lane, _ in calls] == ["fondo"]
+    assert rolling.snapshot(1).summary is None  # close() descarta el estado
+    assert rolling.folds == 1
+
+
+def test_messages_during_a_fold_are_folded_afterwards():
+    rolling, store, calls = _rolling(every_messages=5, idle_seconds=0.05, delay=0.05)
+
+    async def scenario():
+        for i in range(5):
+            _say(rolling, store, 1, f"viejo {i}", i)
+        await asyncio.sleep(0.01)
+        # Llegan durante el pliegue: on_message no programa nada mientras corre
+        _say(rolling, store, 1, "tarde A", 10)
+        _say(rolling, store, 1, "tarde B", 11)
+        await asyncio.sleep(0.2)
+        covered = rolling.snapshot(1).covered_seq
+        await rolling.close()
+        return covered
+
+    covered = asyncio.run(scenario())
+    assert [lane for lane, _ in calls] == ["fondo", "fondo"]
+    assert "tarde A" in calls[1][1] and "tarde B" in calls[1][1]
+    assert covered == 7
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Pruebas del modo multiproceso: reparto por chat, relay de envíos y reinicio de workers
+"""
+import asyncio
+import os
+import time
+
+from bot2_scripts.bot2_core import run_shard_worker
+from bot2_scripts.utils.sharding import ShardSupervisor, TelegramRelay, shard_for, shard_path
+
+
+class _FakeTelegram:
+    """Hace de API de Telegram para el relay: registra cada petición."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def _do_post(self, endpoint, data):
+        self.calls.append((endpoint, data))
+        if endpoint == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Bot", "username": "cinico_bot"}
+        return {
+            "message_id": len(self.calls),
+            "date": 1700000000,
+            "chat": {"id": data["chat_id"], "type": "group"},
+            "text": data.get("text", ""),
+        }
+
+    def sent_to(self, chat_id):
+        return [d["text"] for e, d in self.calls if e == "sendMessage" and d["chat_id"] == chat_id]
+
+
+def _command(update_id, chat_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": chat_id, "type": "group"},
+            "from": {"id": 7, "is_bot": False, "first_name": "Ana"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+        },
+    }
+
+
+async def _wait_for(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "tiempo de espera agotado"
+        await asyncio.sleep(0.05)
+
+
+def test_shard_for_is_stable_and_spread():
+    chats = range(-1000, 0)
+    assert [shard_for(c, 4) for c in chats] == [shard_for(c, 4) for c in chats]
+    counts = [sum(1 for c in chats if shard_for(c, 4) == i) for i in range(4)]
+    assert min(counts) > 150
+    assert shard_for(-100, 1) == 0
+    assert shard_path("data/bot_messages.db", 2) == "data/bot_messages.shard2.db"
+
+
+def test_workers_reply_through_relay_and_restart(monkeypatch):
+    # Los workers se lanzan con "spawn" y leen la configuración del entorno
+    monkeypatch.setenv("BOT_TOKEN", "123:TEST")
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    monkeypatch.setenv("LOG_LEVEL", "WARNING")
+    telegram = _FakeTelegram()
+    chat_a = next(c for c in range(-100, -200, -1) if shard_for(c, 2) == 0)
+    chat_b = next(c for c in range(-100, -200, -1) if shard_for(c, 2) == 1)
+
+    async def scenario():
+        supervisor = ShardSupervisor(run_shard_worker, 2, check_interval=0.1)
+        relay = TelegramRelay(telegram, supervisor.outbox, supervisor.replies, rate=0)
+        relay.start()
+        supervisor.start()
+        try:
+            assert supervisor.route(chat_a, _command(1, chat_a, "/start")) == 0
+            assert supervisor.route(chat_b, _command(2, chat_b, "/start")) == 1
+            await _wait_for(lambda: telegram.sent_to(chat_a) and telegram.sent_to(chat_b))
+
+            # Matar un worker no afecta al otro shard y el supervisor lo relanza
+            old_pid = supervisor.processes[1].pid
+            os.kill(old_pid, 9)
+            await _wait_for(lambda: supervisor.restarts[1] == 1)
+            assert supervisor.processes[0].is_alive()
+            supervisor.route(chat_b, _command(3, chat_b, "/start"))
+            await _wait_for(lambda: len(telegram.sent_to(chat_b)) == 2)
+            assert supervisor.processes[1].pid != old_pid
+        finally:
+            await supervisor.stop(timeout=10)
+            await relay.stop()
+        return supervisor
+
+    supervisor = asyncio.run(scenario())
+    assert not any(p.is_alive() for p in supervisor.processes)
+    assert supervisor.stats()['routed'] == 3
+    assert "resumen" in telegram.sent_to(chat_a)[0]
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la coalescencia de /resumen concurrentes por chat
+"""
+import asyncio
+from types import SimpleNamespace
+
+from bot2_scripts.bot2_core import CinicoSummaryBot
+from bot2_scripts.utils.storage import MemoryBackend
+
+
+def _update(chat_id, text, replies):
+    async def reply_text(reply, **kwargs):
+        replies.append(reply)
+
+    return SimpleNamespace(message=SimpleNamespace(
+        chat=SimpleNamespace(id=chat_id, type="group"), from_user=SimpleNamespace(first_name="Ana"),
+        text=text, message_id=None, reply_text=reply_text))
+
+
+def test_concurrent_requests_share_one_llm_call_then_cooldown():
+    bot = CinicoSummaryBot("123:TEST", storage=MemoryBackend())
+    calls = []
+
+    async def complete(prompt, model=None):
+        calls.append(prompt)
+        await asyncio.sleep(0.05)
+        return "resumen compartido"
+
+    bot.llm_client = SimpleNamespace(api_key="k", complete=complete)
+    replies = [[] for _ in range(5)]
+
+    async def scenario():
+        await bot.handle_message(_update(1, "hola", []), None)
+        await asyncio.gather(*(bot.resumen(_update(1, "/resumen", r), None) for r in replies))
+        # Cambió el buffer, pero el chat está en período de espera
+        await bot.handle_message(_update(1, "otro", []), None)
+        late = []
+        await bot.resumen(_update(1, "/resumen", late), None)
+        return late
+
+    late = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(r[-1] == "resumen compartido" for r in replies)
+    assert bot.summary_flight.stats()['coalesced'] == 4
+    assert late == [late[0]] and late[0] != "resumen compartido"
+    assert bot.summary_cooldown.rejected == 1
+
+
+def test_message_between_two_requests_still_coalesces():
+    bot = CinicoSummaryBot("123:TEST", storage=MemoryBackend())
+    calls = []
+
+    async def complete(prompt, model=None):
+        calls.append(prompt)
+        await asyncio.sleep(0.05)
+        return "resumen compartido"
+
+    bot.llm_client = SimpleNamespace(api_key="k", complete=complete)
+    first, second = [], []
+
+    async def scenario():
+        await bot.handle_message(_update(1, "hola", []), None)
+        running = asyncio.create_task(bot.resumen(_update(1, "/resumen", first), None))
+        await asyncio.sleep(0.01)
+        # La ventana cambió, pero el resumen del chat sigue en curso
+        await bot.handle_message(_update(1, "otro", []), None)
+        await bot.resumen(_update(1, "/resumen", second), None)
+        await running
+
+    asyncio.run(scenario())
+    assert len(calls) == 1
+    assert first[-1] == second[-1] == "resumen compartido"
+    assert bot.summary_flight.stats()['executed'] == 1 and bot.summary_flight.stats()['coalesced'] == 1
+    assert bot.summary_cooldown.rejected == 0
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Pruebas del arranque: identidad del bot en caché y medición de fases
+"""
+import asyncio
+import json
+
+from telegram.error import InvalidToken
+
+from bot2_scripts.utils.bot_identity import CachedIdentityBot, load_identity, save_identity
+from bot2_scripts.utils.startup import STARTUP_SECONDS, StartupTimer
+
+TOKEN = "123:TEST"
+ME = {"id": 1, "is_bot": True, "first_name": "Bot", "username": "cinico_bot"}
+
+
+class _OfflineBot(CachedIdentityBot):
+    """Responde getMe sin red, con una demora para distinguir la caché de la llamada real."""
+
+    def __init__(self, *args, me=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._me = ME if me is None else me
+        self._calls = 0
+
+    async def _do_post(self, endpoint, data, **kwargs):
+        assert endpoint == "getMe"
+        self._calls += 1
+        await asyncio.sleep(0.05)
+        if self._me is None:
+            raise InvalidToken()
+        return self._me
+
+
+def test_identity_cache_roundtrip(tmp_path):
+    path = str(tmp_path / "identity.json")
+    assert load_identity(path, TOKEN) is None
+    save_identity(path, TOKEN, ME)
+    assert load_identity(path, TOKEN) == ME
+    # Otro token no usa la identidad guardada, y el token no queda en disco
+    assert load_identity(path, "456:OTRO") is None
+    assert TOKEN not in open(path).read()
+
+
+def test_without_cache_get_me_fetches_and_saves(tmp_path):
+    path = str(tmp_path / "identity.json")
+    bot = _OfflineBot(TOKEN, path)
+
+    user = asyncio.run(bot.get_me())
+    assert user.username == "cinico_bot" and bot._calls == 1
+    assert load_identity(path, TOKEN) == ME
+
+
+def test_cached_identity_is_used_and_validated_in_background(tmp_path):
+    path = str(tmp_path / "identity.json")
+    save_identity(path, TOKEN, ME)
+    renamed = dict(ME, username="cinico_nuevo_bot")
+    bot = _OfflineBot(TOKEN, path, me=renamed)
+
+    async def scenario():
+        user = await bot.get_me()
+        # Sin esperar a Telegram: la identidad sale de la caché
+        assert bot._calls == 0 and bot.username == "cinico_bot" and user.username == "cinico_bot"
+        await bot._validation
+        return user
+
+    asyncio.run(scenario())
+    assert bot._calls == 1
+    # El usuario en uso también pasa a ser el nuevo, no solo la caché
+    assert bot.username == "cinico_nuevo_bot"
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["user"]["username"] == "cinico_nuevo_bot"
+
+
+def test_rejected_token_in_background_is_signalled(tmp_path):
+    path = str(tmp_path / "identity.json")
+    save_identity(path, TOKEN, ME)
+    rejected = []
+
+    class _RevokedBot(_OfflineBot):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._me = None
+
+    bot = _RevokedBot(TOKEN, path, on_invalid_token=lambda: rejected.append(True))
+
+    async def scenario():
+        await bot.get_me()
+        await bot._validation
+
+    asyncio.run(scenario())
+    assert bot.token_rejected and rejected == [True]
+    assert load_identity(path, TOKEN) is None
+
+
+def test_startup_timer_reports_phases_once(capsys):
+    timer = StartupTimer()
+    timer.start(report=True)
+    timer.mark("importaciones")
+    timer.mark("bot creado")
+    timer.finish()
+    timer.finish()
+    timer.mark("tarde")
+
+    output = capsys.readouterr().out
+    assert output.count("Tiempos de arranque") == 1
+    assert [phase for phase, _ in timer.phases] == ["importaciones", "bot creado", "listo"]
+    assert timer.phases == sorted(timer.phases, key=lambda p: p[1])
+    assert 'bot_startup_seconds{phase="listo"}' in "\n".join(STARTUP_SECONDS.render())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Pruebas del backend SQLite y la carga perezosa tras un reinicio
+"""
+import asyncio
+import time
+from datetime import datetime
+
+from bot2_scripts.utils.message_store import MessageStore
+from bot2_scripts.utils.storage import SQLiteBackend
+
+
+def test_sqlite_warm_restart_loads_lazily(tmp_path):
+    path = str(tmp_path / "mensajes.db")
+    backend = SQLiteBackend(path, batch_size=50, flush_interval=0.05)
+    store = MessageStore(3, 10 ** 6, backend=backend)
+    for i in range(5):
+        store.append(1, {'user': "Ana", 'text': f"m{i}", 'timestamp': datetime.now(), 'message_id': i})
+    store.append(2, {'user': "Luis", 'text': "hola", 'timestamp': datetime.now(), 'message_id': 1})
+    backend.close()
+    assert backend.rows_written == 6
+    assert backend.batches_written < 6  # escrituras agrupadas
+
+    # "Reinicio": nada se carga hasta que se accede al chat
+    backend = SQLiteBackend(path)
+    store = MessageStore(3, 10 ** 6, backend=backend)
+    assert len(store) == 0
+    assert [m['text'] for m in store.get(1)] == ["m2", "m3", "m4"]
+    assert len(store) == 1
+    assert store.get(99) == []
+    assert 99 not in store
+
+    # Mensajes repetidos (mismo message_id) no se duplican en disco
+    store.append(2, {'user': "Luis", 'text': "hola", 'timestamp': datetime.now(), 'message_id': 1})
+    store.append(2, {'user': "Luis", 'text': "chao", 'timestamp': datetime.now(), 'message_id': 2})
+    backend.close()
+    backend = SQLiteBackend(path)
+    assert [m['text'] for m in backend.load_recent(2, 10)] == ["hola", "chao"]
+    backend.close()
+
+
+def test_steady_traffic_commits_within_flush_interval(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "mensajes.db"), batch_size=200, flush_interval=0.2)
+    # Mensajes más seguidos que el intervalo: el lote no debe esperar a llenarse
+    for i in range(8):
+        backend.append(1, {'user': "Ana", 'text': f"m{i}", 'timestamp': datetime.now(), 'message_id': i})
+        time.sleep(0.1)
+    committed = len(backend.load_recent(1, 100))
+    backend.close()
+    assert committed >= 4
+
+
+def test_rows_written_skips_ignored_duplicates(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "mensajes.db"), flush_interval=0.01)
+    message = {'user': "Ana", 'text': "hola", 'timestamp': datetime.now(), 'message_id': 7}
+    backend.append(1, message)
+    backend.append(1, message)
+    backend.close()
+    assert backend.rows_written == 1
+
+
+def test_reloaded_chat_sees_messages_not_yet_committed(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "mensajes.db"), flush_interval=0.5)
+    store = MessageStore(10, 10 ** 6, backend=backend)
+
+    async def scenario():
+        for i in range(3):
+            await store.preload(1)
+            store.append(1, {'user': "Ana", 'text': f"m{i}", 'timestamp': datetime.now(), 'message_id': i})
+        # Descartado y recargado antes de que el escritor confirme el lote
+        store.drop(1)
+        assert backend.rows_written == 0
+        await store.preload(1)
+        return [m['text'] for m in store.get(1)]
+
+    assert asyncio.run(scenario()) == ["m0", "m1", "m2"]
+    backend.close()
+    assert backend.rows_written == 3
+    reopened = SQLiteBackend(str(tmp_path / "mensajes.db"))
+    assert [m['text'] for m in reopened.load_recent(1, 10)] == ["m0", "m1", "m2"]
+    reopened.close()
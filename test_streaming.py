@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Pruebas de las respuestas en streaming (SSE) y las ediciones progresivas
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from bot2_scripts.bot2_core import CinicoSummaryBot
+from bot2_scripts.utils.llm_client import OpenRouterClient
+from bot2_scripts.utils.llm_scheduler import LLMScheduler
+from bot2_scripts.utils.outbound import OutboundSender
+from bot2_scripts.utils.storage import MemoryBackend
+from bot2_scripts.utils.streaming_reply import ProgressiveReply, split_point
+
+
+class _SSEHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        assert body["stream"] is True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        self.wfile.write(b": OPENROUTER PROCESSING\n\n")
+        for word in ["Diagnóstico", ": ", "grupo ", "terminal."]:
+            chunk = {"choices": [{"delta": {"content": word}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_client_parses_sse_stream():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SSEHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = OpenRouterClient("k", base_url=f"http://127.0.0.1:{server.server_address[1]}")
+
+    async def scenario():
+        try:
+            return [delta async for delta in client.stream("hola")]
+        finally:
+            await client.aclose()
+
+    try:
+        assert asyncio.run(scenario()) == ["Diagnóstico", ": ", "grupo ", "terminal."]
+    finally:
+        server.shutdown()
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _FakeSent:
+    def __init__(self, text):
+        self.text = text
+        self.edits = []
+
+    async def edit_text(self, text, **kwargs):
+        self.text = text
+        self.edits.append(text)
+
+
+class _FakeMessage:
+    def __init__(self):
+        self.sent = []
+
+    async def reply_text(self, text, **kwargs):
+        sent = _FakeSent(text)
+        self.sent.append(sent)
+        return sent
+
+
+def test_edits_are_coalesced_and_roll_over_at_limit():
+    clock = _FakeClock()
+    message = _FakeMessage()
+    reply = ProgressiveReply(message, max_length=20, min_interval=1.0, clock=clock)
+
+    async def scenario():
+        await reply.feed("Hola ")
+        for word in ["a ", "b ", "c "]:
+            await reply.feed(word)  # dentro del intervalo: sin ediciones
+        assert message.sent[0].edits == []
+        clock.now = 1.0
+        await reply.feed("d ")
+        assert message.sent[0].edits == ["Hola a b c d "]
+        await reply.feed("palabra larguísima que no cabe")
+        await reply.finish()
+
+    asyncio.run(scenario())
+    texts = [m.text for m in message.sent]
+    assert all(len(t) <= 20 for t in texts)
+    assert "".join(texts).replace(" ", "") == "Holaabcdpalabralarguísimaquenocabe"
+    assert len(message.sent) == 3
+
+
+def test_sends_and_edits_share_the_outbound_chat_queue():
+    clock = _FakeClock()
+    message = _FakeMessage()
+    outbound = OutboundSender(0, 0, group_per_minute=0)
+    reply = ProgressiveReply(
+        message, max_length=20, min_interval=1.0, clock=clock,
+        send=lambda text: outbound.send(-5, lambda: message.reply_text(text)),
+        edit=lambda sent, text: outbound.send(-5, lambda: sent.edit_text(text)),
+    )
+
+    async def scenario():
+        await reply.feed("Hola ")
+        clock.now = 1.0
+        await reply.feed("mundo ")
+        await reply.feed("y una continuación larga")
+        await reply.finish()
+
+    asyncio.run(scenario())
+    edits = sum(len(m.edits) for m in message.sent)
+    assert edits == reply.edits > 0
+    # Cada mensaje nuevo y cada edición pasaron por los límites del chat
+    assert outbound.stats()['sent'] == len(message.sent) + edits
+
+
+def test_split_point_prefers_whitespace():
+    assert split_point("uno dos tres", 9) == 8
+    assert split_point("abcdefghij", 4) == 4
+    assert split_point("corto", 10) == 5
+
+
+def test_slow_telegram_does_not_hold_llm_workers():
+    bot = CinicoSummaryBot("123:TEST", storage=MemoryBackend())
+    bot.llm_scheduler = LLMScheduler(workers=1, max_queue=10)
+
+    async def stream(prompt, model=None):
+        for part in ("uno ", "dos ", "tres"):
+            await asyncio.sleep(0.01)
+            yield part
+
+    async def complete(prompt, model=None):
+        return "otro chat"
+
+    bot.llm_client = SimpleNamespace(api_key="k", stream=stream, complete=complete)
+    shown = []
+
+    async def slow_delta(text):
+        # Telegram en pausa por control de flujo en este chat
+        await asyncio.sleep(0.3)
+        shown.append(text)
+
+    async def scenario():
+        streaming = asyncio.create_task(bot._complete_streaming("p", 1, slow_delta))
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        other = await bot._complete("q", 2)
+        waited = time.monotonic() - started
+        text = await streaming
+        await bot.llm_scheduler.close()
+        return other, waited, text
+
+    other, waited, text = asyncio.run(scenario())
+    # El único worker quedó libre en cuanto terminó el stream, sin esperar a Telegram
+    assert other == "otro chat" and waited < 0.2
+    assert text == "uno dos tres" and "".join(shown) == "uno dos tres"
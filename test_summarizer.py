@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Pruebas del resumen jerárquico (map-reduce) de ventanas largas
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from bot2_scripts.handlers.cinico_handler import CinicoHandler
+from bot2_scripts.utils.summarizer import HierarchicalSummarizer, chunk_by_tokens, estimate_tokens
+
+TEMPLATE = "PERSONA {total_messages} {time_span}\n{joined}\nResumen:"
+
+
+def _messages(n, length):
+    start = datetime(2024, 1, 1)
+    return [{'user': f"u{i % 7}", 'text': "x" * length, 'timestamp': start + timedelta(minutes=i)}
+            for i in range(n)]
+
+
+def test_chunks_respect_token_budget():
+    chunks = chunk_by_tokens(list(range(10)), 3, lambda i: "abcdefgh")  # 3 tokens cada uno
+    assert chunks == [[i] for i in range(10)]
+    chunks = chunk_by_tokens(["a" * 40] * 10, 30, lambda s: s)
+    assert [len(c) for c in chunks] == [2, 2, 2, 2, 2]
+
+
+def test_short_window_is_single_pass():
+    prompts = []
+
+    async def complete(prompt, chat_id=None):
+        prompts.append(prompt)
+        return "ok"
+
+    summarizer = HierarchicalSummarizer(CinicoHandler(TEMPLATE, []), complete, prompt_char_limit=4000)
+    assert asyncio.run(summarizer.summarize(_messages(3, 20))) == "ok"
+    assert len(prompts) == 1 and prompts[0].startswith("PERSONA 3")
+
+
+def test_long_window_is_map_reduced_with_bounded_concurrency():
+    prompts = []
+    running = 0
+    peak = 0
+
+    async def complete(prompt, chat_id=None):
+        nonlocal running, peak
+        prompts.append(prompt)
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return "resumen parcial " + "y" * 400
+
+    summarizer = HierarchicalSummarizer(CinicoHandler(TEMPLATE, []), complete,
+                                        prompt_char_limit=4000, chunk_tokens=500, max_concurrency=3)
+    messages = _messages(1000, 200)
+    result = asyncio.run(summarizer.summarize(messages))
+
+    final = prompts[-1]
+    assert result.startswith("resumen parcial")
+    assert final.startswith("PERSONA 1000 últimas 17 horas")
+    assert "[Parte 1]" in final
+    assert estimate_tokens(final) < 1000
+    assert peak <= 3
+    map_calls = sum(1 for p in prompts if p.startswith("Resume de forma fiel"))
+    assert map_calls == len(chunk_by_tokens(messages, 500, lambda m: f"{m['user']}: {m['text']}"))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la caché de resúmenes
+"""
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from bot2_scripts.bot2_core import CinicoSummaryBot
+from bot2_scripts.utils.storage import MemoryBackend
+from bot2_scripts.utils.summary_cache import SummaryCache
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_and_lru_eviction():
+    clock = _FakeClock()
+    cache = SummaryCache(ttl=10, max_entries=2, clock=clock)
+    messages = [{'user': "Ana", 'text': "hola", 'timestamp': datetime(2024, 1, 1)}]
+    key = SummaryCache.make_key(1, messages, "v1")
+    assert key != SummaryCache.make_key(1, messages, "v2")
+    assert key != SummaryCache.make_key(1, messages + messages, "v1")
+
+    cache.put(key, "resumen")
+    assert cache.get(key) == "resumen"
+    clock.now = 11
+    assert cache.get(key) is None
+
+    cache.put((1, "a"), "a")
+    cache.put((1, "b"), "b")
+    cache.get((1, "a"))
+    cache.put((1, "c"), "c")
+    assert cache.get((1, "b")) is None
+    assert cache.stats() == {'entries': 2, 'hits': 2, 'misses': 2, 'evictions': 1, 'expirations': 1}
+
+
+def test_resumen_skips_llm_on_unchanged_buffer():
+    bot = CinicoSummaryBot("123:TEST", storage=MemoryBackend())
+    bot.summary_cooldown.seconds = 0
+    calls = []
+
+    async def complete(prompt, model=None):
+        calls.append(prompt)
+        return "resumen cínico"
+
+    bot.llm_client = SimpleNamespace(api_key="k", complete=complete)
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    def update(text):
+        return SimpleNamespace(message=SimpleNamespace(
+            chat=SimpleNamespace(id=5, type="group"), from_user=SimpleNamespace(first_name="Ana"),
+            text=text, message_id=None, reply_text=reply_text))
+
+    async def scenario():
+        await bot.handle_message(update("hola grupo"), None)
+        await bot.resumen(update("/resumen"), None)
+        await bot.resumen(update("/resumen"), None)
+        await bot.handle_message(update("otro mensaje"), None)
+        await bot.resumen(update("/resumen"), None)
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+    assert replies.count("resumen cínico") == 3
+    assert bot.summary_cache.stats()['hits'] == 1
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Pruebas de /resumen con ventana de tiempo (30m, 2h, 1d) o desde un mensaje respondido
+"""
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from bot2_scripts.bot2_core import CinicoSummaryBot, parse_window
+from bot2_scripts.utils.compact_messages import ChatBuffer, to_epoch
+from bot2_scripts.utils.storage import MemoryBackend
+
+
+def _update(chat_id, text, replies, reply_to=None):
+    async def reply_text(reply, **kwargs):
+        replies.append(reply)
+
+    return SimpleNamespace(message=SimpleNamespace(
+        chat=SimpleNamespace(id=chat_id, type="group"), from_user=SimpleNamespace(first_name="Ana"),
+        text=text, message_id=None, reply_text=reply_text, reply_to_message=reply_to))
+
+
+def test_parse_window():
+    assert parse_window("30m") == timedelta(minutes=30)
+    assert parse_window("2h") == timedelta(hours=2)
+    assert parse_window("1D") == timedelta(days=1)
+    assert parse_window("45") == timedelta(minutes=45)
+    for bad in ("", "0h", "ayer", "-5m", "3w"):
+        assert parse_window(bad) is None
+
+
+def test_buffer_since_after_wraparound():
+    buffer = ChatBuffer(5)
+    base = datetime(2024, 1, 1, 12, 0)
+    for minute in range(12):
+        buffer.append({'user': 'Ana', 'text': str(minute), 'timestamp': base + timedelta(minutes=minute)})
+    # Un mensaje con fecha anterior queda ordenado al final
+    buffer.append({'user': 'Ana', 'text': 'tarde', 'timestamp': base})
+
+    window = buffer.since(to_epoch(base + timedelta(minutes=10)))
+    assert [m['text'] for m in window] == ['10', '11', 'tarde']
+    assert [m['text'] for m in buffer.since(0)] == ['8', '9', '10', '11', 'tarde']
+    assert buffer.since(to_epoch(base + timedelta(hours=1))) == []
+
+
+def test_windowed_and_anchored_resumen_only_summarize_the_slice():
+    bot = CinicoSummaryBot("123:TEST", storage=MemoryBackend())
+    prompts = []
+
+    async def complete(prompt, model=None):
+        prompts.append(prompt)
+        return f"resumen {len(prompts)}"
+
+    bot.llm_client = SimpleNamespace(api_key="k", complete=complete)
+    now = datetime.now()
+    for hours, text in ((5, "viejo"), (3, "medio"), (0, "reciente")):
+        bot.message_store.append(1, {'user': 'Ana', 'text': text, 'timestamp': now - timedelta(hours=hours)})
+
+    async def scenario():
+        replies = []
+        await bot.resumen(_update(1, "/resumen 1h", replies), SimpleNamespace(args=["1h"]))
+        # Sin período de espera, para pedir una segunda ventana enseguida
+        bot.summary_cooldown.seconds = 0
+        anchor = SimpleNamespace(date=now - timedelta(hours=3, minutes=1))
+        await bot.resumen(_update(1, "/resumen", replies, reply_to=anchor), SimpleNamespace(args=[]))
+        usage = []
+        await bot.resumen(_update(1, "/resumen ayer", usage), SimpleNamespace(args=["ayer"]))
+        return replies, usage
+
+    replies, usage = asyncio.run(scenario())
+    assert len(prompts) == 2
+    assert "reciente" in prompts[0] and "medio" not in prompts[0] and "viejo" not in prompts[0]
+    assert "medio" in prompts[1] and "reciente" in prompts[1] and "viejo" not in prompts[1]
+    assert replies[-1] == "resumen 2"
+    assert usage and usage[0].startswith("Uso:")
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Pruebas del procesamiento concurrente de updates: orden por chat, carriles separados y carga
+"""
+import asyncio
+import itertools
+import statistics
+import time
+from types import SimpleNamespace
+
+from telegram import MessageEntity, Update
+from telegram.ext import Application, ExtBot
+
+from bot2_scripts.bot2_core import CinicoSummaryBot
+from bot2_scripts.utils.outbound import OutboundSender
+from bot2_scripts.utils.single_flight import Cooldown
+from bot2_scripts.utils.storage import MemoryBackend
+from bot2_scripts.utils.update_processor import ChatUpdateProcessor
+
+TOKEN = "123:TEST"
+ME = {"id": 123, "is_bot": True, "first_name": "Bot", "username": "cinico_bot"}
+
+
+def _fake_update(chat_id, command=False):
+    entities = [SimpleNamespace(type=MessageEntity.BOT_COMMAND, offset=0)] if command else []
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id),
+                           effective_message=SimpleNamespace(entities=entities))
+
+
+def _feed(processor, items):
+    """Como Application: una tarea por update, creadas en el orden de llegada."""
+    return asyncio.gather(*(asyncio.create_task(processor.process_update(update, coroutine))
+                            for update, coroutine in items))
+
+
+def test_chats_run_concurrently_in_order_within_each_chat():
+    processor = ChatUpdateProcessor(ingest_concurrency=8)
+    log = []
+
+    async def handle(chat, i, delay):
+        await asyncio.sleep(delay)
+        log.append((chat, i))
+
+    async def scenario():
+        await processor.initialize()
+        # Demoras decrecientes: sin la cola por chat terminarían al revés
+        items = [(_fake_update(chat), handle(chat, i, 0.05 - i * 0.01))
+                 for i in range(5) for chat in (1, 2, 3)]
+        start = time.monotonic()
+        await _feed(processor, items)
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(scenario())
+    for chat in (1, 2, 3):
+        assert [i for c, i in log if c == chat] == list(range(5))
+    # Los tres chats avanzan a la vez: el tiempo es el de un chat, no la suma
+    assert elapsed < 0.25
+    assert processor.stats()['processed_ingest'] == 15 and processor.stats()['ordered_chats'] == 0
+
+
+def test_commands_see_earlier_messages_without_blocking_later_ones():
+    processor = ChatUpdateProcessor()
+    captured = []
+    seen_by_command = []
+
+    async def message(i, delay=0.0):
+        await asyncio.sleep(delay)
+        captured.append(i)
+
+    async def slow_command():
+        seen_by_command.append(list(captured))
+        await asyncio.sleep(0.2)
+        seen_by_command.append(list(captured))
+
+    async def scenario():
+        await processor.initialize()
+        await _feed(processor, [
+            (_fake_update(1), message(0, 0.05)),
+            (_fake_update(1, command=True), slow_command()),
+            (_fake_update(1), message(1)),
+            (_fake_update(1), message(2)),
+        ])
+
+    asyncio.run(scenario())
+    # El comando empezó después del mensaje anterior, y los posteriores se capturaron mientras corría
+    assert seen_by_command == [[0], [0, 1, 2]]
+
+
+class _OfflineBot(ExtBot):
+    """Bot sin red: responde getMe y sendMessage localmente."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._ids = itertools.count(1000)
+
+    async def _do_post(self, endpoint, data, **kwargs):
+        if endpoint == "getMe":
+            return ME
+        assert endpoint == "sendMessage"
+        return {"message_id": next(self._ids), "date": int(time.time()),
+                "chat": {"id": int(data["chat_id"]), "type": "group", "title": "Grupo"}, "text": data["text"]}
+
+
+def _raw_update(update_id, chat_id, text):
+    message = {"message_id": update_id, "date": int(time.time()), "text": text,
+               "chat": {"id": chat_id, "type": "group", "title": f"Grupo {chat_id}"},
+               "from": {"id": 7, "is_bot": False, "first_name": "Ana"}}
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def test_cross_chat_ingestion_latency_stays_flat_when_one_chat_is_saturated():
+    bot = CinicoSummaryBot(TOKEN, storage=MemoryBackend())
+    # Lo que se mide es el procesamiento de updates, no los límites de Telegram ni el período de espera
+    bot.outbound = OutboundSender(0, 0, group_per_minute=0)
+    bot.summary_cooldown = Cooldown(0)
+    llm_calls = []
+
+    async def complete(prompt, model=None):
+        llm_calls.append(prompt)
+        await asyncio.sleep(0.1)
+        return "resumen"
+
+    bot.llm_client = SimpleNamespace(api_key="k", complete=complete, aclose=lambda: asyncio.sleep(0))
+    sent_at = {}
+    ingested_at = {}
+    handle_message = bot.handle_message
+
+    async def timed_handle_message(update, context):
+        await handle_message(update, context)
+        ingested_at[update.message.message_id] = time.monotonic()
+
+    bot.handle_message = timed_handle_message
+    offline = _OfflineBot(TOKEN)
+    bot.app = Application.builder().bot(offline).updater(None).concurrent_updates(bot.update_processor).build()
+    bot._setup_handlers()
+    busy, quiet = -1001, -1002
+    ids = itertools.count(1)
+
+    async def send(chat_id, text):
+        update_id = next(ids)
+        sent_at[update_id] = time.monotonic()
+        await bot.app.update_queue.put(Update.de_json(_raw_update(update_id, chat_id, text), offline))
+        return update_id
+
+    async def quiet_latency(i):
+        update_id = await send(quiet, f"mensaje tranquilo {i}")
+        while update_id not in ingested_at:
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.01)
+        return ingested_at[update_id] - sent_at[update_id]
+
+    async def scenario():
+        await bot.app.initialize()
+        await bot.app.start()
+        try:
+            baseline = [await quiet_latency(i) for i in range(20)]
+            # Saturar un chat: en cada ronda llega un mensaje nuevo y otro /resumen de 0.1 s,
+            # más rápido de lo que se resumen, así que sus comandos se acumulan
+            saturated, busy_ids, running = [], [], []
+            for i in range(20):
+                busy_ids.append(await send(busy, f"mensaje ocupado {i}"))
+                await send(busy, "/resumen")
+                saturated.append(await quiet_latency(i))
+                running.append(bot.update_processor.stats()['running_commands'])
+            backlog = bot.update_processor.stats()['waiting']
+        finally:
+            await bot.app.stop()
+            await bot.app.shutdown()
+            await bot.llm_scheduler.close()
+        busy_latencies = [ingested_at[i] - sent_at[i] for i in busy_ids]
+        return baseline, saturated, busy_latencies, running, backlog
+
+    baseline, saturated, busy_latencies, running, backlog = asyncio.run(scenario())
+    # El chat saturado tenía resúmenes en cola, de a uno por vez
+    assert backlog > 0 and max(running) == 1
+    assert statistics.median(saturated) < statistics.median(baseline) + 0.02
+    assert max(saturated) < 0.1
+    # Sus propios mensajes también se capturan sin esperar a sus resúmenes, y en orden
+    assert max(busy_latencies) < 0.1
+    assert [m['text'] for m in bot.message_store.get(busy)] == [f"mensaje ocupado {i}" for i in range(20)]
+    assert len(llm_calls) > 1
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Pruebas del modo webhook: se envían updates grabados por POST a localhost
+"""
+import asyncio
+import json
+import urllib.error
+import urllib.request
+
+from telegram.ext import Application
+
+from bot2_scripts.bot2_core import CinicoSummaryBot
+from bot2_scripts.utils.storage import MemoryBackend
+from bot2_scripts.utils.webhook import WebhookServer
+
+SECRET = "s3cr3t"
+
+RECORDED_UPDATE = {
+    "update_id": 900001,
+    "message": {
+        "message_id": 42,
+        "date": 1700000000,
+        "chat": {"id": -1001234, "type": "supergroup", "title": "Grupo"},
+        "from": {"id": 7, "is_bot": False, "first_name": "Ana"},
+        "text": "¿alguien vio el partido?",
+    },
+}
+
+
+def _request(port, method, path, body=None, secret=SECRET):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=body, method=method)
+    if secret is not None:
+        request.add_header("X-Telegram-Bot-Api-Secret-Token", secret)
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_webhook_accepts_recorded_updates_and_validates_secret():
+    app = Application.builder().token("123:ABC").build()
+    bot = CinicoSummaryBot("123:ABC", storage=MemoryBackend())
+
+    async def scenario():
+        server = WebhookServer(app, "127.0.0.1", 0, "/telegram", SECRET)
+        await server.start()
+        port = server.port
+        body = json.dumps(RECORDED_UPDATE).encode()
+        statuses = {
+            'ok': await asyncio.to_thread(_request, port, "POST", "/telegram", body),
+            'bad_secret': await asyncio.to_thread(_request, port, "POST", "/telegram", body, "nope"),
+            'bad_json': await asyncio.to_thread(_request, port, "POST", "/telegram", b"{no json"),
+            'unknown': await asyncio.to_thread(_request, port, "GET", "/otra"),
+            'health': await asyncio.to_thread(_request, port, "GET", "/healthz"),
+            'ready': await asyncio.to_thread(_request, port, "GET", "/readyz"),
+        }
+        update = app.update_queue.get_nowait()
+        await bot.handle_message(update, None)
+        await server.stop(drain_timeout=1)
+        return statuses
+
+    statuses = asyncio.run(scenario())
+    assert statuses == {'ok': 200, 'bad_secret': 403, 'bad_json': 400, 'unknown': 404,
+                        'health': 200, 'ready': 503}  # la Application no está iniciada
+    assert app.update_queue.empty()
+    assert bot.message_store.get(-1001234)[0]['text'] == "¿alguien vio el partido?"
+
+
+def test_malformed_content_length_gets_400_and_closes():
+    app = Application.builder().token("123:ABC").build()
+
+    async def raw(port, length):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"POST /telegram HTTP/1.1\r\nHost: x\r\nContent-Length: {length}\r\n\r\n{{}}".encode())
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout=5)
+        writer.close()
+        return response
+
+    async def scenario():
+        server = WebhookServer(app, "127.0.0.1", 0, "/telegram", SECRET)
+        await server.start()
+        responses = [await raw(server.port, length) for length in ("abc", "-5", "²")]
+        # El servidor sigue atendiendo después
+        health = await asyncio.to_thread(_request, server.port, "GET", "/healthz")
+        await server.stop(drain_timeout=1)
+        return responses, health
+
+    responses, health = asyncio.run(scenario())
+    for response in responses:
+        # read() terminó: el servidor cerró la conexión tras responder
+        assert response.startswith(b"HTTP/1.1 400 ")
+        assert b"Connection: close" in response
+    assert health == 200
+
+
+def test_oversized_and_slow_headers_are_rejected():
+    app = Application.builder().token("123:ABC").build()
+
+    async def raw(port, head, pause=0.0):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(head)
+        await writer.drain()
+        if pause:
+            # Cabeceras a cuentagotas: el servidor no espera indefinidamente
+            await asyncio.sleep(pause)
+        response = await asyncio.wait_for(reader.read(), timeout=5)
+        writer.close()
+        return response.split(b"\r\n", 1)[0]
+
+    async def scenario():
+        server = WebhookServer(app, "127.0.0.1", 0, "/telegram", SECRET)
+        server.server.request_timeout = 0.2
+        await server.start()
+        start = b"GET /healthz HTTP/1.1\r\n"
+        statuses = [
+            await raw(server.port, start + b"X-Largo: " + b"a" * 70000 + b"\r\n\r\n"),
+            await raw(server.port, start + b"".join(b"X-%d: 1\r\n" % i for i in range(200)) + b"\r\n"),
+            await raw(server.port, start + b"Host: x\r\n", pause=0.5),
+            await raw(server.port, b"GET /" + b"a" * 70000 + b" HTTP/1.1\r\n\r\n"),
+        ]
+        health = await asyncio.to_thread(_request, server.port, "GET", "/healthz")
+        await server.stop(drain_timeout=1)
+        return statuses, health
+
+    statuses, health = asyncio.run(scenario())
+    assert [status.split(b" ")[1] for status in statuses] == [b"431", b"431", b"408", b"414"]
+    assert health == 200
+
+
+def test_draining_server_rejects_new_updates():
+    app = Application.builder().token("123:ABC").build()
+
+    async def scenario():
+        server = WebhookServer(app, "127.0.0.1", 0, "/telegram", SECRET)
+        await server.start()
+        server.draining = True
+        status = await asyncio.to_thread(_request, server.port, "POST", "/telegram",
+                                         json.dumps(RECORDED_UPDATE).encode())
+        await server.stop(drain_timeout=1)
+        return status
+
+    assert asyncio.run(scenario()) == 503
+    assert app.update_queue.empty()